@@ -0,0 +1,57 @@
+// Bundle the Lucide icons used by the templates into static/build/lucide.min.js.
+// The bundle exposes the same window.lucide.createIcons() as the CDN build,
+// but carries only the icons named in data-lucide attributes.
+import { readdirSync, readFileSync } from 'node:fs';
+import { join } from 'node:path';
+import { build } from 'esbuild';
+import * as lucide from 'lucide';
+
+const SOURCES = ['templates', 'static/js'];
+// data-lucide="name" in markup and setAttribute('data-lucide', 'name') in scripts
+const ICON_RE = /data-lucide(?:="|',\s*')([a-z0-9-]+)/g;
+const OUTFILE = 'static/build/lucide.min.js';
+
+function* sourceFiles(directory) {
+  for (const entry of readdirSync(directory, { withFileTypes: true })) {
+    const path = join(directory, entry.name);
+    if (entry.isDirectory()) {
+      yield* sourceFiles(path);
+    } else if (/\.(html|js)$/.test(entry.name)) {
+      yield path;
+    }
+  }
+}
+
+const pascalCase = (name) => name.replace(/(^|-)([a-z0-9])/g, (_, dash, letter) => letter.toUpperCase());
+
+const names = new Set();
+for (const directory of SOURCES) {
+  for (const file of sourceFiles(directory)) {
+    for (const match of readFileSync(file, 'utf8').matchAll(ICON_RE)) {
+      names.add(pascalCase(match[1]));
+    }
+  }
+}
+
+const used = [...names].filter((name) => name in lucide).sort();
+const unknown = [...names].filter((name) => !(name in lucide));
+if (unknown.length) {
+  console.warn(`Unknown Lucide icons (not bundled): ${unknown.join(', ')}`);
+}
+
+await build({
+  stdin: {
+    contents: [
+      `import { createIcons, ${used.join(', ')} } from 'lucide';`,
+      `const icons = { ${used.join(', ')} };`,
+      'window.lucide = { icons, createIcons: (options = {}) => createIcons({ ...options, icons }) };',
+    ].join('\n'),
+    resolveDir: process.cwd(),
+  },
+  bundle: true,
+  minify: true,
+  format: 'iife',
+  target: 'es2018',
+  outfile: OUTFILE,
+});
+console.log(`${OUTFILE}: ${used.length} icons`);
@@ -0,0 +1,22 @@
+// Copy the third-party browser assets the templates load into static/build/vendor/,
+// so pages do not depend on CDNs once the build is in place.
+// jQuery is not copied: the templates use the one shipped with django.contrib.admin.
+import { cpSync, mkdirSync } from 'node:fs';
+import { dirname, join } from 'node:path';
+
+const OUTDIR = 'static/build/vendor';
+// [source in node_modules, destination in OUTDIR]
+const FILES = [
+  ['vazir-font/dist', 'vazir-font'],
+  ['persian-date/dist/persian-date.min.js', 'persian-date.min.js'],
+  ['persian-datepicker/dist/js/persian-datepicker.min.js', 'persian-datepicker.min.js'],
+  ['persian-datepicker/dist/css/persian-datepicker.min.css', 'persian-datepicker.min.css'],
+  ['jalaali-js/dist/jalaali.min.js', 'jalaali.min.js'],
+];
+
+for (const [source, destination] of FILES) {
+  const target = join(OUTDIR, destination);
+  mkdirSync(dirname(target), { recursive: true });
+  cpSync(join('node_modules', source), target, { recursive: true });
+}
+console.log(`${OUTDIR}: ${FILES.length} assets`);
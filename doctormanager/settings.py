@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'patients.middleware.StaticFilesMiddleware',
+    'patients.middleware.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,12 +58,20 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'doctormanager.urls'
 
+_TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to ProfilingMiddleware
+        'BACKEND': 'patients.template_backends.ProfiledDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Production parses each template once per process; with DEBUG,
+            # edits show up on the next request under any server
+            'loaders': _TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', _TEMPLATE_LOADERS)],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -66,6 +79,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'patients.context_processors.notifications_context',
                 'patients.context_processors.settings_context',
+                'patients.context_processors.static_assets_context',
             ],
         },
     },
@@ -76,15 +90,90 @@ WSGI_APPLICATION = 'doctormanager.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# DJANGO_DB selects the profile: 'sqlite' (default) or 'postgresql'.
+
+# SQLite: WAL lets readers run alongside the single writer, IMMEDIATE
+# transactions take the write lock up front (so they wait on busy_timeout
+# instead of failing with "database is locked" on lock upgrade).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,  # milliseconds
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # negative = KiB, i.e. 20 MB
+}
 
-DATABASES = {
-    'default': {
+DATABASE_PROFILES = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DJANGO_SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+        # A file (not in-memory) test database so tests run with the same pragmas
+        'TEST': {'NAME': str(BASE_DIR / 'test_db.sqlite3')},
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'doctormanager'),
+        'USER': os.environ.get('POSTGRES_USER', 'doctormanager'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Persistent connections, checked before reuse
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    },
+}
+
+# DJANGO_DB_POOL=1 uses psycopg's connection pool instead of persistent
+# connections (Django does not allow both)
+if os.environ.get('DJANGO_DB_POOL') == '1':
+    DATABASE_PROFILES['postgresql']['CONN_MAX_AGE'] = 0
+    DATABASE_PROFILES['postgresql']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DJANGO_DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DJANGO_DB_POOL_MAX_SIZE', 10)),
+        'timeout': int(os.environ.get('DJANGO_DB_POOL_TIMEOUT', 10)),
     }
+
+DATABASES = {
+    'default': DATABASE_PROFILES[os.environ.get('DJANGO_DB', 'sqlite')],
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# DJANGO_CACHE selects the backend: 'locmem' (default, per process),
+# 'file' (shared by processes on one host) or 'redis'.
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'patients.cache_backends.InstrumentedLocMemCache',
+        'LOCATION': 'doctormanager',
+    },
+    'file': {
+        'BACKEND': 'patients.cache_backends.InstrumentedFileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', str(BASE_DIR / '.cache')),
+    },
+    'redis': {
+        'BACKEND': 'patients.cache_backends.InstrumentedRedisCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('DJANGO_CACHE', 'locmem')],
+}
+
+# Whether all server processes see the same cache. The unread notification
+# counter (patients.counters) is kept in a one-row table; a shared cache
+# also holds a copy so reads skip the database, with locmem the row is read.
+SHARED_CACHE = os.environ.get('DJANGO_CACHE', 'locmem') != 'locmem'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -123,8 +212,102 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+STATIC_ROOT = Path(os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles'))
+
+# Outside DEBUG, collectstatic writes content-hashed names and gzip/brotli
+# copies that patients.middleware.StaticFilesMiddleware serves with
+# far-future cache headers (see patients.staticfiles).
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'patients.staticfiles.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Self-hosted Tailwind stylesheet, Lucide icons, Vazir font and datepicker
+# libraries built by `npm run build` into static/build/. Until they are
+# built, pages load them from their CDNs; that is only allowed with DEBUG.
+
+BUNDLED_ASSETS = os.environ.get(
+    'DJANGO_BUNDLED_ASSETS', '1' if (BASE_DIR / 'static' / 'build' / 'tailwind.min.css').exists() else '0'
+) == '1'
+if not DEBUG and not BUNDLED_ASSETS:
+    raise ImproperlyConfigured('Run `npm install && npm run build` to create static/build/ before running without DEBUG')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+LOGIN_URL = 'login'
+
+
+# Appointment notifications
+# Seconds between background runs of the notification job. Every server
+# process runs a scheduler thread, but only one of them claims each run
+# (see patients.scheduler.claim_run). Set to 0 to disable and run
+# `manage.py generate_notifications` from cron instead.
+
+NOTIFICATION_SCHEDULER_INTERVAL = 300
+
+# Read notifications older than this many days are moved to
+# ArchivedNotification (or deleted when NOTIFICATION_ARCHIVE is False) by
+# the scheduler or `manage.py purge_notifications`.
+
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('DJANGO_NOTIFICATION_RETENTION_DAYS', 90))
+NOTIFICATION_ARCHIVE = os.environ.get('DJANGO_NOTIFICATION_ARCHIVE', '1') == '1'
+
+
+# Request profiling (patients.middleware.ProfilingMiddleware)
+# Every response carries a Server-Timing header; requests slower than
+# PROFILING_SLOW_REQUEST_MS are written with their slowest and repeated
+# queries to a rotating JSON-lines log in LOG_DIR.
+
+PROFILING_ENABLED = os.environ.get('DJANGO_PROFILING', '1') == '1'
+PROFILING_SLOW_REQUEST_MS = int(os.environ.get('DJANGO_SLOW_REQUEST_MS', 500))
+PROFILING_LOGGED_QUERIES = 5
+
+# Created on the first slow request (patients.log_handlers)
+LOG_DIR = Path(os.environ.get('DJANGO_LOG_DIR', BASE_DIR / 'logs'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_lines': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'patients.log_handlers.LogDirRotatingFileHandler',
+            'filename': LOG_DIR / 'slow_requests.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'formatter': 'json_lines',
+        },
+    },
+    'loggers': {
+        'patients.performance': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+# Metrics (/metrics, see patients.metrics)
+# Each server process writes its counters to its own file in METRICS_DIR;
+# the endpoint adds them up. Use one directory per deployment and empty it
+# when deploying. Scrapers send "Authorization: Bearer <METRICS_TOKEN>";
+# without a token the endpoint is closed unless DEBUG is on, when local
+# addresses may scrape.
+
+METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR', str(BASE_DIR / '.metrics'))
+METRICS_TOKEN = os.environ.get('DJANGO_METRICS_TOKEN', '')
@@ -16,14 +16,9 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 
+# Static files are served by patients.middleware.StaticFilesMiddleware
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('patients.urls')),
 ]
-
-# Serve static files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
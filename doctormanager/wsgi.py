@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'doctormanager.settings')
 
 application = get_wsgi_application()
+
+# Generate appointment notifications in the background, off the request path
+from patients.scheduler import start_scheduler  # noqa: E402
+
+start_scheduler()
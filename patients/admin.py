@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .jalali import format_jalali
 from .models import Patient, Visit
 
 
@@ -9,6 +10,13 @@ class PatientAdmin(admin.ModelAdmin):
     search_fields = ['first_name', 'last_name', 'national_id', 'phone']
     ordering = ['last_name', 'first_name']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate_age()
+    
+    def age(self, obj):
+        return obj.age
+    age.admin_order_field = 'age'
+    
     fieldsets = (
         ('Personal Information', {
             'fields': ('first_name', 'last_name', 'national_id', 'birth_date', 'gender')
@@ -21,7 +29,7 @@ class PatientAdmin(admin.ModelAdmin):
 
 @admin.register(Visit)
 class VisitAdmin(admin.ModelAdmin):
-    list_display = ['patient', 'visit_date', 'diagnosis_short', 'next_visit_date']
+    list_display = ['patient', 'visit_date', 'diagnosis_short', 'next_visit_date_jalali']
     list_filter = ['visit_date', 'patient']
     search_fields = ['patient__first_name', 'patient__last_name', 'diagnosis']
     ordering = ['-visit_date']
@@ -30,6 +38,11 @@ class VisitAdmin(admin.ModelAdmin):
         return obj.diagnosis[:50] + '...' if len(obj.diagnosis) > 50 else obj.diagnosis
     diagnosis_short.short_description = 'Diagnosis'
     
+    def next_visit_date_jalali(self, obj):
+        return format_jalali(obj.next_visit_date) if obj.next_visit_date else '-'
+    next_visit_date_jalali.short_description = 'Next visit date'
+    next_visit_date_jalali.admin_order_field = 'next_visit_date'
+    
     fieldsets = (
         ('Visit Information', {
             'fields': ('patient', 'visit_date')
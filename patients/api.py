@@ -0,0 +1,351 @@
+"""JSON API for patients, visits, appointments and notifications.
+
+Collections are cursor-paginated (``?cursor=``, ``?limit=``), every
+endpoint supports sparse fieldsets (``?fields=id,first_name``), and GET
+responses carry an ETag (304 on If-None-Match) and are gzip-compressed
+when the client accepts it. Dates are ISO 8601; writes also accept Jalali
+YYYY/MM/DD strings for date fields.
+"""
+import json
+import re
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import conditional_page
+
+from .fields import JalaliDateField
+from .forms import NotificationForm, PatientForm, VisitForm
+from .jalali import format_jalali
+from .models import Notification, Patient, Visit
+from .pagination import KeysetPaginator
+from .stats import daily_visit_counts, jalali_monthly_visit_counts
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_STATS_DAYS = 366
+MAX_STATS_MONTHS = 24
+
+_ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, errors=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.errors = errors
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _parse_datetime_param(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Resource:
+    """Describes how one model is exposed through the API.
+
+    ``fields`` maps each output name to ``(columns, getter)``: the model
+    columns it needs (used to narrow the SELECT for sparse fieldsets) and
+    a function producing the JSON value from an instance. Resources with a
+    ``form_class`` accept POST on the collection unless ``creatable`` is
+    False, and the ``detail_methods`` on single objects.
+    """
+
+    def __init__(self, model, fields, form_class=None, filters=None,
+                 ordering=('id',), queryset=None, create_only_fields=(),
+                 creatable=True, detail_methods=('GET', 'PUT', 'PATCH', 'DELETE')):
+        self.model = model
+        self.fields = fields
+        self.form_class = form_class
+        self.filters = filters or {}
+        self.ordering = list(ordering)
+        self._queryset = queryset
+        self.create_only_fields = create_only_fields
+        self.creatable = creatable and form_class is not None
+        self.detail_methods = detail_methods if form_class is not None else ('GET',)
+
+    def get_queryset(self):
+        if self._queryset is not None:
+            return self._queryset()
+        return self.model.objects.all()
+
+    def selected_fields(self, request):
+        requested = request.GET.get('fields')
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(400, f'Unknown field(s): {", ".join(unknown)}')
+        return names
+
+    def narrow(self, queryset, names):
+        """Load only the columns needed for ``names`` (plus the ordering keys)"""
+        columns = {name.lstrip('-') for name in self.ordering}
+        for name in names:
+            columns.update(self.fields[name][0])
+        return queryset.only(*columns)
+
+    def serialize(self, obj, names):
+        return {name: self.fields[name][1](obj) for name in names}
+
+    def apply_filters(self, queryset, params):
+        for name, apply in self.filters.items():
+            value = params.get(name)
+            if value in (None, ''):
+                continue
+            try:
+                queryset = apply(queryset, value)
+            except (ValueError, TypeError, KeyError, ValidationError):
+                raise ApiError(400, f'Invalid value for {name!r}: {value!r}')
+        return queryset
+
+
+PATIENTS = Resource(
+    Patient,
+    fields={
+        'id': (('id',), lambda p: p.id),
+        'first_name': (('first_name',), lambda p: p.first_name),
+        'last_name': (('last_name',), lambda p: p.last_name),
+        'national_id': (('national_id',), lambda p: p.national_id),
+        'birth_date': (('birth_date',), lambda p: _iso(p.birth_date)),
+        'age': (('birth_date',), lambda p: p.age),
+        'gender': (('gender',), lambda p: p.gender),
+        'phone': (('phone',), lambda p: p.phone),
+        'address': (('address',), lambda p: p.address),
+        'created_at': (('created_at',), lambda p: _iso(p.created_at)),
+        'updated_at': (('updated_at',), lambda p: _iso(p.updated_at)),
+    },
+    form_class=PatientForm,
+    filters={
+        'updated_since': lambda qs, v: qs.filter(updated_at__gt=_parse_datetime_param(v)),
+        'min_age': lambda qs, v: qs.age_between(min_age=int(v)),
+        'max_age': lambda qs, v: qs.age_between(max_age=int(v)),
+    },
+)
+
+_VISIT_FIELDS = {
+    'id': (('id',), lambda v: v.id),
+    'patient': (('patient',), lambda v: v.patient_id),
+    'visit_date': (('visit_date',), lambda v: _iso(v.visit_date)),
+    'diagnosis': (('diagnosis',), lambda v: v.diagnosis),
+    'prescription': (('prescription',), lambda v: v.prescription),
+    'notes': (('notes',), lambda v: v.notes),
+    'next_visit_date': (('next_visit_date',), lambda v: _iso(v.next_visit_date)),
+    'created_at': (('created_at',), lambda v: _iso(v.created_at)),
+    'updated_at': (('updated_at',), lambda v: _iso(v.updated_at)),
+}
+
+VISITS = Resource(
+    Visit,
+    fields=_VISIT_FIELDS,
+    form_class=VisitForm,
+    filters={
+        'patient': lambda qs, v: qs.filter(patient_id=int(v)),
+        'updated_since': lambda qs, v: qs.filter(updated_at__gt=_parse_datetime_param(v)),
+    },
+    create_only_fields=('patient',),
+)
+
+APPOINTMENTS = Resource(
+    Visit,
+    fields=_VISIT_FIELDS,
+    queryset=lambda: Visit.objects.with_appointment(),
+    ordering=('next_visit_date', 'id'),
+    filters={
+        'start': lambda qs, v: qs.filter(next_visit_date__gte=JalaliDateField().to_python(v)),
+        'end': lambda qs, v: qs.filter(next_visit_date__lte=JalaliDateField().to_python(v)),
+    },
+)
+
+NOTIFICATIONS = Resource(
+    Notification,
+    fields={
+        'id': (('id',), lambda n: n.id),
+        'title': (('title',), lambda n: n.title),
+        'message': (('message',), lambda n: n.message),
+        'notification_type': (('notification_type',), lambda n: n.notification_type),
+        'is_read': (('is_read',), lambda n: n.is_read),
+        'created_at': (('created_at',), lambda n: _iso(n.created_at)),
+        'related_patient': (('related_patient',), lambda n: n.related_patient_id),
+        'related_visit': (('related_visit',), lambda n: n.related_visit_id),
+    },
+    # Notifications are created by the system; clients only mark them read
+    form_class=NotificationForm,
+    creatable=False,
+    detail_methods=('GET', 'PATCH'),
+    ordering=('-created_at', '-id'),
+    filters={
+        'is_read': lambda qs, v: qs.filter(is_read={'true': True, 'false': False}[v.lower()]),
+        'created_since': lambda qs, v: qs.filter(created_at__gt=_parse_datetime_param(v)),
+    },
+)
+
+
+def _error_response(error):
+    payload = {'error': error.message}
+    if error.errors:
+        payload['errors'] = error.errors
+    return JsonResponse(payload, status=error.status)
+
+
+def _read_json(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError(400, 'Request body is not valid JSON')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Request body must be a JSON object')
+    return data
+
+
+def _form_data(resource, payload, instance=None):
+    """Build form data from a JSON payload, merged over ``instance`` for PATCH"""
+    form_fields = resource.form_class.base_fields
+    data = {}
+    if instance is not None:
+        initial = forms.model_to_dict(instance, fields=list(form_fields))
+        data = {name: form_fields[name].prepare_value(value) for name, value in initial.items()}
+    for name, value in payload.items():
+        if name not in form_fields:
+            continue
+        model_field = resource.model._meta.get_field(name)
+        # Accept ISO dates as well as Jalali strings
+        if isinstance(model_field, JalaliDateField) and isinstance(value, str) and _ISO_DATE_RE.match(value):
+            value = format_jalali(model_field.to_python(value))
+        data[name] = '' if value is None else value
+    return data
+
+
+def _save(request, resource, instance=None, partial=False):
+    payload = _read_json(request)
+    form = resource.form_class(_form_data(resource, payload, instance if partial else None), instance=instance)
+    if not form.is_valid():
+        raise ApiError(400, 'Validation failed', errors=form.errors.get_json_data())
+    obj = form.save(commit=False)
+    if instance is None:
+        for name in resource.create_only_fields:
+            related = resource.model._meta.get_field(name).related_model
+            try:
+                setattr(obj, name, related.objects.get(pk=int(payload.get(name))))
+            except (related.DoesNotExist, ValueError, TypeError):
+                raise ApiError(400, 'Validation failed', errors={name: [{'message': 'Invalid id', 'code': 'invalid'}]})
+    with transaction.atomic():
+        obj.save()
+    return obj
+
+
+def _require_login(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Authentication required')
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+@gzip_page
+@conditional_page
+def collection(request, resource):
+    """List (GET) or create (POST) objects of ``resource``"""
+    try:
+        _require_login(request)
+        if request.method == 'POST':
+            if not resource.creatable:
+                raise ApiError(405, 'Method not allowed')
+            obj = _save(request, resource)
+            response = JsonResponse(resource.serialize(obj, resource.selected_fields(request)), status=201)
+            response['Location'] = request.build_absolute_uri(f'{request.path}{obj.pk}/')
+            return response
+        if request.method != 'GET':
+            raise ApiError(405, 'Method not allowed')
+
+        names = resource.selected_fields(request)
+        try:
+            limit = min(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ApiError(400, 'limit must be an integer')
+        queryset = resource.apply_filters(resource.get_queryset(), request.GET)
+        queryset = resource.narrow(queryset, names)
+        page = KeysetPaginator(queryset, resource.ordering, per_page=max(limit, 1)).get_page(request.GET.get('cursor'))
+        return JsonResponse({
+            'results': [resource.serialize(obj, names) for obj in page],
+            'next': _page_url(request, page.next_cursor),
+            'previous': _page_url(request, page.previous_cursor),
+        })
+    except ApiError as error:
+        return _error_response(error)
+
+
+@gzip_page
+@conditional_page
+def detail(request, resource, pk):
+    """Retrieve (GET), update (PUT/PATCH) or delete (DELETE) one object"""
+    try:
+        _require_login(request)
+        try:
+            instance = get_object_or_404(resource.get_queryset(), pk=pk)
+        except Http404:
+            raise ApiError(404, 'Not found')
+        if request.method not in resource.detail_methods:
+            raise ApiError(405, 'Method not allowed')
+        if request.method == 'GET':
+            return JsonResponse(resource.serialize(instance, resource.selected_fields(request)))
+        if request.method in ('PUT', 'PATCH'):
+            obj = _save(request, resource, instance, partial=request.method == 'PATCH')
+            return JsonResponse(resource.serialize(obj, resource.selected_fields(request)))
+        instance.delete()
+        return HttpResponse(status=204)
+    except ApiError as error:
+        return _error_response(error)
+
+
+def _int_param(request, name, default, maximum):
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        raise ApiError(400, f'{name} must be an integer')
+    if not 1 <= value <= maximum:
+        raise ApiError(400, f'{name} must be between 1 and {maximum}')
+    return value
+
+
+@gzip_page
+@conditional_page
+def visit_stats(request):
+    """Visit counts per day (``?window=daily&days=90``) or per Jalali month (``?window=jalali_month&months=12``)"""
+    try:
+        _require_login(request)
+        if request.method != 'GET':
+            raise ApiError(405, 'Method not allowed')
+        window = request.GET.get('window', 'daily')
+        if window == 'daily':
+            series = [
+                {'date': day.isoformat(), 'visits': count}
+                for day, count in daily_visit_counts(_int_param(request, 'days', 90, MAX_STATS_DAYS))
+            ]
+        elif window == 'jalali_month':
+            series = [
+                {'month': month, 'visits': count}
+                for month, count in jalali_monthly_visit_counts(_int_param(request, 'months', 12, MAX_STATS_MONTHS))
+            ]
+        else:
+            raise ApiError(400, "window must be 'daily' or 'jalali_month'")
+        return JsonResponse({'window': window, 'results': series})
+    except ApiError as error:
+        return _error_response(error)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class PatientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'patients'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import checks, signals  # noqa: F401
+        from .middleware import install_query_recorder
+
+        connection_created.connect(install_query_recorder, dispatch_uid='patients.install_query_recorder')
@@ -0,0 +1,33 @@
+"""Django cache backends that count hits and misses for ``patients.metrics``"""
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from .metrics import record_cache_lookup
+
+_MISSING = object()
+
+
+class CacheMetricsMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        record_cache_lookup(value is not _MISSING)
+        return default if value is _MISSING else value
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
+
+
+class InstrumentedFileBasedCache(CacheMetricsMixin, FileBasedCache):
+    pass
+
+
+class InstrumentedRedisCache(CacheMetricsMixin, RedisCache):
+    def get_many(self, keys, version=None):
+        # Redis answers get_many natively instead of through get()
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        record_cache_lookup(True, len(found))
+        record_cache_lookup(False, len(keys) - len(found))
+        return found
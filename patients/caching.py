@@ -0,0 +1,97 @@
+"""Versioned caching of rendered fragments and views.
+
+Every cache entry names the *groups* of data it was built from: ``patients``,
+``visits``, ``notifications`` or one patient's records (``patient:<id>``).
+Each group has a version number stored in the cache, and the versions are
+part of the entry's key. The signals in ``patients.signals`` bump the
+groups an object belongs to when it is saved or deleted. That invalidates
+every dependent fragment for all users, languages and themes at once,
+without enumerating keys.
+
+Templates use Django's ``{% cache %}`` tag with ``{% cache_vary %}`` (from
+``{% load caching %}``) as the vary-on value; views use ``@cache_view``.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+
+FRAGMENT_TIMEOUT = 10 * 60
+
+PATIENTS = 'patients'
+VISITS = 'visits'
+NOTIFICATIONS = 'notifications'
+
+
+def patient_group(patient_id):
+    return f'patient:{patient_id}'
+
+
+def _version_key(group):
+    return f'cache-version:{group}'
+
+
+def group_versions(*groups):
+    """Current version of each group, creating missing ones"""
+    keys = [_version_key(group) for group in groups]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock, not 1, so an evicted counter cannot
+            # revive entries stored under an earlier version
+            versions[key] = cache.get_or_set(key, time.time_ns(), None)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*groups):
+    """Bump the version of ``groups``, orphaning every entry built on them"""
+    for group in groups:
+        try:
+            cache.incr(_version_key(group))
+        except ValueError:
+            cache.set(_version_key(group), time.time_ns(), None)
+
+
+def request_vary(request):
+    """Per-user, per-language and per-theme part of a key"""
+    user = getattr(request, 'user', None)
+    session = getattr(request, 'session', {})
+    return [
+        user.pk if user is not None and user.is_authenticated else 'anon',
+        session.get('language', 'fa'),
+        session.get('theme', 'light'),
+    ]
+
+
+def make_key(*parts):
+    digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return f'patients:cache:{digest}'
+
+
+def cache_view(*groups, timeout=FRAGMENT_TIMEOUT):
+    """Cache successful GET responses of a view per user/language/theme.
+
+    ``groups`` may refer to the view's URL keyword arguments, e.g.
+    ``@cache_view('patient:{patient_id}')``. Only use this for responses
+    without CSRF tokens or flashed messages (fragments, JSON).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            names = [group.format(**kwargs) for group in groups]
+            key = make_key(view.__module__, view.__name__, request.get_full_path(),
+                           *request_vary(request), *group_versions(*names))
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,30 @@
+"""System checks for the front-end build (``npm run build``)"""
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.checks import Error, register
+
+# Files the templates load from static/build/ when BUNDLED_ASSETS is on
+BUILD_FILES = [
+    'build/tailwind.min.css',
+    'build/lucide.min.js',
+    'build/vendor/vazir-font/font-face.css',
+    'build/vendor/persian-date.min.js',
+    'build/vendor/persian-datepicker.min.js',
+    'build/vendor/persian-datepicker.min.css',
+    'build/vendor/jalaali.min.js',
+    'admin/js/vendor/jquery/jquery.min.js',
+]
+
+
+@register('staticfiles')
+def check_asset_build(app_configs, **kwargs):
+    if not settings.BUNDLED_ASSETS:
+        return []
+    missing = [name for name in BUILD_FILES if not finders.find(name)]
+    if not missing:
+        return []
+    return [Error(
+        f'BUNDLED_ASSETS is on but the build is incomplete: {", ".join(missing)}',
+        hint='Run `npm install && npm run build`.',
+        id='patients.E001',
+    )]
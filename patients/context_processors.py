@@ -1,9 +1,11 @@
-from .models import Notification
+from django.conf import settings
+
+from .counters import get_unread_notifications_count
 
 def notifications_context(request):
     """Context processor for unread notifications count"""
     if request.user.is_authenticated:
-        unread_notifications_count = Notification.objects.filter(is_read=False).count()
+        unread_notifications_count = get_unread_notifications_count()
     else:
         unread_notifications_count = 0
     return {'unread_notifications_count': unread_notifications_count}
@@ -26,4 +28,9 @@ def settings_context(request):
         'current_language': 'fa',
         'notifications_enabled': True,
         'current_theme': 'light',
-    }
\ No newline at end of file
+    }
+
+
+def static_assets_context(request):
+    """Whether the self-hosted CSS and icon bundles have been built"""
+    return {'bundled_assets': settings.BUNDLED_ASSETS}
@@ -0,0 +1,80 @@
+"""Denormalized unread notification count.
+
+The count lives in the single ``NotificationCounter`` row, which every
+process updates with atomic ``unread = unread + delta`` statements from the
+``Notification`` signals, and which ``reconcile_unread_notifications_count``
+recomputes from the table to correct drift. With a shared cache
+(``SHARED_CACHE``) the value is also kept under one cache key, so reads
+usually skip the database; a per-process cache cannot be kept in step
+across workers, so the row is read instead, a primary key lookup rather
+than a COUNT.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Notification, NotificationCounter
+
+UNREAD_NOTIFICATIONS_KEY = 'patients:unread_notifications_count'
+# Upper bound on how long a drifted cached value can survive without a reconcile
+UNREAD_NOTIFICATIONS_TIMEOUT = 60 * 60
+COUNTER_ID = 1
+
+
+def _counter_row():
+    return NotificationCounter.objects.filter(pk=COUNTER_ID).values_list('unread', flat=True)
+
+
+def get_unread_notifications_count():
+    """Return the unread notification count without counting notifications"""
+    if settings.SHARED_CACHE:
+        count = cache.get(UNREAD_NOTIFICATIONS_KEY)
+        if count is not None:
+            return count
+    count = _counter_row().first()
+    if count is None:
+        return reconcile_unread_notifications_count()
+    if settings.SHARED_CACHE:
+        cache.set(UNREAD_NOTIFICATIONS_KEY, count, UNREAD_NOTIFICATIONS_TIMEOUT)
+    return count
+
+
+async def aget_unread_notifications_count():
+    """get_unread_notifications_count() for async views"""
+    if settings.SHARED_CACHE:
+        count = await cache.aget(UNREAD_NOTIFICATIONS_KEY)
+        if count is not None:
+            return count
+    count = await _counter_row().afirst()
+    if count is None:
+        count = await Notification.objects.filter(is_read=False).acount()
+    elif settings.SHARED_CACHE:
+        await cache.aset(UNREAD_NOTIFICATIONS_KEY, count, UNREAD_NOTIFICATIONS_TIMEOUT)
+    return count
+
+
+def reconcile_unread_notifications_count():
+    """Recompute the unread counter from the database and store it"""
+    with transaction.atomic():
+        count = Notification.objects.filter(is_read=False).count()
+        NotificationCounter.objects.update_or_create(pk=COUNTER_ID, defaults={'unread': count})
+    if settings.SHARED_CACHE:
+        cache.set(UNREAD_NOTIFICATIONS_KEY, count, UNREAD_NOTIFICATIONS_TIMEOUT)
+    return count
+
+
+def adjust_unread_notifications_count(delta):
+    """Atomically add ``delta`` to the counter row (and the cached value).
+    A missing row is recomputed; a missing cache key is left missing.
+    """
+    if not delta:
+        return
+    if not NotificationCounter.objects.filter(pk=COUNTER_ID).update(unread=F('unread') + delta):
+        reconcile_unread_notifications_count()
+        return
+    if settings.SHARED_CACHE:
+        try:
+            cache.incr(UNREAD_NOTIFICATIONS_KEY, delta)
+        except ValueError:
+            pass
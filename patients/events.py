@@ -0,0 +1,95 @@
+"""In-process publish/subscribe for live notification updates.
+
+``broker.publish`` may be called from any thread (signal handlers, the
+scheduler). Each subscriber is an open Server-Sent Events stream waiting on
+an ``asyncio.Queue`` in its own event loop; events are handed over with
+``call_soon_threadsafe``. Delivery only reaches streams served by the same
+process, so the streams also resend the shared unread count periodically
+(see ``views.notification_events``) to pick up changes made by other
+processes.
+"""
+import asyncio
+import threading
+
+from django.db import transaction
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, event):
+        # Runs in the subscriber's loop. A stalled client loses its oldest
+        # events rather than holding memory; the unread count catches up.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        """Register a subscription in the running event loop"""
+        subscription = Subscription(asyncio.get_running_loop(), maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:  # loop closed
+                self.unsubscribe(subscription)
+
+
+broker = Broker()
+
+
+def _unread_event():
+    from .counters import get_unread_notifications_count
+
+    return {'type': 'unread', 'count': get_unread_notifications_count()}
+
+
+def publish_unread_count():
+    """Push the unread count once the current transaction commits"""
+    if broker:
+        transaction.on_commit(lambda: broker.publish(_unread_event()))
+
+
+def publish_notification(notification):
+    """Push a new notification (and the new unread count) after commit"""
+    if not broker:
+        return
+
+    def publish():
+        event = _unread_event()
+        event.update({
+            'type': 'notification',
+            'id': notification.pk,
+            'title': notification.title,
+            'message': notification.message,
+            'notification_type': notification.notification_type,
+            'related_patient_id': notification.related_patient_id,
+        })
+        broker.publish(event)
+    transaction.on_commit(publish)
@@ -0,0 +1,83 @@
+import re
+from datetime import date
+
+from django import forms
+from django.core import exceptions
+from django.db import models
+
+from .jalali import format_jalali, parse_jalali
+
+JALALI_DATE_RE = re.compile(r'^(\d{4})/(\d{2})/(\d{2})$')
+
+
+class JalaliDateFormField(forms.CharField):
+    """Form field that accepts and displays Jalali YYYY/MM/DD strings
+    and cleans them to Gregorian ``date`` objects.
+    """
+
+    def __init__(self, *args, min_year=1300, max_year=1500, **kwargs):
+        self.min_year = min_year
+        self.max_year = max_year
+        super().__init__(*args, **kwargs)
+
+    def prepare_value(self, value):
+        if isinstance(value, date):
+            return format_jalali(value)
+        return value
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value in self.empty_values:
+            return None
+
+        # Validate Jalali date format (YYYY/MM/DD)
+        match = JALALI_DATE_RE.match(value)
+        if not match:
+            raise forms.ValidationError('فرمت تاریخ صحیح نیست. لطفاً تاریخ را به صورت YYYY/MM/DD وارد کنید.', code='invalid')
+
+        # Validate date components
+        year, month, day = (int(part) for part in match.groups())
+        if not (self.min_year <= year <= self.max_year):
+            raise forms.ValidationError(f'سال باید بین {self.min_year} تا {self.max_year} باشد.', code='invalid')
+        if not (1 <= month <= 12):
+            raise forms.ValidationError('ماه باید بین 1 تا 12 باشد.', code='invalid')
+        if not (1 <= day <= 31):
+            raise forms.ValidationError('روز باید بین 1 تا 31 باشد.', code='invalid')
+
+        try:
+            return parse_jalali(value)
+        except ValueError:
+            raise forms.ValidationError('فرمت تاریخ صحیح نیست.', code='invalid')
+
+
+class JalaliDateField(models.DateField):
+    """DateField stored as a real (indexed) Gregorian DATE column that
+    also accepts Jalali YYYY/MM/DD strings and uses a Jalali form field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('db_index') is True:
+            del kwargs['db_index']
+        else:
+            kwargs['db_index'] = False
+        return name, path, args, kwargs
+
+    def to_python(self, value):
+        if isinstance(value, str) and JALALI_DATE_RE.match(value.strip()):
+            try:
+                return parse_jalali(value)
+            except ValueError:
+                raise exceptions.ValidationError(
+                    self.error_messages['invalid_date'],
+                    code='invalid_date',
+                    params={'value': value},
+                )
+        return super().to_python(value)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': JalaliDateFormField, **kwargs})
@@ -1,6 +1,5 @@
 from django import forms
-from .models import Patient, Visit
-import re
+from .models import Notification, Patient, Visit
 
 
 class PatientForm(forms.ModelForm):
@@ -22,31 +21,6 @@ class PatientForm(forms.ModelForm):
         # Make fields required
         for field in self.fields:
             self.fields[field].required = True
-    
-    def clean_birth_date(self):
-        birth_date = self.cleaned_data.get('birth_date')
-        if birth_date:
-            # Validate Jalali date format (YYYY/MM/DD)
-            if not re.match(r'^\d{4}/\d{2}/\d{2}$', birth_date):
-                raise forms.ValidationError('فرمت تاریخ صحیح نیست. لطفاً تاریخ را به صورت YYYY/MM/DD وارد کنید.')
-            
-            # Validate date components
-            try:
-                parts = birth_date.split('/')
-                year, month, day = int(parts[0]), int(parts[1]), int(parts[2])
-                
-                # Basic validation for Jalali dates
-                if not (1300 <= year <= 1500):
-                    raise forms.ValidationError('سال باید بین 1300 تا 1500 باشد.')
-                if not (1 <= month <= 12):
-                    raise forms.ValidationError('ماه باید بین 1 تا 12 باشد.')
-                if not (1 <= day <= 31):
-                    raise forms.ValidationError('روز باید بین 1 تا 31 باشد.')
-                    
-            except ValueError:
-                raise forms.ValidationError('فرمت تاریخ صحیح نیست.')
-                
-        return birth_date
 
 
 class VisitForm(forms.ModelForm):
@@ -64,28 +38,9 @@ class VisitForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Make diagnosis required
         self.fields['diagnosis'].required = True
-    
-    def clean_next_visit_date(self):
-        next_visit_date = self.cleaned_data.get('next_visit_date')
-        if next_visit_date:
-            # Validate Jalali date format (YYYY/MM/DD)
-            if not re.match(r'^\d{4}/\d{2}/\d{2}$', next_visit_date):
-                raise forms.ValidationError('فرمت تاریخ صحیح نیست. لطفاً تاریخ را به صورت YYYY/MM/DD وارد کنید.')
-            
-            # Validate date components
-            try:
-                parts = next_visit_date.split('/')
-                year, month, day = int(parts[0]), int(parts[1]), int(parts[2])
-                
-                # Basic validation for Jalali dates
-                if not (1300 <= year <= 1500):
-                    raise forms.ValidationError('سال باید بین 1300 تا 1500 باشد.')
-                if not (1 <= month <= 12):
-                    raise forms.ValidationError('ماه باید بین 1 تا 12 باشد.')
-                if not (1 <= day <= 31):
-                    raise forms.ValidationError('روز باید بین 1 تا 31 باشد.')
-                    
-            except ValueError:
-                raise forms.ValidationError('فرمت تاریخ صحیح نیست.')
-                
-        return next_visit_date
+
+
+class NotificationForm(forms.ModelForm):
+    class Meta:
+        model = Notification
+        fields = ['is_read']
@@ -0,0 +1,130 @@
+"""Jalali (Solar Hijri) <-> Gregorian conversion.
+
+Pure integer arithmetic on proleptic Gregorian ordinals (``date.toordinal()``)
+using the 33-year leap cycle, which matches ``jdatetime`` exactly. Single
+conversions are memoized in a bounded LRU cache keyed on the ordinal, and
+the ``*_many`` helpers convert each distinct date of a batch only once.
+
+``python manage.py benchmark_jalali`` compares this module with jdatetime.
+"""
+import re
+from bisect import bisect_right
+from datetime import date, datetime
+from functools import lru_cache
+
+CACHE_SIZE = 4096
+
+_LEAP_YEARS_IN_CYCLE = (1, 5, 9, 13, 17, 22, 26, 30)
+_CYCLE_DAYS = 33 * 365 + len(_LEAP_YEARS_IN_CYCLE)
+
+# Days from the start of a 33-year cycle to the start of its n-th year (0-based)
+_CYCLE_YEAR_STARTS = [0]
+for _offset in range(1, 34):
+    _CYCLE_YEAR_STARTS.append(_CYCLE_YEAR_STARTS[-1] + 365 + (_offset % 33 in _LEAP_YEARS_IN_CYCLE))
+del _offset
+
+# Gregorian ordinal of 0001/01/01 (0622-03-21 proleptic Gregorian)
+_EPOCH = date(622, 3, 21).toordinal()
+
+_JALALI_RE = re.compile(r'^\s*(\d{4})/(\d{1,2})/(\d{1,2})\s*$')
+_FORMAT_RE = re.compile(r'%(.)')
+
+
+def is_leap(year):
+    return year % 33 in _LEAP_YEARS_IN_CYCLE
+
+
+def days_in_month(year, month):
+    if month <= 6:
+        return 31
+    if month <= 11:
+        return 30
+    return 30 if is_leap(year) else 29
+
+
+def _days_before_month(month):
+    return (month - 1) * 31 if month <= 7 else 186 + (month - 7) * 30
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def jalali_to_ordinal(year, month, day):
+    """Gregorian ordinal of a Jalali date. Raises ValueError if it does not exist"""
+    if not (1 <= month <= 12 and 1 <= day <= days_in_month(year, month)) or year < 1:
+        raise ValueError(f'{year:04d}/{month:02d}/{day:02d} is not a valid Jalali date')
+    cycles, year_in_cycle = divmod(year - 1, 33)
+    return _EPOCH + cycles * _CYCLE_DAYS + _CYCLE_YEAR_STARTS[year_in_cycle] + _days_before_month(month) + day - 1
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def ordinal_to_jalali(ordinal):
+    """(year, month, day) of the Jalali date for a Gregorian ordinal"""
+    cycles, days = divmod(ordinal - _EPOCH, _CYCLE_DAYS)
+    year_in_cycle = bisect_right(_CYCLE_YEAR_STARTS, days) - 1
+    day_of_year = days - _CYCLE_YEAR_STARTS[year_in_cycle]
+    if day_of_year < 186:
+        month, day = divmod(day_of_year, 31)
+    else:
+        month, day = divmod(day_of_year - 186, 30)
+        month += 6
+    return cycles * 33 + year_in_cycle + 1, month + 1, day + 1
+
+
+def to_jalali(value):
+    """(year, month, day) for a Gregorian ``date`` or ``datetime``"""
+    return ordinal_to_jalali(value.toordinal())
+
+
+def to_gregorian(year, month, day):
+    return date.fromordinal(jalali_to_ordinal(year, month, day))
+
+
+def to_jalali_many(values):
+    """Convert a sequence of dates, converting each distinct day once"""
+    ordinals = [value.toordinal() for value in values]
+    converted = {ordinal: ordinal_to_jalali(ordinal) for ordinal in set(ordinals)}
+    return [converted[ordinal] for ordinal in ordinals]
+
+
+def to_gregorian_many(triples):
+    """Convert a sequence of Jalali (year, month, day) tuples to ``date`` objects"""
+    return [date.fromordinal(jalali_to_ordinal(*triple)) for triple in triples]
+
+
+def parse_jalali(value):
+    """Parse a Jalali YYYY/MM/DD string into a Gregorian ``date``.
+    Raises ValueError for malformed strings or impossible dates.
+    """
+    # Fast path for the canonical, ASCII zero-padded form
+    if len(value) == 10 and value[4] == '/' and value[7] == '/' and value.isascii():
+        year, month, day = value[:4], value[5:7], value[8:]
+        if year.isdigit() and month.isdigit() and day.isdigit():
+            return to_gregorian(int(year), int(month), int(day))
+    match = _JALALI_RE.match(value)
+    if not match:
+        raise ValueError(f'{value!r} is not a Jalali YYYY/MM/DD date')
+    return to_gregorian(*(int(part) for part in match.groups()))
+
+
+def format_jalali(value, fmt='%Y/%m/%d'):
+    """Format a Gregorian ``date``/``datetime`` as Jalali.
+
+    Supports %Y, %y, %m, %d, %H, %M, %S and %% (times are 00:00:00 for dates).
+    """
+    year, month, day = ordinal_to_jalali(value.toordinal())
+    if fmt == '%Y/%m/%d':
+        return f'{year:04d}/{month:02d}/{day:02d}'
+
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    fields = {
+        'Y': f'{year:04d}', 'y': f'{year % 100:02d}', 'm': f'{month:02d}', 'd': f'{day:02d}',
+        'H': f'{value.hour:02d}', 'M': f'{value.minute:02d}', 'S': f'{value.second:02d}', '%': '%',
+    }
+
+    def replace(match):
+        try:
+            return fields[match.group(1)]
+        except KeyError:
+            raise ValueError(f'Unsupported Jalali format directive %{match.group(1)}')
+
+    return _FORMAT_RE.sub(replace, fmt)
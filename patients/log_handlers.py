@@ -0,0 +1,15 @@
+"""Logging handlers used by ``LOGGING`` in the settings"""
+import os
+from logging.handlers import RotatingFileHandler
+
+
+class LogDirRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that creates the log directory on the first write"""
+
+    def __init__(self, filename, *args, **kwargs):
+        kwargs['delay'] = True
+        super().__init__(filename, *args, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
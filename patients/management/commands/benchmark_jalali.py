@@ -0,0 +1,52 @@
+import random
+import timeit
+from datetime import date, datetime, timedelta
+
+import jdatetime
+from django.core.management.base import BaseCommand
+
+from patients import jalali
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark patients.jalali against jdatetime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dates', type=int, default=10000, help='Number of random dates per run')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per case; the best is reported')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        start = date(1950, 1, 1)
+        dates = [start + timedelta(days=rng.randrange(36500)) for _ in range(options['dates'])]
+        datetimes = [datetime(d.year, d.month, d.day, rng.randrange(24), rng.randrange(60)) for d in dates]
+        strings = [jalali.format_jalali(d) for d in dates]
+
+        cases = [
+            ('format date',
+             lambda: [jdatetime.date.fromgregorian(date=d).strftime('%Y/%m/%d') for d in dates],
+             lambda: [jalali.format_jalali(d) for d in dates]),
+            ('format datetime',
+             lambda: [jdatetime.datetime.fromgregorian(datetime=d).strftime('%Y/%m/%d - %H:%M') for d in datetimes],
+             lambda: [jalali.format_jalali(d, '%Y/%m/%d - %H:%M') for d in datetimes]),
+            ('parse',
+             lambda: [jdatetime.date(*map(int, s.split('/'))).togregorian() for s in strings],
+             lambda: [jalali.parse_jalali(s) for s in strings]),
+            ('batch to_jalali',
+             lambda: [jdatetime.date.fromgregorian(date=d) for d in dates],
+             lambda: jalali.to_jalali_many(dates)),
+        ]
+
+        self.stdout.write(f'{len(dates)} dates, best of {options["repeat"]} runs')
+        self.stdout.write(f'{"case":<18}{"jdatetime":>12}{"jalali":>12}{"speedup":>10}')
+        for name, baseline, candidate in cases:
+            baseline_time = min(timeit.repeat(baseline, number=1, repeat=options['repeat']))
+            # Cold cache for every run so memoization does not flatter the numbers
+            candidate_time = min(timeit.repeat(
+                candidate, number=1, repeat=options['repeat'],
+                setup=lambda: (jalali.ordinal_to_jalali.cache_clear(), jalali.jalali_to_ordinal.cache_clear()),
+            ))
+            self.stdout.write(
+                f'{name:<18}{baseline_time * 1000:>10.1f}ms{candidate_time * 1000:>10.1f}ms'
+                f'{baseline_time / candidate_time:>9.1f}x'
+            )
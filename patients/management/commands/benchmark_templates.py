@@ -0,0 +1,95 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.utils import timezone
+
+from patients.management.commands.benchmark_views import percentile
+from patients.models import Notification, Patient, PatientSummary, Visit
+from patients.pagination import KeysetPage
+
+
+class Command(BaseCommand):
+    help = 'Time loading and rendering of the list templates with N rows of in-memory data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per list')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed renders per template')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed renders per template first')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['iterations'] < 1:
+            raise CommandError('--rows and --iterations must be positive')
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = {}
+
+        rows = options['rows']
+        for template_name, context in self._cases(rows):
+            load_times, render_times = [], []
+            for iteration in range(options['warmup'] + options['iterations']):
+                # Fragment caches would turn every render after the first into a lookup
+                cache.clear()
+                started = time.perf_counter()
+                template = get_template(template_name)
+                loaded = time.perf_counter()
+                template.render(context, request)
+                rendered = time.perf_counter()
+                if iteration >= options['warmup']:
+                    load_times.append((loaded - started) * 1000)
+                    render_times.append((rendered - loaded) * 1000)
+
+            render_p50 = percentile(render_times, 50)
+            self.stdout.write(
+                f'{template_name:<20} load {percentile(load_times, 50):>7.2f} ms  '
+                f'render p50 {render_p50:>8.2f} ms  p95 {percentile(render_times, 95):>8.2f} ms  '
+                f'{render_p50 * 1000 / rows:>6.1f} µs/row'
+            )
+
+    def _cases(self, rows):
+        """(template, context) pairs built from unsaved objects, so no query runs"""
+        now = timezone.now()
+        today = timezone.localdate()
+        patients = []
+        for i in range(1, rows + 1):
+            patient = Patient(
+                id=i, first_name='علی', last_name=f'محمدی {i}', national_id=f'{i:010d}',
+                birth_date=today - timedelta(days=365 * 40), gender='M', phone='09120000000',
+            )
+            patient.age = 40
+            patient.summary = PatientSummary(visit_count=i % 7, last_visit_date=now - timedelta(days=i % 60))
+            patients.append(patient)
+        visits = [
+            Visit(
+                id=i, patient=patient, visit_date=now - timedelta(hours=i), diagnosis='کنترل دوره‌ای فشار خون',
+                next_visit_date=today + timedelta(days=i % 30),
+            )
+            for i, patient in enumerate(patients, start=1)
+        ]
+        notifications = [
+            Notification(
+                id=i, title='قرار ملاقات', message=f'قرار ملاقات {patient.full_name} نزدیک است',
+                notification_type='appointment', is_read=i % 3 == 0, related_patient=patient, created_at=now,
+            )
+            for i, patient in enumerate(patients, start=1)
+        ]
+        stats = {'today_visits': 3, 'week_visits': 20, 'month_visits': 80, 'total_patients': rows}
+        return [
+            ('patients.html', {
+                'patients': KeysetPage(patients), 'page': KeysetPage(patients), 'total_patients': rows,
+                'search_query': '', 'min_age': '', 'max_age': '',
+            }),
+            ('dashboard.html', {'stats': stats, 'recent_visits': visits, 'recent_patients': patients}),
+            ('appointments.html', {
+                'appointments': KeysetPage(visits), 'page': KeysetPage(visits), 'total_appointments': rows,
+                'upcoming_appointments': visits,
+            }),
+            ('notifications.html', {
+                'notifications': KeysetPage(notifications), 'page': KeysetPage(notifications),
+                'unread_only': False, 'unread_count': rows,
+            }),
+        ]
@@ -0,0 +1,169 @@
+import json
+import math
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from patients.models import Notification, Patient, Visit
+
+# Metrics compared against a baseline; a larger value is worse for all of them
+METRICS = ['p50_ms', 'p95_ms', 'queries', 'peak_kb']
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def _host():
+    # The test client's default "testserver" is only allowed under the test runner
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main views through the test client: latency, queries and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per view')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per view first')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--username', help='Log in as this user (default: anonymous)')
+        parser.add_argument('--save', metavar='PATH', help='Write the results as a JSON baseline')
+        parser.add_argument('--compare', metavar='PATH', help='Compare against a saved baseline')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Relative increase reported as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive')
+        client = Client(SERVER_NAME=_host())
+        if options['username']:
+            try:
+                client.force_login(User.objects.get(username=options['username']))
+            except User.DoesNotExist:
+                raise CommandError(f'No user named {options["username"]!r}')
+
+        results = {}
+        for name, url in self._cases():
+            results[name] = self._measure(client, url, options)
+            self._write_row(name, results[name])
+
+        baseline = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'options': {key: options[key] for key in ('requests', 'warmup', 'cold')},
+            'database': {
+                'vendor': connection.vendor,
+                'patients': Patient.objects.count(),
+                'visits': Visit.objects.count(),
+                'notifications': Notification.objects.count(),
+            },
+            'results': results,
+        }
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as output:
+                json.dump(baseline, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline to {options["save"]}'))
+        if options['compare']:
+            regressions = self._compare(options['compare'], results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+
+    def _cases(self):
+        patient = Patient.objects.order_by('-summary__visit_count', 'id').first()
+        if patient is None:
+            raise CommandError('No patients to benchmark; run generate_data first')
+        return [
+            ('dashboard', reverse('dashboard')),
+            ('patients_list', reverse('patients')),
+            ('patients_search', reverse('patients') + '?' + urlencode({'search': patient.last_name})),
+            ('patient_detail', reverse('patient_detail', args=[patient.pk])),
+            ('appointments', reverse('appointments')),
+            ('notifications', reverse('notifications')),
+        ]
+
+    def _get(self, client, url, cold):
+        if cold:
+            cache.clear()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} returned {response.status_code}')
+        return response
+
+    def _measure(self, client, url, options):
+        for _ in range(options['warmup']):
+            self._get(client, url, options['cold'])
+
+        timings = []
+        for _ in range(options['requests']):
+            started = time.perf_counter()
+            self._get(client, url, options['cold'])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Queries and memory are measured on separate requests so the
+        # instrumentation does not skew the timings. Queries are counted with
+        # an execute wrapper because every request resets connection.queries.
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            self._get(client, url, options['cold'])
+        tracemalloc.start()
+        try:
+            self._get(client, url, options['cold'])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries': len(queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def _write_row(self, name, result):
+        self.stdout.write(
+            f'{name:<18} p50 {result["p50_ms"]:>8.2f} ms  p95 {result["p95_ms"]:>8.2f} ms  '
+            f'{result["queries"]:>3} queries  peak {result["peak_kb"]:>9.1f} KiB'
+        )
+
+    def _compare(self, path, results, threshold):
+        try:
+            with open(path, encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)['results']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Cannot read baseline {path}: {error}')
+
+        self.stdout.write(f'\nCompared with {path}:')
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            changes = []
+            for metric in METRICS:
+                before, after = baseline[name][metric], result[metric]
+                change = (after - before) / before if before else (1.0 if after else 0.0)
+                changes.append(f'{metric} {change:+.0%}')
+                if change > threshold:
+                    regressions.append(f'{name} {metric}')
+            self.stdout.write(f'{name:<18} ' + '  '.join(changes))
+        if regressions:
+            self.stdout.write(self.style.WARNING('Regressions: ' + ', '.join(regressions)))
+        return regressions
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from patients.transfer import EXPORTERS, FORMATS, export_lines, format_from_name
+
+
+class Command(BaseCommand):
+    help = 'Stream patients or visits as CSV or JSONL to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTERS))
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the output extension, else csv')
+        parser.add_argument('--output', help='File to write; stdout when omitted')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or (output and format_from_name(output)) or 'csv'
+        lines = export_lines(options['kind'], fmt)
+        if not output:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(output, 'w', encoding='utf-8', newline='') as stream:
+            stream.writelines(lines)
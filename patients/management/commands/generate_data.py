@@ -0,0 +1,177 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from patients import stats
+from patients.caching import NOTIFICATIONS, PATIENTS, VISITS, invalidate
+from patients.counters import reconcile_unread_notifications_count
+from patients.models import Notification, Patient, Visit
+from patients.search import rebuild_search_index
+from patients.summaries import rebuild_patient_summaries
+
+MALE_NAMES = ['علی', 'محمد', 'حسین', 'رضا', 'مهدی', 'امیر', 'حسن', 'سعید', 'مجید', 'کامران', 'بهرام', 'پویا', 'آرش', 'داریوش', 'کیوان']
+FEMALE_NAMES = ['فاطمه', 'زهرا', 'مریم', 'سارا', 'نرگس', 'لیلا', 'مینا', 'الهام', 'شیرین', 'پریسا', 'نازنین', 'آزاده', 'سمیرا', 'ترانه', 'یاسمن']
+LAST_NAMES = [
+    'محمدی', 'حسینی', 'احمدی', 'رضایی', 'موسوی', 'کریمی', 'جعفری', 'صادقی', 'رحیمی', 'هاشمی',
+    'قاسمی', 'نوری', 'اکبری', 'طاهری', 'کاظمی', 'یزدانی', 'شریفی', 'بهرامی', 'فراهانی', 'تهرانی',
+]
+CITIES = ['تهران', 'مشهد', 'اصفهان', 'شیراز', 'تبریز', 'کرج', 'قم', 'اهواز', 'رشت', 'کرمان']
+STREETS = ['خیابان آزادی', 'خیابان انقلاب', 'خیابان ولیعصر', 'بلوار کشاورز', 'خیابان فردوسی', 'خیابان حافظ']
+DIAGNOSES = [
+    ('سرماخوردگی', 'استامینوفن ۵۰۰ - هر ۸ ساعت'),
+    ('سردرد میگرنی', 'سوماتریپتان ۵۰ - در صورت نیاز'),
+    ('فشار خون بالا', 'لوزارتان ۲۵ - روزی یک عدد'),
+    ('دیابت نوع ۲', 'متفورمین ۵۰۰ - دو بار در روز'),
+    ('گاستریت', 'امپرازول ۲۰ - ناشتا'),
+    ('کمردرد', 'ناپروکسن ۲۵۰ - هر ۱۲ ساعت'),
+    ('عفونت ادراری', 'سیپروفلوکساسین ۵۰۰ - هر ۱۲ ساعت'),
+    ('آلرژی فصلی', 'لوراتادین ۱۰ - روزی یک عدد'),
+    ('کم‌خونی فقر آهن', 'فروس سولفات - روزی یک عدد'),
+    ('کنترل دوره‌ای', ''),
+]
+NOTES = ['', '', '', 'آزمایش خون درخواست شد', 'به متخصص ارجاع شد', 'رژیم غذایی توصیه شد', 'سابقه حساسیت دارویی']
+NAMED_PER_BATCH = 200
+NOTIFICATION_TEXTS = {
+    'appointment': ('قرار ملاقات', 'قرار ملاقات {name} نزدیک است'),
+    'reminder': ('یادآوری', 'پیگیری نتیجه آزمایش {name}'),
+    'visit': ('ویزیت جدید', 'ویزیت جدید برای {name} ثبت شد'),
+    'system': ('سیستم', 'پشتیبان‌گیری از اطلاعات انجام شد'),
+}
+
+
+def national_id(serial):
+    """10-digit Iranian national code with a valid check digit"""
+    digits = f'{serial:09d}'
+    remainder = sum(int(digit) * (10 - i) for i, digit in enumerate(digits)) % 11
+    return digits + str(remainder if remainder < 2 else 11 - remainder)
+
+
+def bulk_create_with_dates(model, objs, field_names, batch_size):
+    """bulk_create, then write back the explicit values of auto_now_add fields.
+
+    bulk_create stamps auto_now_add fields with the current time, so the
+    generated dates are restored with a follow-up bulk_update.
+    """
+    objs = list(objs)
+    dates = [[getattr(obj, name) for name in field_names] for obj in objs]
+    created = model.objects.bulk_create(objs, batch_size=batch_size)
+    for obj, values in zip(created, dates):
+        for name, value in zip(field_names, values):
+            setattr(obj, name, value)
+    model.objects.bulk_update(created, field_names, batch_size=batch_size)
+    return created
+
+
+def next_serial():
+    """Serial after the largest existing 10-digit national_id, so reruns never reuse one"""
+    last = Patient.objects.filter(national_id__regex=r'^[0-9]{10}$').aggregate(last=Max('national_id'))['last']
+    return int(last[:9]) + 1 if last else 1
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic Persian dataset of patients, visits and notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=1000, help='Number of patients to create')
+        parser.add_argument('--visits', type=float, default=5, help='Average visits per patient')
+        parser.add_argument('--notifications', type=int, default=None, help='Defaults to half the patients')
+        parser.add_argument('--days', type=int, default=730, help='Spread visit dates over this many past days')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Patients per transaction')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help='Delete all patients, visits and notifications first')
+
+    def handle(self, *args, **options):
+        if options['patients'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--patients and --batch-size must be positive')
+        rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.today = timezone.localdate()
+
+        if options['clear']:
+            Notification.objects.all().delete()
+            Patient.objects.all().delete()
+        serial = next_serial()
+
+        # A bounded sample of (pk, last_name) pairs for notifications to refer to
+        patient_count, visit_count, named = 0, 0, []
+        remaining = options['patients']
+        while remaining:
+            size = min(remaining, options['batch_size'])
+            with transaction.atomic():
+                patients = bulk_create_with_dates(
+                    Patient, self._patients(rng, serial, size, options['days']), ['created_at'], options['batch_size']
+                )
+                visits = bulk_create_with_dates(
+                    Visit, self._visits(rng, patients, options['visits'], options['days']),
+                    ['visit_date', 'created_at'], options['batch_size'],
+                )
+            named.extend((patient.pk, patient.last_name) for patient in rng.sample(patients, min(size, NAMED_PER_BATCH)))
+            patient_count += size
+            visit_count += len(visits)
+            serial += size
+            remaining -= size
+            self.stdout.write(f'{patient_count} patients, {visit_count} visits')
+
+        notifications = options['notifications']
+        if notifications is None:
+            notifications = options['patients'] // 2
+        with transaction.atomic():
+            bulk_create_with_dates(
+                Notification, self._notifications(rng, named, notifications), ['created_at'], options['batch_size']
+            )
+
+        # bulk_create sends no signals: rebuild everything they maintain
+        rebuild_patient_summaries()
+        rebuild_search_index(Patient.objects.all())
+        reconcile_unread_notifications_count()
+        stats.invalidate_all()
+        invalidate(PATIENTS, VISITS, NOTIFICATIONS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {patient_count} patients, {visit_count} visits and {notifications} notifications.'
+        ))
+
+    def _past(self, rng, days):
+        return self.now - timedelta(days=rng.uniform(0, days))
+
+    def _patients(self, rng, first_serial, count, days):
+        for serial in range(first_serial, first_serial + count):
+            gender = rng.choice('MMMMFFFFFO')
+            yield Patient(
+                first_name=rng.choice(FEMALE_NAMES if gender == 'F' else MALE_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                national_id=national_id(serial),
+                birth_date=self.today - timedelta(days=rng.randrange(365, 90 * 365)),
+                gender=gender,
+                phone=f'09{rng.randrange(10**9):09d}',
+                address=f'{rng.choice(CITIES)}، {rng.choice(STREETS)}، پلاک {rng.randrange(1, 300)}',
+                created_at=self._past(rng, days),
+            )
+
+    def _visits(self, rng, patients, average, days):
+        for patient in patients:
+            visit_dates = sorted(self._past(rng, days) for _ in range(int(rng.uniform(0, 2 * average) + 0.5)))
+            for i, visit_date in enumerate(visit_dates):
+                diagnosis, prescription = rng.choice(DIAGNOSES)
+                # Follow-ups from the latest visit land anywhere from last month to six months ahead
+                next_visit_date = None
+                if i == len(visit_dates) - 1 and rng.random() < 0.6:
+                    next_visit_date = self.today + timedelta(days=rng.randrange(-30, 180))
+                yield Visit(
+                    patient_id=patient.pk, visit_date=visit_date, created_at=visit_date,
+                    diagnosis=diagnosis, prescription=prescription, notes=rng.choice(NOTES),
+                    next_visit_date=next_visit_date,
+                )
+
+    def _notifications(self, rng, named, count):
+        for _ in range(count):
+            kind = rng.choice(list(NOTIFICATION_TEXTS))
+            title, message = NOTIFICATION_TEXTS[kind]
+            patient_id, name = rng.choice(named) if kind != 'system' else (None, '')
+            yield Notification(
+                title=title, message=message.format(name=name), notification_type=kind,
+                is_read=rng.random() < 0.7, related_patient_id=patient_id, created_at=self._past(rng, 60),
+            )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from patients.notifications import create_appointment_notifications
+
+
+class Command(BaseCommand):
+    help = 'Create appointment notifications for visits due in the next 7 days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-check every visit in the window instead of only those changed since the last run',
+        )
+
+    def handle(self, *args, **options):
+        created = create_appointment_notifications(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'{created} notification(s) created.'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.transfer import DEFAULT_CHUNK_SIZE, FORMATS, IMPORTERS, format_from_name
+
+
+class Command(BaseCommand):
+    help = 'Import patients or visits from a CSV or JSONL file, validating each row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per transaction')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or format_from_name(options['path'])
+        if fmt is None:
+            raise CommandError('Cannot infer the format from the file name, pass --format')
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = IMPORTERS[options['kind']](stream, fmt, chunk_size=options['chunk_size'])
+        except OSError as error:
+            raise CommandError(error)
+
+        for line, errors in result.errors:
+            self.stderr.write(f'line {line}: {errors}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} {options["kind"]}, {len(result.errors)} row(s) rejected.'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from patients.notifications import RETENTION_BATCH_SIZE, purge_read_notifications
+
+
+class Command(BaseCommand):
+    help = 'Archive (or delete) read notifications older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Defaults to NOTIFICATION_RETENTION_DAYS')
+        parser.add_argument('--delete', action='store_true', help='Delete without archiving')
+        parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        removed = purge_read_notifications(
+            days=options['days'],
+            archive=False if options['delete'] else None,
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{removed} notification(s) removed.'))
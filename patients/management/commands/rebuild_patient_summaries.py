@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from patients.summaries import REBUILD_BATCH_SIZE, rebuild_patient_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed per-patient visit statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = rebuild_patient_summaries(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} patient summaries.'))
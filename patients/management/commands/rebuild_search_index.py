@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from patients.models import Patient
+from patients.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the patient full-text search index from the Patient table'
+
+    def handle(self, *args, **options):
+        rebuild_search_index(Patient.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Patient.objects.count()} patient(s).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from patients.counters import reconcile_unread_notifications_count
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached unread notification counter from the database'
+
+    def handle(self, *args, **options):
+        count = reconcile_unread_notifications_count()
+        self.stdout.write(self.style.SUCCESS(f'Unread notifications: {count}'))
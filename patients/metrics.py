@@ -0,0 +1,242 @@
+"""Prometheus-style metrics shared by all server processes.
+
+Each process counts in memory and periodically writes a snapshot to its
+own file in ``METRICS_DIR`` (atomically, via ``os.replace``). ``/metrics``
+adds up the snapshots of every process, so the totals are correct under
+several gunicorn workers without locks between them. Counters of workers
+that exited stay in their files, as Prometheus counters should.
+
+Sources: ``ProfilingMiddleware`` (requests, latency, queries), the
+instrumented cache backends (hits and misses), ``@timed_job`` (background
+jobs) and row counts read when the endpoint is scraped.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+FLUSH_INTERVAL = 1.0  # seconds between snapshot writes per process
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, label names, help)
+METRICS = {
+    'requests_total': ('counter', ('view', 'method', 'status'), 'Requests handled, by URL name, method and status'),
+    'request_duration_seconds': ('histogram', ('view',), 'Request latency by URL name'),
+    'db_queries_total': ('counter', ('view',), 'SQL queries executed, by URL name'),
+    'db_query_seconds_total': ('counter', ('view',), 'Time spent in SQL, by URL name'),
+    'cache_requests_total': ('counter', ('result',), 'Cache lookups by result (hit or miss)'),
+    'job_runs_total': ('counter', ('job',), 'Background job runs'),
+    'job_duration_seconds': ('histogram', ('job',), 'Background job duration'),
+    'job_rows_total': ('counter', ('job',), 'Rows produced by background jobs'),
+}
+PREFIX = 'doctormanager_'
+
+
+class Registry:
+    """In-process counters and histograms, snapshotted to ``directory``"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [count per bucket..., sum, count]
+        self.last_flush = 0.0
+        self.filename = None
+        self.dirty = False
+
+    def reset(self, directory):
+        """Start over, empty, writing to ``directory``"""
+        with self.flush_lock, self.lock:
+            self.directory = directory
+            self.counters = {}
+            self.histograms = {}
+            self.filename = None
+            self.dirty = False
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.dirty = True
+        self._maybe_flush()
+
+    def observe(self, name, value, labels=()):
+        with self.lock:
+            key = (name, labels)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * len(LATENCY_BUCKETS) + [0, 0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+            self.dirty = True
+        self._maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+    def _maybe_flush(self):
+        # Skip when another thread is already writing the snapshot
+        if time.monotonic() - self.last_flush >= FLUSH_INTERVAL and self.flush_lock.acquire(blocking=False):
+            try:
+                self._write_snapshot()
+            finally:
+                self.flush_lock.release()
+
+    def flush(self):
+        with self.flush_lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        self.last_flush = time.monotonic()
+        if not self.dirty:
+            return
+        self.dirty = False
+        if self.filename is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # pid plus start time, so a reused pid never overwrites another process's counts
+            self.filename = os.path.join(self.directory, f'{os.getpid()}-{time.time_ns()}.json')
+        temporary = f'{self.filename}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(temporary, self.filename)
+
+    def collect(self):
+        """Snapshots of every process, this one taken live"""
+        self.flush()
+        if not os.path.isdir(self.directory):
+            return []
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                continue  # being replaced or removed concurrently
+        return snapshots
+
+
+registry = Registry(settings.METRICS_DIR)
+atexit.register(registry.flush)
+
+
+@receiver(setting_changed)
+def switch_metrics_dir(setting, value, **kwargs):
+    # Lets tests point the registry at a temporary directory
+    if setting == 'METRICS_DIR':
+        registry.reset(value)
+
+
+def observe_request(url_name, method, status, seconds, queries, sql_seconds):
+    registry.inc('requests_total', (url_name, method, str(status)))
+    registry.observe('request_duration_seconds', seconds, (url_name,))
+    if queries:
+        registry.inc('db_queries_total', (url_name,), queries)
+        registry.inc('db_query_seconds_total', (url_name,), sql_seconds)
+
+
+def record_cache_lookup(hit, count=1):
+    if count:
+        registry.inc('cache_requests_total', ('hit' if hit else 'miss',), count)
+
+
+def timed_job(name):
+    """Record runs and duration of a job; an int result counts as rows produced"""
+    def decorator(job):
+        @wraps(job)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = job(*args, **kwargs)
+            registry.inc('job_runs_total', (name,))
+            registry.observe('job_duration_seconds', time.perf_counter() - started, (name,))
+            if isinstance(result, int):
+                registry.inc('job_rows_total', (name,), result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _aggregate(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot.get('histograms', []):
+            key = (name, tuple(labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return counters, histograms
+
+
+def _table_rows():
+    from .models import Notification, Patient, Visit
+
+    return {model._meta.model_name: model.objects.count() for model in (Patient, Visit, Notification)}
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    counters, histograms = _aggregate(registry.collect())
+    lines = []
+    for name, (kind, label_names, help_text) in METRICS.items():
+        series = histograms if kind == 'histogram' else counters
+        keys = sorted(key for key in series if key[0] == name)
+        lines += [f'# HELP {PREFIX}{name} {help_text}', f'# TYPE {PREFIX}{name} {kind}']
+        for key in keys:
+            labels = list(zip(label_names, key[1]))
+            if kind == 'counter':
+                lines.append(f'{PREFIX}{name}{_labels(labels)} {_number(series[key])}')
+                continue
+            values = series[key]
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, values):
+                cumulative += count
+                lines.append(f'{PREFIX}{name}_bucket{_labels(labels + [("le", bound)])} {cumulative}')
+            lines.append(f'{PREFIX}{name}_bucket{_labels(labels + [("le", "+Inf")])} {values[-1]}')
+            lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {_number(values[-2])}')
+            lines.append(f'{PREFIX}{name}_count{_labels(labels)} {values[-1]}')
+
+    hits = counters.get(('cache_requests_total', ('hit',)), 0)
+    lookups = hits + counters.get(('cache_requests_total', ('miss',)), 0)
+    lines += [
+        f'# HELP {PREFIX}cache_hit_ratio Share of cache lookups that hit, since the counters started',
+        f'# TYPE {PREFIX}cache_hit_ratio gauge',
+        f'{PREFIX}cache_hit_ratio {_number(hits / lookups if lookups else 0.0)}',
+        f'# HELP {PREFIX}table_rows Rows per table',
+        f'# TYPE {PREFIX}table_rows gauge',
+    ]
+    for table, rows in _table_rows().items():
+        lines.append(f'{PREFIX}table_rows{_labels([("table", table)])} {rows}')
+    return '\n'.join(lines) + '\n'
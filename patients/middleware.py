@@ -1,21 +1,41 @@
+import json
+import logging
+import os
+import posixpath
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.utils import translation
 from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+from .metrics import observe_request
+from .staticfiles import StaticFile, StaticFileIndex
+
+performance_logger = logging.getLogger('patients.performance')
 
 
 class LanguageMiddleware:
     """Middleware to set language based on user session"""
     
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         # Get language from session, default to 'fa'
-        language = request.session.get('language', 'fa')
-        
-        # Set the language for this request
-        if language in ['fa', 'en']:
-            translation.activate(language)
-            request.LANGUAGE_CODE = language
+        self._activate(request, request.session.get('language', 'fa'))
         
         response = self.get_response(request)
         
@@ -23,3 +43,285 @@ class LanguageMiddleware:
         translation.deactivate()
         
         return response
+
+    async def __acall__(self, request):
+        self._activate(request, await request.session.aget('language', 'fa'))
+        response = await self.get_response(request)
+        translation.deactivate()
+        return response
+
+    def _activate(self, request, language):
+        # Set the language for this request
+        if language in ['fa', 'en']:
+            translation.activate(language)
+            request.LANGUAGE_CODE = language
+
+
+STATIC_MAX_AGE = 60  # seconds, for files without a content hash in their name
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, parameters = part.partition(';')
+        quality = parameters.strip().lower()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """Serve ``STATIC_URL`` from the application, WhiteNoise style.
+
+    Outside DEBUG the files collected in ``STATIC_ROOT`` are indexed once
+    at startup. Hashed names (see ``patients.staticfiles``) are cached by
+    browsers for a year, others for ``STATIC_MAX_AGE``, and a ``.br`` or
+    ``.gz`` copy is sent when the client accepts it. With DEBUG, files are
+    looked up through the staticfiles finders on every request instead, so
+    edits show up without ``collectstatic``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        static_url = settings.STATIC_URL or ''
+        if '://' in static_url or static_url.startswith('//'):
+            raise MiddlewareNotUsed  # served from another host
+        self.get_response = get_response
+        self.prefix = '/' + static_url.strip('/') + '/'
+        self.autorefresh = settings.DEBUG
+        self.index = None if self.autorefresh else StaticFileIndex(settings.STATIC_ROOT)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self._serve(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        # Index lookups and opening a file do not need a thread
+        response = self._serve(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+    def _find(self, name):
+        if self.index is not None:
+            return self.index.get(name)
+        name = posixpath.normpath(name).lstrip('/')
+        if name.startswith('..'):
+            return None
+        path = finders.find(name)
+        return StaticFile(path) if path and os.path.isfile(path) else None
+
+    def _serve(self, request):
+        if not request.path_info.startswith(self.prefix):
+            return None
+        static_file = self._find(request.path_info[len(self.prefix):])
+        if static_file is None:
+            return None
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = next((encoding for encoding in static_file.variants if encoding in accepted), None)
+        path, size = static_file.variants[encoding] if encoding else (static_file.path, static_file.size)
+        if static_file.immutable:
+            cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        elif self.autorefresh:
+            cache_control = 'no-cache'
+        else:
+            cache_control = f'public, max-age={STATIC_MAX_AGE}'
+        headers = {
+            'Cache-Control': cache_control,
+            'ETag': static_file.etag(encoding),
+            'Last-Modified': http_date(static_file.mtime),
+        }
+        if static_file.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            not_modified = headers['ETag'] in if_none_match or if_none_match.strip() == '*'
+        else:
+            modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            not_modified = modified_since is not None and int(static_file.mtime) <= modified_since
+        if not_modified:
+            return HttpResponseNotModified(headers=headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type, headers=headers)
+            response['Content-Length'] = size
+            return response
+        response = FileResponse(open(path, 'rb'), content_type=static_file.content_type, headers=headers)
+        # FileResponse names the (possibly compressed) file; static assets are inline
+        del response['Content-Disposition']
+        return response
+
+
+_current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Timings collected while one request is handled"""
+
+    def __init__(self):
+        self.queries = []  # (sql, seconds)
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, perf_counter() - started))
+
+    def record_render(self, render, *args):
+        # Only the outermost render counts; nested ones are part of it
+        self.template_depth += 1
+        started = perf_counter()
+        try:
+            return render(*args)
+        finally:
+            self.template_depth -= 1
+            if not self.template_depth:
+                self.template_time += perf_counter() - started
+
+    @property
+    def sql_time(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def duplicates(self):
+        """Statements run more than once (same SQL, any parameters), most repeated first"""
+        counts = Counter(sql for sql, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count > 1]
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver: attach the query recorder for good.
+
+    Async views run their queries in ``sync_to_async`` worker threads, each
+    with its own connection, so a wrapper set around the request in the
+    middleware would miss them. The recorder stays on every connection and
+    reports to the profile of the request in the current context, which
+    asgiref carries into those threads.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def record_template_render(render, *args):
+    """Call ``render(*args)``, adding its time to the current request's profile.
+
+    Used by ``patients.template_backends`` so only templates rendered through
+    the configured engine are timed, without patching Django's classes.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return render(*args)
+    return profile.record_render(render, *args)
+
+
+class ProfilingMiddleware:
+    """Per-request view name, total/SQL/template time, query count and repeated queries.
+
+    Timings go out in a ``Server-Timing`` header and to ``patients.metrics``.
+    Requests slower than ``PROFILING_SLOW_REQUEST_MS`` are logged as JSON to
+    the ``patients.performance`` logger with their slowest and repeated queries.
+    Queries are captured by a wrapper installed on every connection (see
+    ``install_query_recorder``) so this works with ``DEBUG=False`` and for
+    async views, and the per-query cost is one timer call. Template time
+    comes from the ``patients.template_backends`` engine.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'PROFILING_SLOW_REQUEST_MS', 500)
+        self.logged_queries = getattr(settings, 'PROFILING_LOGGED_QUERIES', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self._finish(request, response, profile, started)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self._finish(request, response, profile, started)
+
+    def _finish(self, request, response, profile, started):
+        # For streaming responses this covers the time to the first byte
+        total_ms = (perf_counter() - started) * 1000
+
+        sql_ms = profile.sql_time * 1000
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={sql_ms:.1f};desc="{len(profile.queries)} queries"',
+            f'tpl;dur={profile.template_time * 1000:.1f}',
+        ])
+        match = request.resolver_match
+        observe_request(
+            match.view_name if match else 'unmatched', request.method, response.status_code,
+            total_ms / 1000, len(profile.queries), profile.sql_time,
+        )
+        if total_ms >= self.slow_request_ms:
+            self._log_slow_request(request, response, profile, total_ms, sql_ms)
+        return response
+
+    def _log_slow_request(self, request, response, profile, total_ms, sql_ms):
+        match = request.resolver_match
+        duplicates = profile.duplicates()
+        slowest = sorted(profile.queries, key=lambda query: query[1], reverse=True)[:self.logged_queries]
+        performance_logger.warning(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'sql_ms': round(sql_ms, 1),
+            'queries': len(profile.queries),
+            'template_ms': round(profile.template_time * 1000, 1),
+            'duplicate_queries': sum(count - 1 for _, count in duplicates),
+            'slowest_queries': [{'sql': sql, 'ms': round(seconds * 1000, 2)} for sql, seconds in slowest],
+            'repeated_queries': [{'sql': sql, 'count': count} for sql, count in duplicates[:self.logged_queries]],
+        }, ensure_ascii=False))
@@ -0,0 +1,104 @@
+# Converts the Jalali YYYY/MM/DD text columns to indexed Gregorian DATE columns.
+
+import jdatetime
+from django.db import migrations, models
+
+import patients.fields
+
+BATCH_SIZE = 500
+
+
+def _convert(model, source, target, parse):
+    """Copy ``source`` into ``target`` in primary-key ordered batches"""
+    last_pk = 0
+    while True:
+        batch = list(
+            model.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', source)[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for obj in batch:
+            value = getattr(obj, source)
+            try:
+                setattr(obj, target, parse(value) if value else None)
+            except (ValueError, IndexError):
+                # Unparseable legacy values become NULL
+                setattr(obj, target, None)
+        model.objects.bulk_update(batch, [target])
+        last_pk = batch[-1].pk
+
+
+def _jalali_to_gregorian(value):
+    year, month, day = (int(part) for part in value.strip().split('/'))
+    return jdatetime.date(year, month, day).togregorian()
+
+
+def _gregorian_to_jalali(value):
+    return jdatetime.date.fromgregorian(date=value).strftime('%Y/%m/%d')
+
+
+def forwards(apps, schema_editor):
+    _convert(apps.get_model('patients', 'Patient'), 'birth_date', 'birth_date_gregorian', _jalali_to_gregorian)
+    _convert(apps.get_model('patients', 'Visit'), 'next_visit_date', 'next_visit_date_gregorian', _jalali_to_gregorian)
+
+
+def backwards(apps, schema_editor):
+    _convert(apps.get_model('patients', 'Patient'), 'birth_date_gregorian', 'birth_date', _gregorian_to_jalali)
+    _convert(apps.get_model('patients', 'Visit'), 'next_visit_date_gregorian', 'next_visit_date', _gregorian_to_jalali)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0005_jobstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='birth_date_gregorian',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='next_visit_date_gregorian',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(forwards, backwards),
+        # Give the legacy column a default so the migration can be reversed
+        migrations.AlterField(
+            model_name='patient',
+            name='birth_date',
+            field=models.CharField(default='', help_text='تاریخ تولد به صورت شمسی (YYYY/MM/DD)', max_length=10),
+        ),
+        migrations.RemoveField(
+            model_name='patient',
+            name='birth_date',
+        ),
+        migrations.RemoveField(
+            model_name='visit',
+            name='next_visit_date',
+        ),
+        migrations.RenameField(
+            model_name='patient',
+            old_name='birth_date_gregorian',
+            new_name='birth_date',
+        ),
+        migrations.RenameField(
+            model_name='visit',
+            old_name='next_visit_date_gregorian',
+            new_name='next_visit_date',
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='birth_date',
+            field=patients.fields.JalaliDateField(help_text='تاریخ تولد به صورت شمسی (YYYY/MM/DD)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='visit',
+            name='next_visit_date',
+            field=patients.fields.JalaliDateField(blank=True, help_text='تاریخ ویزیت بعدی به صورت شمسی (YYYY/MM/DD)', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:30
+
+import patients.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0006_jalali_date_columns'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visit',
+            name='next_visit_date',
+            field=patients.fields.JalaliDateField(blank=True, db_index=False, help_text='تاریخ ویزیت بعدی به صورت شمسی (YYYY/MM/DD)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(condition=models.Q(('next_visit_date__isnull', False)), fields=['next_visit_date', 'id'], name='visit_next_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:31
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_unread(apps, schema_editor):
+    """Keep only the newest unread notification per (visit, type)"""
+    Notification = apps.get_model('patients', 'Notification')
+    unread = Notification.objects.filter(is_read=False, related_visit__isnull=False)
+    keep = unread.values('related_visit', 'notification_type').annotate(keep_id=Max('id')).values('keep_id')
+    unread.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0007_visit_appointment_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_unread, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_read', False)), fields=('related_visit', 'notification_type'), name='unique_unread_visit_notification'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Creates the patient search index (FTS5 on SQLite, pg_trgm on PostgreSQL).
+#
+# The DDL and the text normalization are copied from patients.search as
+# they were when this migration was written, so later changes there do not
+# alter what this migration does.
+
+import re
+
+from django.db import migrations
+
+SEARCH_TABLE = 'patients_patient_search'
+BATCH_SIZE = 1000
+
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    '\u200c': ' ',
+})
+_DIACRITICS_RE = re.compile('[\u064b-\u065f\u0670\u0640]')
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "name, national_id, phone, tokenize='unicode61 remove_diacritics 2')",
+]
+SQLITE_INSERT = f'INSERT INTO {SEARCH_TABLE} (rowid, name, national_id, phone) VALUES (%s, %s, %s, %s)'
+
+POSTGRES_CREATE = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+    'patient_id bigint PRIMARY KEY REFERENCES patients_patient (id) ON DELETE CASCADE, '
+    'document text NOT NULL)',
+    f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_trgm ON {SEARCH_TABLE} USING gin (document gin_trgm_ops)',
+]
+POSTGRES_INSERT = (
+    f'INSERT INTO {SEARCH_TABLE} (patient_id, document) VALUES (%s, %s) '
+    'ON CONFLICT (patient_id) DO UPDATE SET document = EXCLUDED.document'
+)
+
+
+def _normalize(text):
+    if not text:
+        return ''
+    return _DIACRITICS_RE.sub('', str(text).translate(_CHAR_MAP)).lower()
+
+
+def _sqlite_row(pk, first_name, last_name, national_id, phone):
+    return pk, _normalize(f'{first_name} {last_name}'), _normalize(national_id), _normalize(phone)
+
+
+def _postgres_row(pk, first_name, last_name, national_id, phone):
+    return pk, _normalize(f'{first_name} {last_name} {national_id} {phone}')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements, insert, make_row = SQLITE_CREATE, SQLITE_INSERT, _sqlite_row
+    elif vendor == 'postgresql':
+        statements, insert, make_row = POSTGRES_CREATE, POSTGRES_INSERT, _postgres_row
+    else:
+        return  # other backends search with icontains
+
+    Patient = apps.get_model('patients', 'Patient')
+    rows = Patient.objects.order_by('pk').values_list('id', 'first_name', 'last_name', 'national_id', 'phone')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+        for statement in statements:
+            cursor.execute(statement)
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(make_row(*row))
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0008_notification_unique_unread_visit'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
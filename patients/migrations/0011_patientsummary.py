@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:36
+
+import django.db.models.deletion
+import patients.fields
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+
+def build_summaries(apps, schema_editor):
+    Patient = apps.get_model('patients', 'Patient')
+    PatientSummary = apps.get_model('patients', 'PatientSummary')
+    Visit = apps.get_model('patients', 'Visit')
+    stats = Visit.objects.order_by().values('patient_id').annotate(
+        visit_count=Count('id'),
+        first_visit_date=Min('visit_date'),
+        last_visit_date=Max('visit_date'),
+        next_appointment_date=Min('next_visit_date', filter=Q(next_visit_date__gte=timezone.localdate())),
+    )
+    by_patient = {row.pop('patient_id'): row for row in stats}
+    PatientSummary.objects.bulk_create(
+        [PatientSummary(patient_id=pk, **by_patient.get(pk, {})) for pk in Patient.objects.values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0010_patient_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSummary',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='patients.patient')),
+                ('visit_count', models.PositiveIntegerField(default=0)),
+                ('first_visit_date', models.DateTimeField(blank=True, null=True)),
+                ('last_visit_date', models.DateTimeField(blank=True, null=True)),
+                ('next_appointment_date', patients.fields.JalaliDateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0011_patientsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['visit_date'], name='visit_date_idx'),
+        ),
+    ]
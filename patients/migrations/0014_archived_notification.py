@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0013_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(choices=[('appointment', 'قرار ملاقات'), ('reminder', 'یادآوری'), ('system', 'سیستم'), ('visit', 'ویزیت')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('related_patient_id', models.BigIntegerField(blank=True, null=True)),
+                ('related_visit_id', models.BigIntegerField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    Notification = apps.get_model('patients', 'Notification')
+    NotificationCounter = apps.get_model('patients', 'NotificationCounter')
+    NotificationCounter.objects.create(pk=1, unread=Notification.objects.filter(is_read=False).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0014_archived_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,56 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
-from datetime import date
+from datetime import date, timedelta
+
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .fields import JalaliDateField
+
+MAX_AGE = 150
+
+
+def _years_before(day, years):
+    """``day`` shifted back ``years`` years (Feb 29 becomes Feb 28)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+def age_on(birth_date, day):
+    """Completed years between ``birth_date`` and ``day``"""
+    return day.year - birth_date.year - ((day.month, day.day) < (birth_date.month, birth_date.day))
+
+
+class PatientQuerySet(models.QuerySet):
+    def annotate_age(self, today=None):
+        """Annotate ``age`` (completed years) computed in SQL from birth_date.
+        Allows ``.order_by('age')``; the annotation also fills ``Patient.age``.
+        """
+        today = today or timezone.localdate()
+        birthday_not_reached = Q(birth_date__month__gt=today.month) | Q(
+            birth_date__month=today.month, birth_date__day__gt=today.day
+        )
+        return self.annotate(age=Value(today.year) - ExtractYear('birth_date') - Case(
+            When(birthday_not_reached, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+    
+    def age_between(self, min_age=None, max_age=None, today=None):
+        """Patients aged min_age..max_age inclusive, as an indexed birth_date range"""
+        today = today or timezone.localdate()
+        queryset = self
+        # Ages are clamped to 0..MAX_AGE so the shifted dates stay representable
+        if min_age is not None:
+            queryset = queryset.filter(birth_date__lte=_years_before(today, min(max(min_age, 0), MAX_AGE)))
+        if max_age is not None:
+            queryset = queryset.filter(birth_date__gt=_years_before(today, min(max(max_age, 0), MAX_AGE) + 1))
+        return queryset
 
 
 class Patient(models.Model):
@@ -21,7 +70,7 @@ class Patient(models.Model):
             message='کد ملی باید فقط شامل اعداد باشد'
         )]
     )
-    birth_date = models.CharField(max_length=10, help_text="تاریخ تولد به صورت شمسی (YYYY/MM/DD)")
+    birth_date = JalaliDateField(null=True, help_text="تاریخ تولد به صورت شمسی (YYYY/MM/DD)")
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
     phone = models.CharField(
         max_length=15,
@@ -34,8 +83,16 @@ class Patient(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PatientQuerySet.as_manager()
+    
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # Name ordering and keyset pagination of the patient list
+            models.Index(fields=['last_name', 'first_name', 'id'], name='patient_name_id_idx'),
+            # Dashboard "recent patients"
+            models.Index(fields=['created_at'], name='patient_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -44,25 +101,27 @@ class Patient(models.Model):
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
     
-    @property
+    @cached_property
     def age(self):
+        # Set directly by PatientQuerySet.annotate_age() when annotated
         if not self.birth_date:
             return None
-        
-        try:
-            # Parse Jalali date (YYYY/MM/DD)
-            parts = self.birth_date.split('/')
-            if len(parts) != 3:
-                return None
-                
-            jalali_year = int(parts[0])
-            
-            # Simple age calculation from Jalali year (approximate)
-            current_jalali_year = 1403  # Current Jalali year
-            return current_jalali_year - jalali_year
-                
-        except (ValueError, IndexError):
-            return None
+        return age_on(self.birth_date, timezone.localdate())
+
+
+class VisitQuerySet(models.QuerySet):
+    def with_appointment(self):
+        """Visits that have a next visit date, in appointment order"""
+        return self.filter(next_visit_date__isnull=False).order_by('next_visit_date', 'id')
+    
+    def appointments_between(self, start, end):
+        """Appointments with start <= next_visit_date <= end"""
+        return self.filter(next_visit_date__range=(start, end)).order_by('next_visit_date', 'id')
+    
+    def upcoming(self, days=7):
+        """Appointments from today through the next ``days`` days"""
+        today = timezone.localdate()
+        return self.appointments_between(today, today + timedelta(days=days))
 
 
 class Visit(models.Model):
@@ -71,17 +130,44 @@ class Visit(models.Model):
     diagnosis = models.TextField()
     prescription = models.TextField(blank=True)
     notes = models.TextField(blank=True)
-    next_visit_date = models.CharField(max_length=10, null=True, blank=True, help_text="تاریخ ویزیت بعدی به صورت شمسی (YYYY/MM/DD)")
+    next_visit_date = JalaliDateField(null=True, blank=True, db_index=False, help_text="تاریخ ویزیت بعدی به صورت شمسی (YYYY/MM/DD)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = VisitQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-visit_date']
+        indexes = [
+            # Per-patient visit history and last-visit lookups
+            models.Index(fields=['patient', 'visit_date'], name='visit_patient_date_idx'),
+            # Dashboard counters and chart buckets (half-open visit_date ranges)
+            models.Index(fields=['visit_date'], name='visit_date_idx'),
+            # Appointment range scans and keyset pagination
+            models.Index(
+                fields=['next_visit_date', 'id'],
+                name='visit_next_date_id_idx',
+                condition=models.Q(next_visit_date__isnull=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.patient.full_name} - {self.visit_date.strftime('%Y-%m-%d')}"
 
 
+class PatientSummary(models.Model):
+    """Precomputed visit statistics per patient, kept current by Visit signals"""
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    visit_count = models.PositiveIntegerField(default=0)
+    first_visit_date = models.DateTimeField(null=True, blank=True)
+    last_visit_date = models.DateTimeField(null=True, blank=True)
+    next_appointment_date = JalaliDateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.patient} - {self.visit_count}"
+
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('appointment', 'قرار ملاقات'),
@@ -100,6 +186,58 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Notification list and API keyset pagination (-created_at, -id)
+            models.Index(fields=['created_at', 'id'], name='notification_created_id_idx'),
+            # Unread count and unread lists (partial, to match the ORM's ``NOT is_read``)
+            models.Index(
+                fields=['created_at', 'id'],
+                name='notification_unread_idx',
+                condition=models.Q(is_read=False),
+            ),
+        ]
+        constraints = [
+            # At most one unread notification of each type per visit
+            models.UniqueConstraint(
+                fields=['related_visit', 'notification_type'],
+                condition=models.Q(is_read=False),
+                name='unique_unread_visit_notification',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class ArchivedNotification(models.Model):
+    """Read notifications moved out of the Notification table by the retention job"""
+    original_id = models.BigIntegerField(unique=True)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    created_at = models.DateTimeField()
+    # Plain ids: the archive outlives the patients and visits it mentions
+    related_patient_id = models.BigIntegerField(null=True, blank=True)
+    related_visit_id = models.BigIntegerField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.title} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class NotificationCounter(models.Model):
+    """Single row holding the number of unread notifications (see patients.counters)"""
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.unread} unread'
+
+
+class JobState(models.Model):
+    """Bookkeeping for background jobs (last successful run watermark)"""
+    name = models.CharField(max_length=100, unique=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.title} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return self.name
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import NOTIFICATIONS, invalidate
+from .counters import reconcile_unread_notifications_count
+from .events import publish_unread_count
+from .jalali import format_jalali
+from .metrics import timed_job
+from .models import ArchivedNotification, JobState, Notification, Visit
+
+APPOINTMENT_JOB_NAME = 'appointment_notifications'
+APPOINTMENT_WINDOW_DAYS = 7
+BULK_BATCH_SIZE = 500
+RETENTION_JOB_NAME = 'notification_retention'
+RETENTION_BATCH_SIZE = 1000
+ARCHIVED_FIELDS = ['id', 'title', 'message', 'notification_type', 'created_at', 'related_patient_id', 'related_visit_id']
+
+
+def _appointment_text(visit, days_until):
+    """Build the title and message of an appointment notification"""
+    name = visit.patient.full_name
+    jalali_date = format_jalali(visit.next_visit_date)
+    if days_until == 0:
+        title = f"قرار ملاقات امروز - {name}"
+        message = f"قرار ملاقات با {name} امروز است."
+    elif days_until == 1:
+        title = f"قرار ملاقات فردا - {name}"
+        message = f"قرار ملاقات با {name} فردا است."
+    elif days_until <= 3:
+        title = f"قرار ملاقات نزدیک - {name}"
+        message = f"قرار ملاقات با {name} در {days_until} روز آینده ({jalali_date}) است."
+    else:
+        title = f"قرار ملاقات هفته آینده - {name}"
+        message = f"قرار ملاقات با {name} در {days_until} روز آینده ({jalali_date}) است."
+    return title, message
+
+
+@timed_job(APPOINTMENT_JOB_NAME)
+def create_appointment_notifications(full=False):
+    """Create notifications for upcoming appointments (next 7 days).
+
+    Runs incrementally: only visits changed since the previous run, or
+    visits that entered the 7-day window since then, are examined.
+    Pass ``full=True`` to re-check every visit inside the window.
+    Returns the number of notifications inserted. It is counted before
+    and after the insert in one transaction: exact on SQLite, where that
+    transaction holds the write lock; on PostgreSQL a row inserted by a
+    concurrent run in between is counted by both runs.
+    """
+    started_at = timezone.now()
+    state, _ = JobState.objects.get_or_create(name=APPOINTMENT_JOB_NAME)
+
+    today = timezone.localdate()
+    next_week = today + timedelta(days=APPOINTMENT_WINDOW_DAYS)
+
+    # Clean up orphaned notifications (notifications for deleted patients)
+    Notification.objects.filter(related_patient__isnull=True).delete()
+
+    visits = Visit.objects.appointments_between(today, next_week).select_related('patient')
+
+    if state.last_run_at and not full:
+        last_window_end = timezone.localdate(state.last_run_at) + timedelta(days=APPOINTMENT_WINDOW_DAYS)
+        visits = visits.filter(
+            Q(updated_at__gte=state.last_run_at) |
+            Q(next_visit_date__gt=last_window_end)
+        )
+
+    unread_reminders = Notification.objects.filter(
+        related_visit__in=visits.values('pk'),
+        notification_type='appointment',
+        is_read=False,
+    ).order_by()
+    # Visits that already have an unread appointment notification, in one query
+    already_notified = set(unread_reminders.values_list('related_visit_id', flat=True))
+
+    notifications = []
+    for visit in visits:
+        if visit.pk in already_notified:
+            continue
+        title, message = _appointment_text(visit, (visit.next_visit_date - today).days)
+        notifications.append(Notification(
+            title=title,
+            message=message,
+            notification_type='appointment',
+            related_patient=visit.patient,
+            related_visit=visit
+        ))
+
+    created = 0
+    if notifications:
+        # The unique constraint on unread (related_visit, notification_type)
+        # makes concurrent runs skip rows another run has already inserted.
+        # ignore_conflicts does not report the skipped rows, so count them.
+        with transaction.atomic():
+            before = unread_reminders.count()
+            Notification.objects.bulk_create(notifications, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+            created = unread_reminders.count() - before
+    if created:
+        # bulk_create sends no signals, so refresh the cached counter and
+        # rendered notification lists here
+        reconcile_unread_notifications_count()
+        invalidate(NOTIFICATIONS)
+        publish_unread_count()
+
+    state.last_run_at = started_at
+    state.save(update_fields=['last_run_at', 'updated_at'])
+    return created
+
+
+@timed_job(RETENTION_JOB_NAME)
+def purge_read_notifications(days=None, archive=None, batch_size=RETENTION_BATCH_SIZE):
+    """Remove read notifications older than ``days`` from the Notification table.
+
+    Rows are copied to ArchivedNotification first unless ``archive`` is
+    False. Works in batches of ``batch_size``, one transaction each, so
+    locks stay short. Unread notifications are never touched. Defaults come
+    from NOTIFICATION_RETENTION_DAYS and NOTIFICATION_ARCHIVE.
+    Returns the number of notifications removed.
+    """
+    if days is None:
+        days = settings.NOTIFICATION_RETENTION_DAYS
+    if archive is None:
+        archive = settings.NOTIFICATION_ARCHIVE
+    expired = Notification.objects.filter(is_read=True, created_at__lt=timezone.now() - timedelta(days=days))
+
+    removed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(expired.order_by('created_at', 'id').values_list(*ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                break
+            if archive:
+                ArchivedNotification.objects.bulk_create(
+                    (ArchivedNotification(original_id=row[0], **dict(zip(ARCHIVED_FIELDS[1:], row[1:]))) for row in rows),
+                    ignore_conflicts=True,
+                )
+            # Only read rows are deleted, so the unread counter stays correct
+            Notification.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        removed += len(rows)
+
+    if removed:
+        invalidate(NOTIFICATIONS)
+    return removed
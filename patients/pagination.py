@@ -0,0 +1,153 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Keeps microseconds, which DjangoJSONEncoder drops; a truncated
+    datetime in a cursor would skip rows created in the same millisecond.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """Keyset (seek) pagination over a queryset.
+
+    ``ordering`` must end in a unique field (usually ``id``) so that
+    every row has a distinct position. Pages are located with an indexed
+    ``WHERE (a, b, id) > (...)`` style predicate instead of OFFSET, so the
+    cost of a page does not grow with how deep into the result it is.
+
+    Usage:
+        page = KeysetPaginator(qs, ['next_visit_date', 'id']).get_page(request.GET.get('cursor'))
+    """
+
+    def __init__(self, queryset, ordering, per_page=25):
+        self.queryset = queryset
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in ordering
+        ]
+        self.per_page = per_page
+
+    def _field(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def encode_cursor(self, obj, direction):
+        values = [getattr(obj, name) for name, _ in self.ordering]
+        payload = json.dumps([direction, values], cls=_CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return ``(direction, values)`` or None for a missing/invalid cursor"""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, raw_values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in ('n', 'p') or len(raw_values) != len(self.ordering):
+                return None
+            values = []
+            for (name, _), value in zip(self.ordering, raw_values):
+                field = self._field(name)
+                values.append(field.to_python(value) if field is not None else value)
+            return direction, values
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            return None
+
+    def _seek(self, values, forward):
+        """Build the row-value comparison for rows after (or before) ``values``"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            greater = descending != forward
+            lookup = f'{name}__gt' if greater else f'{name}__lt'
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        # The OR chain alone gives the planner no range on the index; a bound
+        # on the first column lets it seek instead of scanning from the start
+        (name, descending), value = self.ordering[0], values[0]
+        if len(self.ordering) > 1 and value is not None:
+            bound = f'{name}__gte' if descending != forward else f'{name}__lte'
+            condition = Q(**{bound: value}) & condition
+        return condition
+
+    def _order_by(self, forward):
+        return [
+            f'-{name}' if descending == forward else name
+            for name, descending in self.ordering
+        ]
+
+    def _page_queryset(self, cursor):
+        decoded = self.decode_cursor(cursor)
+        forward = decoded is None or decoded[0] == 'n'
+
+        queryset = self.queryset.order_by(*self._order_by(forward))
+        if decoded is not None:
+            queryset = queryset.filter(self._seek(decoded[1], forward))
+        return queryset[:self.per_page + 1], decoded, forward
+
+    def _build_page(self, rows, decoded, forward):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([])
+
+        if forward:
+            next_cursor = self.encode_cursor(rows[-1], 'n') if has_more else None
+            previous_cursor = self.encode_cursor(rows[0], 'p') if decoded is not None else None
+        else:
+            next_cursor = self.encode_cursor(rows[-1], 'n')
+            previous_cursor = self.encode_cursor(rows[0], 'p') if has_more else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        queryset, decoded, forward = self._page_queryset(cursor)
+        return self._build_page(list(queryset), decoded, forward)
+
+    async def aget_page(self, cursor=None):
+        """get_page() for async views, using the async ORM"""
+        queryset, decoded, forward = self._page_queryset(cursor)
+        return self._build_page([row async for row in queryset], decoded, forward)
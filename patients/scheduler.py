@@ -0,0 +1,106 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_JOB_NAME = 'scheduler'
+# Share of the interval a run may start early, so timer drift between
+# processes does not make every other tick miss its claim
+CLAIM_SLACK = 0.1
+
+_scheduler_thread = None
+_scheduler_lock = threading.Lock()
+_stop_event = threading.Event()
+
+
+def _scheduled_jobs():
+    from .counters import reconcile_unread_notifications_count
+    from .notifications import create_appointment_notifications, purge_read_notifications
+    from .summaries import refresh_stale_next_appointments
+
+    return [
+        create_appointment_notifications,
+        purge_read_notifications,
+        refresh_stale_next_appointments,
+        # Corrects drift in the cached counter (e.g. per-process caches)
+        reconcile_unread_notifications_count,
+    ]
+
+
+def claim_run(interval, now=None):
+    """Claim this interval's run of the scheduled jobs for the current process.
+
+    Every server process starts a scheduler thread. A conditional UPDATE of
+    the shared ``JobState`` row lets only the first process that finds the
+    previous run at least ``interval`` seconds old run the jobs; the others
+    skip this tick.
+    """
+    from .models import JobState
+
+    now = now or timezone.now()
+    JobState.objects.get_or_create(name=SCHEDULER_JOB_NAME)
+    due = Q(last_run_at__isnull=True) | Q(last_run_at__lte=now - timedelta(seconds=interval * (1 - CLAIM_SLACK)))
+    return JobState.objects.filter(due, name=SCHEDULER_JOB_NAME).update(last_run_at=now) == 1
+
+
+def _run_forever(interval):
+    """Run the scheduled jobs every ``interval`` seconds"""
+    jobs = _scheduled_jobs()
+
+    while not _stop_event.wait(interval):
+        close_old_connections()
+        try:
+            claimed = claim_run(interval)
+        except Exception:
+            logger.exception('Could not claim the scheduled run')
+            claimed = False
+        if not claimed:
+            close_old_connections()
+            continue
+        for job in jobs:
+            try:
+                result = job()
+                logger.debug('Scheduled job %s returned %s', job.__name__, result)
+            except Exception:
+                logger.exception('Scheduled job %s failed', job.__name__)
+        close_old_connections()
+
+
+def start_scheduler():
+    """Start the in-process notification scheduler once per process.
+
+    Each process checks every interval, but only one of them runs the jobs
+    (see ``claim_run``).
+
+    The interval is read from ``NOTIFICATION_SCHEDULER_INTERVAL`` (seconds);
+    a value of 0 disables the scheduler, e.g. when the
+    ``generate_notifications`` command is run from cron instead.
+    """
+    global _scheduler_thread
+
+    interval = getattr(settings, 'NOTIFICATION_SCHEDULER_INTERVAL', 0)
+    if not interval:
+        return None
+
+    with _scheduler_lock:
+        if _scheduler_thread is None or not _scheduler_thread.is_alive():
+            _stop_event.clear()
+            _scheduler_thread = threading.Thread(
+                target=_run_forever,
+                args=(interval,),
+                name='notification-scheduler',
+                daemon=True,
+            )
+            _scheduler_thread.start()
+    return _scheduler_thread
+
+
+def stop_scheduler():
+    """Ask the scheduler thread to exit after its current run"""
+    _stop_event.set()
@@ -0,0 +1,238 @@
+"""Patient search index.
+
+SQLite uses an FTS5 virtual table and PostgreSQL a trigram (pg_trgm)
+indexed table, both named ``patients_patient_search`` and keyed by patient
+id. They are created by migration 0009 and kept in sync by the Patient
+signals in ``patients.signals``. Other backends fall back to ``icontains``.
+"""
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .caching import FRAGMENT_TIMEOUT, PATIENTS, group_versions, make_key
+from .models import Patient
+
+SEARCH_TABLE = 'patients_patient_search'
+DEFAULT_LIMIT = 50
+SUGGEST_LIMIT = 8
+SUGGEST_CANDIDATES = 3  # ranked matches fetched per suggestion, to find the prefix matches among them
+
+_CHAR_MAP = str.maketrans({
+    # Arabic letters that have a distinct Persian form
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    # Persian and Arabic-Indic digits
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    # Zero-width non-joiner separates words
+    '\u200c': ' ',
+})
+_DIACRITICS_RE = re.compile('[\u064b-\u065f\u0670\u0640]')
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize_search_text(text):
+    """Normalize Persian/Arabic letter variants, digits and diacritics"""
+    if not text:
+        return ''
+    return _DIACRITICS_RE.sub('', str(text).translate(_CHAR_MAP)).lower()
+
+
+def search_tokens(query):
+    return _TOKEN_RE.findall(normalize_search_text(query))
+
+
+class SQLiteSearchBackend:
+    """FTS5 index with prefix queries ranked by bm25"""
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "name, national_id, phone, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, cursor, rows):
+        rows = list(rows)
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, national_id, phone) VALUES (%s, %s, %s, %s)',
+            [(pk, normalize_search_text(f'{first} {last}'), normalize_search_text(nid), normalize_search_text(phone))
+             for pk, first, last, nid, phone in rows],
+        )
+
+    def remove(self, cursor, pks):
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(pk,) for pk in pks])
+
+    def search(self, cursor, tokens, limit):
+        match = ' AND '.join('"%s"*' % token for token in tokens)
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, 10.0, 5.0, 5.0), rowid LIMIT %s',
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """pg_trgm GIN index, matched by substring and ranked by word similarity"""
+
+    def create(self, cursor):
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            'patient_id bigint PRIMARY KEY REFERENCES patients_patient (id) ON DELETE CASCADE, '
+            'document text NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_trgm '
+            f'ON {SEARCH_TABLE} USING gin (document gin_trgm_ops)'
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (patient_id, document) VALUES (%s, %s) '
+            'ON CONFLICT (patient_id) DO UPDATE SET document = EXCLUDED.document',
+            [(pk, normalize_search_text(f'{first} {last} {nid} {phone}'))
+             for pk, first, last, nid, phone in rows],
+        )
+
+    def remove(self, cursor, pks):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE patient_id = ANY(%s)', [list(pks)])
+
+    def search(self, cursor, tokens, limit):
+        where = ' AND '.join(['document LIKE %s'] * len(tokens))
+        patterns = ['%' + token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%' for token in tokens]
+        cursor.execute(
+            f'SELECT patient_id FROM {SEARCH_TABLE} WHERE {where} '
+            'ORDER BY word_similarity(%s, document) DESC, patient_id LIMIT %s',
+            [*patterns, ' '.join(tokens), limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(conn=None):
+    """Return the search backend for ``conn``, or None if unsupported"""
+    backend_class = BACKENDS.get((conn or connection).vendor)
+    return backend_class() if backend_class else None
+
+
+def _patient_rows(patients):
+    return patients.values_list('id', 'first_name', 'last_name', 'national_id', 'phone')
+
+
+def index_patients(patients):
+    """Add or refresh the index entries for a Patient queryset"""
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.index(cursor, _patient_rows(patients).iterator())
+
+
+def remove_patients(pks):
+    backend = get_backend()
+    if backend is None or not pks:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, pks)
+
+
+def rebuild_search_index(patients, conn=None):
+    """Recreate the index from scratch for ``patients`` (may be a historical model queryset)"""
+    conn = conn or connection
+    backend = get_backend(conn)
+    if backend is None:
+        return
+    with conn.cursor() as cursor:
+        backend.drop(cursor)
+        backend.create(cursor)
+        backend.index(cursor, _patient_rows(patients).iterator())
+
+
+def search_patients(queryset, query, limit=DEFAULT_LIMIT):
+    """Filter ``queryset`` to patients matching ``query``, best matches first.
+
+    Every word of the query must match the start of a word in the name,
+    national ID or phone (SQLite), or appear anywhere in them (PostgreSQL).
+    """
+    tokens = search_tokens(query)
+    if not tokens:
+        return queryset.none()
+
+    backend = get_backend()
+    if backend is None:
+        condition = Q()
+        for token in tokens:
+            condition &= (
+                Q(first_name__icontains=token) |
+                Q(last_name__icontains=token) |
+                Q(national_id__icontains=token) |
+                Q(phone__icontains=token)
+            )
+        return queryset.filter(condition)[:limit]
+
+    with connection.cursor() as cursor:
+        ranked_ids = backend.search(cursor, tokens, limit)
+    if not ranked_ids:
+        return queryset.none()
+
+    rank = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ranked_ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+def _starts_with(patient, prefix):
+    return any(
+        normalize_search_text(value).startswith(prefix)
+        for value in (patient.first_name, patient.last_name, patient.full_name, patient.national_id, patient.phone)
+    )
+
+
+def suggest_patients(query, limit=SUGGEST_LIMIT):
+    """Autocomplete: up to ``limit`` patients as compact dicts.
+
+    Patients whose name, last name, national ID or phone starts with the
+    whole query come first, then the other index matches by rank. Results
+    are cached per normalized query until a patient changes, so the short
+    prefixes everyone types first are served from the cache.
+    """
+    tokens = search_tokens(query)
+    if not tokens:
+        return []
+    prefix = ' '.join(tokens)
+    key = make_key('suggest', prefix, limit, *group_versions(PATIENTS))
+    suggestions = cache.get(key)
+    if suggestions is None:
+        candidates = search_patients(
+            Patient.objects.only('first_name', 'last_name', 'national_id', 'phone'),
+            query, limit=limit * SUGGEST_CANDIDATES,
+        )
+        ranked = sorted(candidates, key=lambda patient: not _starts_with(patient, prefix))[:limit]
+        suggestions = [
+            {'id': patient.pk, 'name': patient.full_name, 'national_id': patient.national_id, 'phone': patient.phone}
+            for patient in ranked
+        ]
+        cache.set(key, suggestions, FRAGMENT_TIMEOUT)
+    return suggestions
@@ -0,0 +1,119 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .caching import NOTIFICATIONS, PATIENTS, VISITS, invalidate, patient_group
+from .counters import adjust_unread_notifications_count, reconcile_unread_notifications_count
+from .events import publish_notification, publish_unread_count
+from .models import Notification, Patient, Visit
+from .search import index_patients, remove_patients
+from .stats import invalidate_all, invalidate_today
+from .summaries import refresh_patient_summary
+
+
+@receiver(post_init, sender=Notification)
+def remember_notification_read_state(sender, instance, **kwargs):
+    """Remember is_read as loaded so saves can tell what changed"""
+    # Deferred fields are skipped; reading them here would cost a query
+    instance._loaded_is_read = instance.__dict__.get('is_read')
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count_on_save(sender, instance, created, **kwargs):
+    if created:
+        adjust_unread_notifications_count(0 if instance.is_read else 1)
+    elif instance._loaded_is_read is None:
+        # Previous state unknown: recount
+        reconcile_unread_notifications_count()
+    else:
+        adjust_unread_notifications_count(int(instance._loaded_is_read) - int(instance.is_read))
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread_notifications_count(-1)
+
+
+@receiver(post_save, sender=Patient)
+def index_patient_on_save(sender, instance, **kwargs):
+    index_patients(Patient.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Patient)
+def remove_patient_from_index(sender, instance, **kwargs):
+    remove_patients([instance.pk])
+
+
+@receiver(post_save, sender=Patient)
+def create_patient_summary(sender, instance, created, **kwargs):
+    if created:
+        refresh_patient_summary(instance.pk)
+
+
+@receiver(post_save, sender=Visit)
+def refresh_summary_on_visit_save(sender, instance, **kwargs):
+    refresh_patient_summary(instance.patient_id)
+
+
+@receiver(post_delete, sender=Visit)
+def refresh_summary_on_visit_delete(sender, instance, origin=None, **kwargs):
+    # Deleting the patient cascades to its visits and summary; nothing to refresh
+    if isinstance(origin, Patient) or getattr(origin, 'model', None) is Patient:
+        return
+    refresh_patient_summary(instance.patient_id)
+
+
+@receiver(post_save, sender=Visit)
+def invalidate_stats_on_visit_insert(sender, instance, created, **kwargs):
+    # visit_date is auto_now_add, so a new visit only lands in today's buckets
+    if created:
+        invalidate_today()
+
+
+@receiver(post_delete, sender=Visit)
+def invalidate_stats_on_visit_delete(sender, instance, **kwargs):
+    invalidate_all()
+
+
+@receiver(post_save, sender=Patient)
+def invalidate_stats_on_patient_insert(sender, instance, created, **kwargs):
+    if created:
+        invalidate_today()
+
+
+@receiver(post_delete, sender=Patient)
+def invalidate_stats_on_patient_delete(sender, instance, **kwargs):
+    invalidate_today()
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_patient_fragments(sender, instance, **kwargs):
+    invalidate(PATIENTS, patient_group(instance.pk))
+
+
+@receiver(post_save, sender=Visit)
+@receiver(post_delete, sender=Visit)
+def invalidate_visit_fragments(sender, instance, **kwargs):
+    invalidate(VISITS, patient_group(instance.patient_id))
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_fragments(sender, instance, **kwargs):
+    invalidate(NOTIFICATIONS)
+
+
+@receiver(post_save, sender=Notification)
+def push_notification_event(sender, instance, created, **kwargs):
+    if created:
+        publish_notification(instance)
+    else:
+        publish_unread_count()
+
+
+@receiver(post_delete, sender=Notification)
+def push_unread_count_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        publish_unread_count()
@@ -0,0 +1,123 @@
+"""Static file storage and lookup for ``StaticFilesMiddleware``.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` writes every
+file under a content-hashed name (``style.3f2a….css``) plus ``.gz`` and,
+when the optional ``brotli`` package is installed, ``.br`` copies of text
+assets. ``StaticFileIndex`` scans ``STATIC_ROOT`` once at startup, so the
+middleware serves each request from a dict lookup. Hashed names never
+change content and are sent with a one-year ``immutable`` cache lifetime.
+"""
+import gzip
+import json
+import mimetypes
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional: gzip copies only
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.json', '.svg', '.txt', '.html', '.map', '.xml', '.ico'}
+MIN_COMPRESS_SIZE = 256  # bytes
+MIN_COMPRESS_SAVING = 0.05  # a copy that saves less than this share is not kept
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}  # preferred first
+
+
+def compress_file(path):
+    """Write ``path.gz`` (and ``path.br``) next to a compressible file"""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    with open(path, 'rb') as source:
+        content = source.read()
+    if len(content) < MIN_COMPRESS_SIZE:
+        return []
+    compressors = {'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors['br'] = lambda data: brotli.compress(data, quality=11)
+    written = []
+    for encoding, compress in compressors.items():
+        compressed = compress(content)
+        if len(compressed) > len(content) * (1 - MIN_COMPRESS_SAVING):
+            continue
+        target = path + ENCODINGS[encoding]
+        with open(target, 'wb') as output:
+            output.write(compressed)
+        written.append(target)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus precompressed copies, written by collectstatic"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and not isinstance(processed, Exception):
+                # The original name stays servable too, so compress both
+                for stored in {name, hashed_name}:
+                    if stored and self.exists(stored):
+                        compress_file(self.path(stored))
+            yield name, hashed_name, processed
+
+
+def content_type(path):
+    guessed, _ = mimetypes.guess_type(path)
+    guessed = guessed or 'application/octet-stream'
+    if guessed.startswith('text/') or guessed in ('application/javascript', 'application/json', 'image/svg+xml'):
+        guessed += '; charset=utf-8'
+    return guessed
+
+
+class StaticFile:
+    """One servable file with its precompressed variants"""
+
+    def __init__(self, path, immutable=False):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.content_type = content_type(path)
+        self.immutable = immutable
+        self.variants = {}  # encoding -> (path, size)
+        for encoding, suffix in ENCODINGS.items():
+            try:
+                self.variants[encoding] = (path + suffix, os.stat(path + suffix).st_size)
+            except OSError:
+                continue
+
+    def etag(self, encoding=None):
+        tag = f'{self.size:x}-{int(self.mtime):x}'
+        return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+class StaticFileIndex:
+    """Every file under ``root`` by its path relative to it"""
+
+    def __init__(self, root, manifest_name=ManifestStaticFilesStorage.manifest_name):
+        self.files = {}
+        if not root or not os.path.isdir(root):
+            return
+        hashed = self._hashed_names(os.path.join(root, manifest_name))
+        compressed_suffixes = tuple(ENCODINGS.values())
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if filename.endswith(compressed_suffixes) and os.path.exists(path.rsplit('.', 1)[0]):
+                    continue  # served as a variant of the original
+                self.files[name] = StaticFile(path, immutable=name in hashed)
+
+    @staticmethod
+    def _hashed_names(manifest_path):
+        try:
+            with open(manifest_path, encoding='utf-8') as manifest:
+                return set(json.load(manifest).get('paths', {}).values())
+        except (OSError, ValueError):
+            return set()
+
+    def get(self, name):
+        return self.files.get(name)
+
+    def __len__(self):
+        return len(self.files)
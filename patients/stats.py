@@ -0,0 +1,154 @@
+"""Dashboard and chart statistics.
+
+Counters are computed with conditional aggregation over half-open
+``[start, end)`` datetime ranges on ``visit_date`` so the column index is
+usable, and cached per time bucket. Every cache key carries a version
+number. ``invalidate_today`` drops the current day's counters (a new
+visit only affects today); ``invalidate_all`` bumps the version after a
+change that can touch past buckets.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .jalali import to_gregorian, to_jalali, to_jalali_many
+from .models import Patient, Visit
+
+VERSION_KEY = 'stats:version'
+PAST_BUCKET_TIMEOUT = 24 * 60 * 60
+
+
+def _start_of(day):
+    """Aware datetime for 00:00 of ``day`` in the current timezone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def _versioned_key(version, *parts):
+    return ':'.join(['stats', str(version), *map(str, parts)])
+
+
+def _key(*parts):
+    return _versioned_key(_version(), *parts)
+
+
+def _seconds_until_tomorrow():
+    tomorrow = _start_of(timezone.localdate() + timedelta(days=1))
+    return max(int((tomorrow - timezone.now()).total_seconds()), 1)
+
+
+def invalidate_today():
+    cache.delete(_key('dashboard', timezone.localdate()))
+
+
+def invalidate_all():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def _dashboard_aggregate(today):
+    """Visit queryset and aggregates for the dashboard counters of ``today``"""
+    today_start = _start_of(today)
+    tomorrow_start = _start_of(today + timedelta(days=1))
+    week_start = _start_of(today - timedelta(days=today.weekday()))
+    month_start = _start_of(today.replace(day=1))
+
+    # One indexed range scan from the earliest bucket start
+    visits = Visit.objects.filter(
+        visit_date__gte=min(week_start, month_start),
+        visit_date__lt=tomorrow_start,
+    )
+    return visits, {
+        'today_visits': Count('id', filter=Q(visit_date__gte=today_start)),
+        'week_visits': Count('id', filter=Q(visit_date__gte=week_start)),
+        'month_visits': Count('id', filter=Q(visit_date__gte=month_start)),
+    }
+
+
+def dashboard_counts():
+    """Total patients plus today's, this week's and this month's visits"""
+    today = timezone.localdate()
+    key = _key('dashboard', today)
+    counts = cache.get(key)
+    if counts is not None:
+        return counts
+
+    visits, aggregates = _dashboard_aggregate(today)
+    counts = visits.aggregate(**aggregates)
+    counts['total_patients'] = Patient.objects.count()
+    cache.set(key, counts, _seconds_until_tomorrow())
+    return counts
+
+
+async def adashboard_counts():
+    """dashboard_counts() for async views, with the async cache and ORM"""
+    today = timezone.localdate()
+    key = _versioned_key(await cache.aget_or_set(VERSION_KEY, 1, None), 'dashboard', today)
+    counts = await cache.aget(key)
+    if counts is not None:
+        return counts
+
+    visits, aggregates = _dashboard_aggregate(today)
+    counts = await visits.aaggregate(**aggregates)
+    counts['total_patients'] = await Patient.objects.acount()
+    await cache.aset(key, counts, _seconds_until_tomorrow())
+    return counts
+
+
+def _count_by_day(start_day, end_day):
+    """{date: visits} for start_day <= date < end_day, one GROUP BY query"""
+    rows = (
+        Visit.objects.filter(visit_date__gte=_start_of(start_day), visit_date__lt=_start_of(end_day))
+        .annotate(day=TruncDate('visit_date'))
+        .order_by()
+        .values('day')
+        .annotate(count=Count('id'))
+    )
+    return {row['day']: row['count'] for row in rows}
+
+
+def daily_visit_counts(days=90):
+    """List of (date, visits) for the last ``days`` days, oldest first.
+
+    Completed days are cached until the next version bump; only today's
+    bucket is taken from the (separately cached) dashboard counters.
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+
+    key = _key('daily', start, today)
+    past = cache.get(key)
+    if past is None:
+        past = _count_by_day(start, today)
+        cache.set(key, past, PAST_BUCKET_TIMEOUT)
+
+    series = [(start + timedelta(days=offset), past.get(start + timedelta(days=offset), 0))
+              for offset in range(days - 1)]
+    series.append((today, dashboard_counts()['today_visits']))
+    return series
+
+
+def jalali_monthly_visit_counts(months=12):
+    """List of ('YYYY/MM', visits) for the last ``months`` Jalali months, oldest first"""
+    today = timezone.localdate()
+    year, month, _ = to_jalali(today)
+    month -= months - 1
+    while month < 1:
+        month += 12
+        year -= 1
+    first_day = to_gregorian(year, month, 1)
+
+    series = daily_visit_counts(days=(today - first_day).days + 1)
+    totals = {}
+    for (year, month, _), (_, count) in zip(to_jalali_many([day for day, _ in series]), series):
+        label = f'{year:04d}/{month:02d}'
+        totals[label] = totals.get(label, 0) + count
+    return list(totals.items())
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .models import Patient, PatientSummary, Visit
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def _visit_stats(today):
+    return {
+        'visit_count': Count('id'),
+        'first_visit_date': Min('visit_date'),
+        'last_visit_date': Max('visit_date'),
+        'next_appointment_date': Min('next_visit_date', filter=Q(next_visit_date__gte=today)),
+    }
+
+
+def refresh_patient_summary(patient_id):
+    """Recompute one patient's summary from their visits.
+
+    Runs in the caller's transaction (or its own), after locking the
+    patient row so concurrent visit writes for the same patient serialize.
+    """
+    with transaction.atomic():
+        if not Patient.objects.select_for_update().filter(pk=patient_id).exists():
+            return None
+        stats = Visit.objects.filter(patient_id=patient_id).aggregate(**_visit_stats(timezone.localdate()))
+        summary, _ = PatientSummary.objects.update_or_create(patient_id=patient_id, defaults=stats)
+        return summary
+
+
+def refresh_stale_next_appointments():
+    """Advance next_appointment_date for summaries whose appointment has passed"""
+    today = timezone.localdate()
+    stale = list(PatientSummary.objects.filter(next_appointment_date__lt=today).values_list('patient_id', flat=True))
+    for patient_id in stale:
+        refresh_patient_summary(patient_id)
+    return len(stale)
+
+
+def _summaries(visits, patient_ids, today):
+    stats = visits.order_by().values('patient_id').annotate(**_visit_stats(today))
+    by_patient = {row.pop('patient_id'): row for row in stats.iterator()}
+    return (PatientSummary(patient_id=patient_id, **by_patient.get(patient_id, {})) for patient_id in patient_ids)
+
+
+def rebuild_patient_summaries(batch_size=REBUILD_BATCH_SIZE, patient_ids=None):
+    """Rebuild every summary, or those of ``patient_ids``, from grouped
+    aggregate queries. Returns the number of summaries written.
+
+    With ``patient_ids`` the patients are handled ``batch_size`` at a
+    time, each batch in one transaction with its patient rows locked as
+    in ``refresh_patient_summary``.
+    """
+    today = timezone.localdate()
+    if patient_ids is None:
+        patient_ids = list(Patient.objects.values_list('pk', flat=True))
+        summaries = _summaries(Visit.objects.all(), patient_ids, today)
+        with transaction.atomic():
+            PatientSummary.objects.all().delete()
+            PatientSummary.objects.bulk_create(summaries, batch_size=batch_size)
+        return len(patient_ids)
+
+    written = 0
+    patient_ids = sorted(patient_ids)
+    for start in range(0, len(patient_ids), batch_size):
+        batch = patient_ids[start:start + batch_size]
+        with transaction.atomic():
+            locked = Patient.objects.select_for_update().filter(pk__in=batch).order_by('pk')
+            batch = list(locked.values_list('pk', flat=True))
+            PatientSummary.objects.filter(patient_id__in=batch).delete()
+            PatientSummary.objects.bulk_create(_summaries(Visit.objects.filter(patient_id__in=batch), batch, today))
+        written += len(batch)
+    return written
@@ -0,0 +1,17 @@
+"""Django template backend that reports render time to ``ProfilingMiddleware``"""
+from django.template.backends.django import DjangoTemplates, Template
+
+from .middleware import record_template_render
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        return record_template_render(super().render, context, request)
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
@@ -0,0 +1,18 @@
+from django import template
+from django.utils import timezone
+
+from patients.caching import group_versions, request_vary
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cache_vary(context, *groups):
+    """Vary-on value for ``{% cache %}``: user, language, theme, today and group versions.
+
+    Usage in templates:
+        {% cache_vary 'patients' 'visits' as vary %}
+        {% cache 600 recent_patients vary %}...{% endcache %}
+    """
+    parts = request_vary(context['request']) + [timezone.localdate()] + group_versions(*groups)
+    return ':'.join(map(str, parts))
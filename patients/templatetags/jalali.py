@@ -1,23 +1,11 @@
-from datetime import datetime, date
+from datetime import date
 from django import template
 
-try:
-    # jdatetime is a lightweight library for Jalali conversion
-    import jdatetime
-except Exception:  # pragma: no cover
-    jdatetime = None
+from patients.jalali import format_jalali
 
 register = template.Library()
 
 
-def _to_datetime(value):
-    if isinstance(value, datetime):
-        return value
-    if isinstance(value, date):
-        return datetime(value.year, value.month, value.day)
-    return None
-
-
 @register.filter(name="jalali")
 def jalali(value, fmt: str = "%Y/%m/%d"):
     """Convert Gregorian date/datetime to Jalali (Persian) string.
@@ -44,15 +32,9 @@ def jalali(value, fmt: str = "%Y/%m/%d"):
             except (ValueError, IndexError):
                 pass
 
-    dt = _to_datetime(value)
-    if not dt:
+    if not isinstance(value, date):
         return value
 
-    if jdatetime is None:
-        # Fallback to Django formatting if library is missing
-        return dt.strftime(fmt)
-
-    jdt = jdatetime.datetime.fromgregorian(datetime=dt)
-    return jdt.strftime(fmt)
+    return format_jalali(value, fmt)
 
 
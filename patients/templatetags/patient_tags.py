@@ -0,0 +1,110 @@
+"""Row partials for the patient, dashboard, appointment and notification lists.
+
+Each tag turns its objects into plain dicts first: URLs are formatted from
+a single ``reverse()``, dates are converted to Jalali and summary fields
+are read once. The partial templates then only look up dict keys inside
+their loops, which is the cheapest thing a Django template can do.
+"""
+from django import template
+from django.core.exceptions import ObjectDoesNotExist
+from django.template.defaultfilters import truncatechars
+from django.urls import reverse
+
+from patients.templatetags.jalali import jalali
+
+register = template.Library()
+
+_ID_PLACEHOLDER = 2147483647
+NOTIFICATION_ICONS = {'appointment': 'calendar', 'reminder': 'clock', 'visit': 'user'}
+
+
+def _id_url(name):
+    """URL of ``name`` with a ``{}`` slot for its id argument"""
+    return reverse(name, args=[_ID_PLACEHOLDER]).replace(str(_ID_PLACEHOLDER), '{}')
+
+
+def _summary(patient):
+    try:
+        return patient.summary
+    except ObjectDoesNotExist:
+        return None
+
+
+def patient_rows(patients):
+    detail_url = _id_url('patient_detail')
+    add_visit_url = _id_url('add_visit')
+    rows = []
+    for patient in patients:
+        summary = _summary(patient)
+        rows.append({
+            'full_name': patient.full_name,
+            'national_id': patient.national_id,
+            'phone': patient.phone,
+            'age': patient.age,
+            'last_visit': jalali(summary.last_visit_date) if summary else '',
+            'visit_count': summary.visit_count if summary else 0,
+            'detail_url': detail_url.format(patient.pk),
+            'add_visit_url': add_visit_url.format(patient.pk),
+        })
+    return rows
+
+
+@register.inclusion_tag('patient_rows.html')
+def patient_table_rows(patients):
+    return {'rows': patient_rows(patients)}
+
+
+@register.inclusion_tag('recent_patient_rows.html')
+def recent_patient_rows(patients):
+    return {'rows': patient_rows(patients)}
+
+
+@register.inclusion_tag('recent_visits.html')
+def recent_visit_items(visits):
+    detail_url = _id_url('patient_detail')
+    return {'items': [
+        {
+            'patient_name': visit.patient.full_name,
+            'visit_date': jalali(visit.visit_date, '%Y/%m/%d - %H:%M'),
+            'detail_url': detail_url.format(visit.patient_id),
+        }
+        for visit in visits
+    ]}
+
+
+@register.inclusion_tag('appointment_rows.html')
+def appointment_rows(appointments):
+    detail_url = _id_url('patient_detail')
+    return {'rows': [
+        {
+            'patient_name': appointment.patient.full_name,
+            'national_id': appointment.patient.national_id,
+            'visit_date': jalali(appointment.visit_date),
+            'next_visit_date': jalali(appointment.next_visit_date),
+            'diagnosis': appointment.diagnosis,
+            'diagnosis_preview': truncatechars(appointment.diagnosis, 50),
+            'detail_url': detail_url.format(appointment.patient_id),
+        }
+        for appointment in appointments
+    ]}
+
+
+@register.inclusion_tag('notification_items.html')
+def notification_items(notifications):
+    patient_url = _id_url('patient_detail')
+    read_url = _id_url('mark_notification_read')
+    items = []
+    for notification in notifications:
+        kind = notification.notification_type if notification.notification_type in NOTIFICATION_ICONS else 'other'
+        items.append({
+            'id': notification.pk,
+            'is_read': notification.is_read,
+            'type': kind,
+            'icon': NOTIFICATION_ICONS.get(kind, 'info'),
+            'title': notification.title,
+            'message': notification.message,
+            'created_at': jalali(notification.created_at, '%Y/%m/%d %H:%M'),
+            'patient_url': patient_url.format(notification.related_patient_id) if notification.related_patient_id else '',
+            'read_url': read_url.format(notification.pk),
+        })
+    return {'items': items}
@@ -1,3 +1,1422 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import jdatetime
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .checks import BUILD_FILES, check_asset_build
+from .caching import NOTIFICATIONS, PATIENTS, VISITS, group_versions, invalidate, patient_group
+from .metrics import Registry, _aggregate, observe_request, registry
+from .middleware import RequestProfile, StaticFilesMiddleware, _current_profile
+from .counters import (
+    adjust_unread_notifications_count, aget_unread_notifications_count, get_unread_notifications_count,
+    reconcile_unread_notifications_count,
+)
+from .events import Broker
+from .log_handlers import LogDirRotatingFileHandler
+from .jalali import format_jalali, is_leap, parse_jalali, to_gregorian, to_jalali, to_jalali_many
+from .models import ArchivedNotification, JobState, Notification, NotificationCounter, Patient, PatientSummary, Visit
+from .notifications import APPOINTMENT_JOB_NAME, create_appointment_notifications, purge_read_notifications
+from .scheduler import claim_run
+from .pagination import KeysetPaginator
+from .search import normalize_search_text, search_patients, search_tokens
+from .stats import adashboard_counts, daily_visit_counts, dashboard_counts, jalali_monthly_visit_counts
+from .summaries import rebuild_patient_summaries, refresh_patient_summary, refresh_stale_next_appointments
+from .templatetags.patient_tags import notification_items, patient_rows
+from .transfer import export_lines, import_patients, import_visits
+from .views import DIAGNOSIS_PREVIEW_LENGTH
+
+
+def setUpModule():
+    # Metrics snapshots written while testing go to a temporary METRICS_DIR
+    directory = tempfile.mkdtemp()
+    unittest.addModuleCleanup(shutil.rmtree, directory, ignore_errors=True)
+    metrics_dir = override_settings(METRICS_DIR=directory)
+    metrics_dir.enable()
+    unittest.addModuleCleanup(metrics_dir.disable)
+
+
+def _create_patient(index):
+    return Patient.objects.create(
+        first_name=f'بیمار{index}', last_name='تست', national_id=f'{index:010d}',
+        birth_date=date(1980, 1, 1), gender='M', phone='09120000000', address='تهران',
+    )
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        self.created_at = timezone.now().replace(microsecond=0)
+        self.notifications = [Notification.objects.create(title=f'اعلان {i}', message='پیام') for i in range(7)]
+        # Equal sort keys: only the id tells the rows apart
+        Notification.objects.update(created_at=self.created_at)
+        self.paginator = KeysetPaginator(Notification.objects.all(), ['-created_at', '-id'], per_page=3)
+
+    def ids(self, page):
+        return [notification.pk for notification in page]
+
+    def test_forward_and_back_with_equal_keys(self):
+        expected = [n.pk for n in reversed(self.notifications)]
+        pages = [self.paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(self.paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([self.ids(page) for page in pages], [expected[:3], expected[3:6], expected[6:]])
+        self.assertFalse(pages[0].has_previous)
+
+        page = pages[-1]
+        for previous in reversed(pages[:-1]):
+            page = self.paginator.get_page(page.previous_cursor)
+            self.assertEqual(self.ids(page), self.ids(previous))
+        self.assertFalse(page.has_previous)
+        self.assertEqual(self.ids(self.paginator.get_page(page.next_cursor)), expected[3:6])
+
+    def test_seek_bounds_the_first_column(self):
+        # One range search on the ordering index: no OR of index lookups, no sort
+        for direction in ('n', 'p'):
+            with self.subTest(direction=direction):
+                cursor = self.paginator.encode_cursor(self.notifications[3], direction)
+                plan = self.paginator._page_queryset(cursor)[0].explain()
+                self.assertIn('SEARCH patients_notification USING INDEX notification_created_id_idx (created_at', plan)
+                self.assertNotIn('MULTI-INDEX OR', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_cursor_keeps_microseconds(self):
+        # Two rows in the same millisecond; the later-created one sorts second
+        first, second = self.notifications[:2]
+        Notification.objects.exclude(pk__in=[first.pk, second.pk]).delete()
+        Notification.objects.filter(pk=first.pk).update(created_at=self.created_at + timedelta(microseconds=500))
+        paginator = KeysetPaginator(Notification.objects.all(), ['-created_at', '-id'], per_page=1)
+        page = paginator.get_page()
+        self.assertEqual(self.ids(page), [first.pk])
+        self.assertEqual(self.ids(paginator.get_page(page.next_cursor)), [second.pk])
+
+    def test_invalid_cursors_give_the_first_page(self):
+        first_page = self.ids(self.paginator.get_page())
+        for cursor in ('garbage', '!!!', 'WyJuIl0', 'WyJ4IixbMSwyXV0', 'WyJuIixbIm5vdCBhIGRhdGUiLDFdXQ'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(self.paginator.decode_cursor(cursor))
+                self.assertEqual(self.ids(self.paginator.get_page(cursor)), first_page)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Notification.objects.create(title='اعلان', message='پیام')
+
+    @override_settings(SHARED_CACHE=True)
+    def test_shared_cache_keeps_the_counter(self):
+        self.assertEqual(get_unread_notifications_count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_notifications_count(), 1)
+        notification = Notification.objects.create(title='اعلان', message='پیام')
+        notification.is_read = True
+        notification.save()
+        Notification.objects.create(title='اعلان', message='پیام')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_notifications_count(), 2)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_per_process_cache_reads_the_counter_row(self):
+        self.assertEqual(get_unread_notifications_count(), 1)
+        # Another process adjusting the row is seen at once, without a COUNT
+        adjust_unread_notifications_count(2)
+        with self.assertNumQueries(1) as queries:
+            self.assertEqual(get_unread_notifications_count(), 3)
+        self.assertNotIn('COUNT', queries.captured_queries[0]['sql'])
+        self.assertEqual(async_to_sync(aget_unread_notifications_count)(), 3)
+
+        # Changes without signals are corrected by the reconcile job
+        Notification.objects.update(is_read=True)
+        self.assertEqual(reconcile_unread_notifications_count(), 0)
+        self.assertEqual(get_unread_notifications_count(), 0)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_missing_counter_row_is_recomputed(self):
+        NotificationCounter.objects.all().delete()
+        self.assertEqual(get_unread_notifications_count(), 1)
+        NotificationCounter.objects.all().delete()
+        Notification.objects.create(title='اعلان', message='پیام')
+        self.assertEqual(NotificationCounter.objects.get().unread, 2)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Runs ``after`` on a database migrated back to ``before``"""
+
+    before = after = None
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class JalaliDateMigrationTests(MigrationTestCase):
+    """Migration 0006: Jalali text columns to Gregorian DATE columns"""
+
+    before = [('patients', '0005_jobstate')]
+    after = [('patients', '0006_jalali_date_columns')]
+
+    def test_dates_are_converted_and_bad_values_become_null(self):
+        apps = self.migrate(self.before)
+        OldPatient = apps.get_model('patients', 'Patient')
+        OldVisit = apps.get_model('patients', 'Visit')
+        birth_dates = {'0000000001': '1360/05/10', '0000000002': '1399/13/40', '0000000003': 'نامعلوم', '0000000004': ''}
+        for nid, birth_date in birth_dates.items():
+            patient = OldPatient.objects.create(
+                first_name='علی', last_name='تست', national_id=nid, birth_date=birth_date,
+                gender='M', phone='09120000000', address='تهران',
+            )
+            OldVisit.objects.create(patient=patient, diagnosis='کنترل', next_visit_date=birth_date)
+
+        apps = self.migrate(self.after)
+        Patient = apps.get_model('patients', 'Patient')
+        converted = dict(Patient.objects.values_list('national_id', 'birth_date'))
+        self.assertEqual(converted, {'0000000001': date(1981, 8, 1), '0000000002': None, '0000000003': None, '0000000004': None})
+        next_visits = apps.get_model('patients', 'Visit').objects.order_by('patient__national_id').values_list('next_visit_date', flat=True)
+        self.assertEqual(list(next_visits), [date(1981, 8, 1), None, None, None])
+
+
+class PatientSearchTests(TestCase):
+    def setUp(self):
+        self.reza = _create_patient(1)
+        self.reza.first_name, self.reza.last_name = 'رضا', 'رضایی'
+        self.reza.save()
+        self.ali = _create_patient(2)
+        self.ali.first_name, self.ali.last_name, self.ali.phone = 'علی', 'رضایی‌نژاد', '09351234567'
+        self.ali.save()
+        self.maryam = _create_patient(3)
+        self.maryam.first_name, self.maryam.last_name = 'مریم', 'کریمی'
+        self.maryam.save()
+
+    def search(self, query):
+        return list(search_patients(Patient.objects.all(), query))
+
+    def test_normalization(self):
+        self.assertEqual(normalize_search_text('علي كَريمي ۰۹۱۲'), 'علی کریمی 0912')
+        self.assertEqual(normalize_search_text('آزاده‌پور'), 'ازاده پور')
+        self.assertEqual(search_tokens('  رضا، ٠٩٣٥ '), ['رضا', '0935'])
+        self.assertEqual(search_tokens('!!'), [])
+
+    def test_prefix_matches_ranked(self):
+        # Both words of رضا رضایی match; علی رضایی‌نژاد only matches once
+        self.assertEqual(self.search('رضا'), [self.reza, self.ali])
+        self.assertEqual(self.search('علي رض'), [self.ali])
+        self.assertEqual(self.search('نژاد'), [self.ali])
+        self.assertEqual(self.search('كريمي'), [self.maryam])
+        self.assertEqual(self.search('۰۹۳۵'), [self.ali])
+        self.assertEqual(self.search('0000000003'), [self.maryam])
+        self.assertEqual(self.search('ریمی'), [])  # not a word prefix
+
+    def test_index_follows_saves_and_deletes(self):
+        self.maryam.last_name = 'احمدی'
+        self.maryam.save()
+        self.assertEqual(self.search('کریمی'), [])
+        self.assertEqual(self.search('احمدی'), [self.maryam])
+        self.maryam.delete()
+        self.assertEqual(self.search('احمدی'), [])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'FTS5 index')
+class SearchIndexMigrationTests(MigrationTestCase):
+    before = [('patients', '0008_notification_unique_unread_visit')]
+    after = [('patients', '0009_patient_search_index')]
+
+    def test_existing_patients_are_indexed(self):
+        apps = self.migrate(self.before)
+        apps.get_model('patients', 'Patient').objects.create(
+            first_name='علي', last_name='كريمي', national_id='۰۰۱۲', birth_date='1360/01/01',
+            gender='M', phone='09120000000', address='تهران',
+        )
+        self.migrate(self.after)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT name, national_id FROM patients_patient_search')
+            self.assertEqual(cursor.fetchall(), [('علی کریمی', '0012')])
+
+
+class PatientListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patients = [_create_patient(i) for i in range(30)]
+        for _ in range(3):
+            Visit.objects.create(patient=cls.patients[0], diagnosis='کنترل')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_in_name_order(self):
+        response = self.client.get(reverse('patients'))
+        page = response.context['page']
+        ordered = sorted(self.patients, key=lambda p: (p.last_name, p.first_name, p.pk))
+        self.assertEqual(list(page), ordered[:25])
+        self.assertEqual(response.context['total_patients'], 30)
+        self.assertContains(response, '3 ویزیت')
+
+        response = self.client.get(reverse('patients') + f'?cursor={page.next_cursor}')
+        self.assertEqual(list(response.context['page']), ordered[25:])
+        self.assertFalse(response.context['page'].has_next)
+
+    def test_age_filter_ignores_bad_values(self):
+        for query, expected in (('min_age=3000', 0), ('max_age=3000', 30), ('min_age=²', 30), ('max_age=-5', 0)):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('patients') + '?' + query)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['total_patients'], expected)
+        response = self.client.get(reverse('patients') + '?min_age=3000')
+        self.assertEqual(response.context['min_age'], 150)
+
+    def test_visit_stats_come_with_the_page(self):
+        patients = list(Patient.objects.select_related('summary').order_by('id')[:25])
+        with self.assertNumQueries(0):
+            self.assertEqual([p.summary.visit_count for p in patients[:2]], [3, 0])
+            self.assertIsNotNone(patients[0].summary.last_visit_date)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('doctor', password='secret')
+        cls.patients = [_create_patient(i) for i in range(3)]
+        cls.visit = Visit.objects.create(
+            patient=cls.patients[0], diagnosis='کنترل', next_visit_date=timezone.localdate() + timedelta(days=3),
+        )
+        cls.notification = Notification.objects.create(title='یادآوری', message='پیام')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def send(self, method, name, data, *args):
+        return getattr(self.client, method)(reverse(name, args=args), json.dumps(data), content_type='application/json')
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('api_patients'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'error': 'Authentication required'})
+
+    def test_cursor_pages_and_sparse_fields(self):
+        response = self.client.get(reverse('api_patients'), {'limit': 2, 'fields': 'id,national_id'})
+        data = response.json()
+        self.assertEqual(data['results'], [{'id': p.pk, 'national_id': p.national_id} for p in self.patients[:2]])
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['id'] for row in data['results']], [self.patients[2].pk])
+        self.assertIsNone(data['next'])
+
+        self.assertEqual(self.client.get(reverse('api_patients'), {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_patients'), {'limit': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_patients'), {'updated_since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_patients'), {'min_age': '²'}).status_code, 400)
+        self.assertEqual(len(self.client.get(reverse('api_patients'), {'max_age': 10 ** 20}).json()['results']), 3)
+
+    def test_etag(self):
+        response = self.client.get(reverse('api_patient', args=[self.patients[0].pk]))
+        response = self.client.get(reverse('api_patient', args=[self.patients[0].pk]), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_create_and_update(self):
+        payload = {
+            'first_name': 'سارا', 'last_name': 'احمدی', 'national_id': '0011223344', 'birth_date': '1990-05-01',
+            'gender': 'F', 'phone': '09121111111', 'address': 'شیراز',
+        }
+        response = self.send('post', 'api_patients', payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['birth_date'], '1990-05-01')
+        patient = Patient.objects.get(national_id='0011223344')
+
+        response = self.send('patch', 'api_patient', {'birth_date': '1369/02/11'}, patient.pk)
+        self.assertEqual(response.json()['birth_date'], '1990-05-01')
+        response = self.send('post', 'api_patients', payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('national_id', response.json()['errors'])
+
+        response = self.send('post', 'api_visits', {'patient': patient.pk, 'diagnosis': 'سرماخوردگی'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Patient.objects.get(pk=patient.pk).summary.visit_count, 1)
+        self.assertEqual(self.send('post', 'api_visits', {'patient': 0, 'diagnosis': 'x'}).status_code, 400)
+        self.assertEqual(self.send('post', 'api_appointments', {}).status_code, 405)
+
+    def test_notifications_can_only_be_marked_read(self):
+        self.assertEqual(self.send('post', 'api_notifications', {}).status_code, 405)
+        self.assertEqual(self.send('post', 'api_notifications', {'title': 'x', 'message': 'y'}).status_code, 405)
+        self.assertEqual(Notification.objects.count(), 1)
+
+        pk = self.notification.pk
+        self.assertEqual(self.send('put', 'api_notification', {'is_read': True}, pk).status_code, 405)
+        self.assertEqual(self.client.delete(reverse('api_notification', args=[pk])).status_code, 405)
+        response = self.send('patch', 'api_notification', {'is_read': True, 'title': 'تغییر'}, pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['is_read'], response.json()['title']), (True, 'یادآوری'))
+        self.assertEqual(get_unread_notifications_count(), 0)
+
+
+class VisitTimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = _create_patient(1)
+        cls.visits = [Visit.objects.create(patient=cls.patient, diagnosis=f'ویزیت {i}') for i in range(12)]
+        for days, visit in enumerate(cls.visits):
+            Visit.objects.filter(pk=visit.pk).update(visit_date=visit.visit_date - timedelta(days=days))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_newest_first_with_numbers(self):
+        response = self.client.get(reverse('patient_detail', args=[self.patient.pk]))
+        page = response.context['visits']
+        self.assertEqual(list(page), self.visits[:10])
+        self.assertEqual([visit.number for visit in page], list(range(12, 2, -1)))
+        self.assertEqual(response.context['next_number'], 2)
+
+        url = reverse('patient_visits', args=[self.patient.pk])
+        response = self.client.get(url, {'cursor': page.next_cursor, 'number': 2})
+        self.assertEqual(list(response.context['visits']), self.visits[10:])
+        self.assertEqual([visit.number for visit in response.context['visits']], [2, 1])
+        self.assertFalse(response.context['visits'].has_next)
+
+    def test_diagnosis_preview(self):
+        Visit.objects.filter(pk=self.visits[0].pk).update(diagnosis='x' * DIAGNOSIS_PREVIEW_LENGTH)
+        Visit.objects.filter(pk=self.visits[1].pk).update(diagnosis='y' * (DIAGNOSIS_PREVIEW_LENGTH + 1))
+        first, second = list(self.client.get(reverse('patient_detail', args=[self.patient.pk])).context['visits'])[:2]
+        self.assertEqual(first.diagnosis_preview, 'x' * DIAGNOSIS_PREVIEW_LENGTH)
+        self.assertFalse(first.diagnosis_truncated)
+        self.assertEqual(second.diagnosis_preview, 'y' * DIAGNOSIS_PREVIEW_LENGTH)
+        self.assertTrue(second.diagnosis_truncated)
+
+        response = self.client.get(reverse('visit_details', args=[self.patient.pk, self.visits[1].pk]))
+        self.assertContains(response, 'y' * (DIAGNOSIS_PREVIEW_LENGTH + 1))
+
+    def test_visit_details_checks_patient(self):
+        other = _create_patient(2)
+        response = self.client.get(reverse('visit_details', args=[other.pk, self.visits[0].pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class PatientSummaryTests(TestCase):
+    def setUp(self):
+        self.patient = _create_patient(1)
+        self.today = timezone.localdate()
+
+    def summary(self):
+        return PatientSummary.objects.get(patient=self.patient)
+
+    def test_visits_keep_the_summary_current(self):
+        self.assertEqual(self.summary().visit_count, 0)
+        first = Visit.objects.create(patient=self.patient, diagnosis='الف', next_visit_date=self.today - timedelta(days=1))
+        second = Visit.objects.create(patient=self.patient, diagnosis='ب', next_visit_date=self.today + timedelta(days=9))
+        Visit.objects.create(patient=self.patient, diagnosis='ج', next_visit_date=self.today + timedelta(days=4))
+
+        summary = self.summary()
+        self.assertEqual(summary.visit_count, 3)
+        self.assertEqual(summary.first_visit_date, first.visit_date)
+        # Past appointments do not count as the next one
+        self.assertEqual(summary.next_appointment_date, self.today + timedelta(days=4))
+
+        # Queryset deletes send post_delete per row as well
+        Visit.objects.filter(next_visit_date=self.today + timedelta(days=4)).delete()
+        self.assertEqual(self.summary().next_appointment_date, self.today + timedelta(days=9))
+        second.delete()
+        summary = self.summary()
+        self.assertEqual(summary.visit_count, 1)
+        self.assertEqual(summary.last_visit_date, first.visit_date)
+        self.assertIsNone(summary.next_appointment_date)
+
+    def test_refresh_and_rebuild(self):
+        Visit.objects.create(patient=self.patient, diagnosis='الف', next_visit_date=self.today + timedelta(days=2))
+        PatientSummary.objects.filter(patient=self.patient).update(visit_count=0, next_appointment_date=self.today - timedelta(days=1))
+
+        self.assertEqual(refresh_stale_next_appointments(), 1)
+        self.assertEqual((self.summary().visit_count, self.summary().next_appointment_date), (1, self.today + timedelta(days=2)))
+        self.assertIsNone(refresh_patient_summary(self.patient.pk + 1000))
+
+        PatientSummary.objects.all().delete()
+        self.assertEqual(rebuild_patient_summaries(), 1)
+        self.assertEqual(self.summary().visit_count, 1)
+
+    def test_deleting_the_patient_cascades(self):
+        Visit.objects.create(patient=self.patient, diagnosis='الف')
+        self.patient.delete()
+        self.assertFalse(PatientSummary.objects.exists())
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = _create_patient(1)
+        self.old = Visit.objects.create(patient=self.patient, diagnosis='قدیمی')
+        Visit.objects.filter(pk=self.old.pk).update(visit_date=timezone.now() - timedelta(days=40))
+
+    def test_counts_cached_and_invalidated(self):
+        expected = {'today_visits': 0, 'week_visits': 0, 'month_visits': 0, 'total_patients': 1}
+        self.assertEqual(dashboard_counts(), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_counts(), expected)
+
+        Visit.objects.create(patient=self.patient, diagnosis='امروز')
+        with self.assertNumQueries(2):
+            counts = dashboard_counts()
+        self.assertEqual(counts, {**expected, 'today_visits': 1, 'week_visits': 1, 'month_visits': 1})
+        self.assertEqual(async_to_sync(adashboard_counts)(), counts)
+
+        Visit.objects.filter(diagnosis='امروز').get().delete()
+        self.assertEqual(dashboard_counts(), expected)
+
+    def test_daily_series(self):
+        Visit.objects.create(patient=self.patient, diagnosis='امروز')
+        series = daily_visit_counts(days=45)
+        self.assertEqual(len(series), 45)
+        self.assertEqual(series[-1], (timezone.localdate(), 1))
+        self.assertEqual(sum(count for _, count in series), 2)
+        months = jalali_monthly_visit_counts(months=3)
+        self.assertEqual(len(months), 3)
+        self.assertEqual(sum(count for _, count in months), 2)
+
+    def test_api(self):
+        self.client.force_login(User.objects.create_user('doctor', password='secret'))
+        data = self.client.get(reverse('api_visit_stats'), {'days': 7}).json()
+        self.assertEqual(len(data['results']), 7)
+        self.assertEqual(data['results'][-1], {'date': timezone.localdate().isoformat(), 'visits': 0})
+        self.assertEqual(self.client.get(reverse('api_visit_stats'), {'days': 0}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_visit_stats'), {'window': 'year'}).status_code, 400)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('doctor', password='secret', first_name='علی', last_name='رضایی')
+        cls.patient = _create_patient(1)
+        cls.visit = Visit.objects.create(patient=cls.patient, diagnosis='سرماخوردگی')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate_bumps_only_named_groups(self):
+        before = group_versions(PATIENTS, VISITS, NOTIFICATIONS)
+        invalidate(VISITS)
+        after = group_versions(PATIENTS, VISITS, NOTIFICATIONS)
+        self.assertEqual((after[0], after[2]), (before[0], before[2]))
+        self.assertNotEqual(after[1], before[1])
+
+    def test_signals_invalidate_owning_groups(self):
+        other = _create_patient(2)
+        before = group_versions(PATIENTS, VISITS, patient_group(self.patient.pk), patient_group(other.pk))
+        Visit.objects.create(patient=self.patient, diagnosis='کنترل')
+        after = group_versions(PATIENTS, VISITS, patient_group(self.patient.pk), patient_group(other.pk))
+        self.assertEqual([a != b for a, b in zip(before, after)], [False, True, True, False])
+
+        self.patient.save()
+        self.assertNotEqual(group_versions(PATIENTS), after[:1])
+
+    def test_cached_view_served_until_group_bumped(self):
+        url = reverse('visit_details', args=[self.patient.pk, self.visit.pk])
+        self.assertContains(self.client.get(url), 'سرماخوردگی')
+        Visit.objects.filter(pk=self.visit.pk).update(diagnosis='آنفولانزا')  # no signals
+        self.assertContains(self.client.get(url), 'سرماخوردگی')
+        invalidate(patient_group(self.patient.pk))
+        self.assertContains(self.client.get(url), 'آنفولانزا')
+
+    def test_sidebar_shows_current_profile_name(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('dashboard')), 'دکتر علی رضایی')
+        self.client.post(reverse('settings'), {
+            'action': 'update_profile', 'first_name': 'مریم', 'last_name': 'احمدی', 'email': 'doctor@example.com',
+        })
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'دکتر مریم احمدی')
+        self.assertNotContains(response, 'علی رضایی')
+
+
+class JalaliConversionTests(unittest.TestCase):
+    def test_matches_jdatetime(self):
+        day = date(1940, 1, 1)
+        while day < date(2060, 1, 1):
+            expected = jdatetime.date.fromgregorian(date=day)
+            with self.subTest(day=day):
+                self.assertEqual(to_jalali(day), (expected.year, expected.month, expected.day))
+                self.assertEqual(to_gregorian(expected.year, expected.month, expected.day), day)
+                self.assertEqual(format_jalali(day), expected.strftime('%Y/%m/%d'))
+            day += timedelta(days=1)
+        for year in range(1300, 1500):
+            self.assertEqual(is_leap(year), jdatetime.date(year, 1, 1).isleap(), year)
+
+    def test_parse_and_format(self):
+        self.assertEqual(parse_jalali('1403/01/01'), date(2024, 3, 20))
+        self.assertEqual(parse_jalali(' 1403/1/1 '), date(2024, 3, 20))
+        self.assertEqual(parse_jalali('۱۴۰۳/۰۱/۰۱'), date(2024, 3, 20))
+        self.assertEqual(parse_jalali('1403/12/30'), date(2025, 3, 20))  # leap year
+        for value in ('1404/12/30', '1403/13/01', '1403/00/10', '1403-01-01', ''):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_jalali(value)
+
+        moment = datetime(2024, 3, 20, 9, 5, 7)
+        self.assertEqual(format_jalali(moment, '%Y/%m/%d - %H:%M:%S %%'), '1403/01/01 - 09:05:07 %')
+        self.assertEqual(format_jalali(moment.date(), '%y-%m-%d %H:%M'), '03-01-01 00:00')
+        self.assertEqual(to_jalali_many([moment, moment.date(), date(2024, 3, 19)]), [(1403, 1, 1), (1403, 1, 1), (1402, 12, 29)])
+        with self.assertRaises(ValueError):
+            format_jalali(moment, '%A')
+
+
+class AppointmentNotificationJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = _create_patient(1)
+        self.today = timezone.localdate()
+
+    def test_incremental_runs_only_see_changed_visits(self):
+        visit = Visit.objects.create(patient=self.patient, diagnosis='کنترل', next_visit_date=self.today + timedelta(days=2))
+        self.assertEqual(create_appointment_notifications(), 1)
+        Notification.objects.update(is_read=True)
+
+        # The visit has not changed since the last run
+        self.assertEqual(create_appointment_notifications(), 0)
+        visit.notes = 'تغییر'
+        visit.save()
+        self.assertEqual(create_appointment_notifications(), 1)
+        self.assertEqual(Notification.objects.filter(related_visit=visit).count(), 2)
+
+    def test_visits_entering_the_window_are_picked_up(self):
+        visit = Visit.objects.create(patient=self.patient, diagnosis='کنترل', next_visit_date=self.today + timedelta(days=7))
+        three_days_ago = timezone.now() - timedelta(days=3)
+        Visit.objects.filter(pk=visit.pk).update(updated_at=three_days_ago - timedelta(days=1))
+        JobState.objects.create(name=APPOINTMENT_JOB_NAME, last_run_at=three_days_ago)
+
+        self.assertEqual(create_appointment_notifications(), 1)
+        self.assertGreater(JobState.objects.get(name=APPOINTMENT_JOB_NAME).last_run_at, three_days_ago)
+
+    def test_unread_reminders_are_not_duplicated(self):
+        soon = self.today + timedelta(days=1)
+        first, second = (Visit.objects.create(patient=self.patient, diagnosis='کنترل', next_visit_date=soon) for _ in range(2))
+        concurrent = []
+
+        def concurrent_run(execute, sql, params, many, context):
+            # Another run inserts the reminder for ``second`` after this one
+            # has looked for existing reminders, but before it inserts
+            if sql.startswith('SELECT COUNT(*)') and not concurrent:
+                concurrent.append(Notification.objects.create(
+                    title='قرار ملاقات', message='فردا', notification_type='appointment',
+                    related_patient=self.patient, related_visit=second,
+                ))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(concurrent_run):
+            self.assertEqual(create_appointment_notifications(full=True), 1)
+        self.assertEqual(Notification.objects.filter(related_visit=second).count(), 1)
+        self.assertEqual(create_appointment_notifications(full=True), 0)
+        self.assertEqual(get_unread_notifications_count(), 2)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(title='تکراری', message='', notification_type='appointment', related_visit=first)
+        # Once read, a visit can get a new reminder
+        Notification.objects.filter(related_visit=first).update(is_read=True)
+        self.assertEqual(create_appointment_notifications(full=True), 1)
+
+    def test_one_process_claims_each_run(self):
+        now = timezone.now()
+        self.assertTrue(claim_run(300, now=now))
+        self.assertFalse(claim_run(300, now=now + timedelta(seconds=10)))
+        self.assertTrue(claim_run(300, now=now + timedelta(seconds=300)))
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite profile')
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        expected = {
+            'journal_mode': 'wal',
+            'synchronous': 1,  # NORMAL
+            'busy_timeout': 20000,
+        }
+        with connection.cursor() as cursor:
+            for pragma, value in expected.items():
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], value, pragma)
+
+
+class ConcurrentThroughputMixin:
+    """Concurrent visit writes, notification runs and page reads must all
+    succeed (no "database is locked") and keep a minimum throughput.
+
+    Subclasses pick the database profile; the measured operations per
+    second are written to stderr so the profiles can be compared.
+    """
+
+    WRITERS = 4
+    VISITS_PER_WRITER = 15
+    READERS = 4
+    READS_PER_READER = 30
+    TIME_BUDGET = 60  # seconds
+    MIN_OPS_PER_SECOND = 20
+
+    def setUp(self):
+        cache.clear()
+        self.patients = [_create_patient(i) for i in range(self.WRITERS)]
+
+    def _run_threads(self, targets):
+        """Run every target in its own thread; return the errors and the
+        operations the targets report as ``{'writes': n, 'reads': n}``"""
+        errors, operations = [], {'writes': 0, 'reads': 0}
+        lock = threading.Lock()
+
+        def run(target):
+            try:
+                kind, count = target()
+                with lock:
+                    operations[kind] += count
+            except Exception as error:  # reported by the test
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors, operations
+
+    def test_concurrent_throughput(self):
+        next_week = timezone.localdate() + timedelta(days=3)
+
+        def writer(patient):
+            def write():
+                for i in range(self.VISITS_PER_WRITER):
+                    # Same transaction shape as views.add_visit
+                    with transaction.atomic():
+                        Visit.objects.create(patient=patient, diagnosis=f'visit {i}', next_visit_date=next_week)
+                return 'writes', self.VISITS_PER_WRITER
+            return write
+
+        def notifier():
+            for _ in range(5):
+                create_appointment_notifications(full=True)
+            return 'writes', 5
+
+        def summarizer():
+            # Read-then-write transactions, the case that fails fastest
+            # without IMMEDIATE transactions
+            for _ in range(self.VISITS_PER_WRITER):
+                for patient in self.patients:
+                    refresh_patient_summary(patient.pk)
+            return 'writes', self.VISITS_PER_WRITER * len(self.patients)
+
+        def reader():
+            for _ in range(self.READS_PER_READER):
+                list(Patient.objects.select_related('summary').order_by('last_name', 'first_name', 'id')[:25])
+                Visit.objects.upcoming().count()
+            return 'reads', 2 * self.READS_PER_READER
+
+        started = time.monotonic()
+        errors, operations = self._run_threads(
+            [writer(patient) for patient in self.patients] + [notifier, summarizer] + [reader] * self.READERS
+        )
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Visit.objects.count(), self.WRITERS * self.VISITS_PER_WRITER)
+        for patient in self.patients:
+            patient.summary.refresh_from_db()
+            self.assertEqual(patient.summary.visit_count, self.VISITS_PER_WRITER)
+        self.assertLess(elapsed, self.TIME_BUDGET)
+
+        total = operations['writes'] + operations['reads']
+        ops_per_second = total / elapsed
+        sys.stderr.write(
+            f'\n{connection.vendor} throughput: {total} ops in {elapsed:.2f} s = {ops_per_second:.0f} ops/s '
+            f'({operations["writes"] / elapsed:.0f} writes/s, {operations["reads"] / elapsed:.0f} reads/s)\n'
+        )
+        self.assertGreaterEqual(ops_per_second, self.MIN_OPS_PER_SECOND)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'runs on the sqlite profile')
+class SQLiteConcurrentThroughputTests(ConcurrentThroughputMixin, TransactionTestCase):
+    pass
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'needs a PostgreSQL server: run with DJANGO_DB=postgresql and POSTGRES_* set'
+)
+class PostgreSQLConcurrentThroughputTests(ConcurrentThroughputMixin, TransactionTestCase):
+    pass
+
+
+def _create_sample_data(patients=5, visits_per_patient=3):
+    soon = timezone.localdate() + timedelta(days=2)
+    for i in range(patients):
+        patient = _create_patient(i)
+        for _ in range(visits_per_patient):
+            Visit.objects.create(patient=patient, diagnosis='سرماخوردگی', next_visit_date=soon)
+        Notification.objects.create(title='یادآوری', message='پیام', related_patient=patient)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class QueryPlanTests(TestCase):
+    """Each query shape used by the views must be answered from its index"""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index_name}', plan, plan)
+
+    def assertSeeksPage(self, queryset, ordering, index_name, row):
+        """The next and previous pages KeysetPaginator builds after ``row``
+        are one range search on ``index_name``, without a sort"""
+        paginator = KeysetPaginator(queryset, ordering)
+        for direction in ('n', 'p'):
+            with self.subTest(direction=direction):
+                page_queryset = paginator._page_queryset(paginator.encode_cursor(row, direction))[0]
+                plan = page_queryset.explain()
+                self.assertRegex(plan, rf'SEARCH \w+ USING INDEX {index_name} \(', plan)
+                self.assertNotIn('TEMP B-TREE', plan, plan)
+                self.assertNotIn('MULTI-INDEX OR', plan, plan)
+
+    def test_dashboard_recent_visits(self):
+        self.assertUsesIndex(Visit.objects.select_related('patient').order_by('-visit_date')[:5], 'visit_date_idx')
+
+    def test_dashboard_recent_patients(self):
+        self.assertUsesIndex(Patient.objects.order_by('-created_at')[:10], 'patient_created_idx')
+
+    def test_dashboard_counters(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            Visit.objects.filter(visit_date__gte=now - timedelta(days=31), visit_date__lt=now).order_by(),
+            'visit_date_idx',
+        )
+
+    def test_patient_list_page(self):
+        patient = _create_patient(1)
+        self.assertSeeksPage(
+            Patient.objects.select_related('summary').annotate_age(), ['last_name', 'first_name', 'id'],
+            'patient_name_id_idx', patient,
+        )
+
+    def test_patient_age_range(self):
+        self.assertUsesIndex(Patient.objects.age_between(min_age=60).order_by(), 'patients_patient_birth_date')
+
+    def test_patient_visit_timeline(self):
+        self.assertUsesIndex(Visit.objects.filter(patient_id=1).order_by('-visit_date', '-id')[:11], 'visit_patient_date_idx')
+
+    def test_appointments(self):
+        visit = Visit.objects.create(patient=_create_patient(1), next_visit_date=timezone.localdate())
+        self.assertUsesIndex(Visit.objects.with_appointment()[:26], 'visit_next_date_id_idx')
+        self.assertUsesIndex(Visit.objects.upcoming(days=7), 'visit_next_date_id_idx')
+        self.assertSeeksPage(
+            Visit.objects.with_appointment().select_related('patient'), ['next_visit_date', 'id'],
+            'visit_next_date_id_idx', visit,
+        )
+
+    def test_notification_list(self):
+        notification = Notification.objects.create(title='اعلان', message='پیام')
+        self.assertUsesIndex(Notification.objects.order_by('-created_at', '-id')[:50], 'notification_created_id_idx')
+        self.assertSeeksPage(Notification.objects.all(), ['-created_at', '-id'], 'notification_created_id_idx', notification)
+
+    def test_unread_notifications(self):
+        notification = Notification.objects.create(title='اعلان', message='پیام')
+        self.assertUsesIndex(Notification.objects.filter(is_read=False).order_by().values('id'), 'notification_unread_idx')
+        self.assertUsesIndex(Notification.objects.filter(is_read=False).order_by('-created_at', '-id')[:50], 'notification_unread_idx')
+        self.assertSeeksPage(
+            Notification.objects.filter(is_read=False), ['-created_at', '-id'], 'notification_unread_idx', notification,
+        )
+
+
+class ViewQueryCountTests(TestCase):
+    """Query counts per view with a cold cache (session and user lookups included).
+    They must not grow with the number of rows rendered.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('doctor', 'doctor@example.com', 'password')
+        _create_sample_data()
+        cls.patient = Patient.objects.order_by('id').first()
+        cls.visit = cls.patient.visits.order_by('id').first()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertViewQueries(self, num, url, cold=True):
+        if cold:
+            cache.clear()
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_dashboard(self):
+        self.assertViewQueries(7, reverse('dashboard'))
+        # Warm: stats and fragments are cached; session, user and the unread
+        # counter row (read from the table with the per-process test cache) remain
+        self.assertViewQueries(3, reverse('dashboard'), cold=False)
+
+    def test_patients_list(self):
+        self.assertViewQueries(5, reverse('patients'))
+        self.assertViewQueries(5, reverse('patients') + '?search=بیمار1')
+        self.assertViewQueries(5, reverse('patients') + '?min_age=30')
+
+    def test_patient_detail(self):
+        self.assertViewQueries(5, reverse('patient_detail', args=[self.patient.id]))
+        self.assertViewQueries(5, reverse('patient_visits', args=[self.patient.id]))
+        self.assertViewQueries(4, reverse('visit_details', args=[self.patient.id, self.visit.id]))
+
+    def test_forms(self):
+        self.assertViewQueries(3, reverse('add_patient'))
+        self.assertViewQueries(4, reverse('edit_patient', args=[self.patient.id]))
+        self.assertViewQueries(6, reverse('add_visit', args=[self.patient.id]))
+
+    def test_appointments(self):
+        self.assertViewQueries(6, reverse('appointments'))
+
+    def test_notifications(self):
+        self.assertViewQueries(5, reverse('notifications'))
+        # Warm: the cached list fragment skips the lazy page query
+        self.assertViewQueries(4, reverse('notifications'), cold=False)
+
+    def test_api(self):
+        for name in ('api_patients', 'api_visits', 'api_appointments', 'api_notifications'):
+            with self.subTest(name=name):
+                self.assertViewQueries(3, reverse(name))
+
+
+class TransferTests(TestCase):
+    PATIENTS_CSV = (
+        'first_name,last_name,national_id,birth_date,gender,phone,address\n'
+        'علی,رضایی,0000000001,1360/05/10,M,09120000001,تهران\n'
+        'سارا,احمدی,0000000002,1365/01/01,F,09120000002,شیراز\n'
+        'تکراری,احمدی,0000000002,1365/01/01,F,09120000002,شیراز\n'
+        ',بی‌نام,0000000003,1399/13/40,X,,\n'
+    )
+
+    def test_patient_import_reports_rows_and_keeps_valid_ones(self):
+        result = import_patients(io.StringIO(self.PATIENTS_CSV), 'csv', chunk_size=2)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        self.assertEqual(result.errors[0][1]['national_id'][0]['code'], 'unique')
+        self.assertEqual(set(result.errors[1][1]), {'first_name', 'birth_date', 'gender', 'phone', 'address'})
+        patient = Patient.objects.get(national_id='0000000001')
+        self.assertEqual(patient.birth_date, date(1981, 8, 1))
+        self.assertEqual(patient.summary.visit_count, 0)
+        self.assertEqual(list(search_patients(Patient.objects.all(), 'رضایی')), [patient])
+
+    def test_round_trip(self):
+        import_patients(io.StringIO(self.PATIENTS_CSV), 'csv')
+        visits = [
+            {'national_id': '0000000001', 'visit_date': '2023-02-01T10:30:00+00:00', 'diagnosis': 'سرماخوردگی',
+             'prescription': '', 'notes': '', 'next_visit_date': '1402/01/15'},
+            {'national_id': '0000000001', 'diagnosis': 'کنترل'},
+            {'national_id': '9999999999', 'diagnosis': 'بیمار ناموجود'},
+            {'national_id': '0000000002', 'diagnosis': ''},
+        ]
+        stream = io.StringIO(''.join(json.dumps(visit, ensure_ascii=False) + '\n' for visit in visits) + '[1]\n')
+        result = import_visits(stream, 'jsonl')
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5])
+        patient = Patient.objects.get(national_id='0000000001')
+        self.assertEqual(patient.summary.visit_count, 2)
+        self.assertEqual(patient.summary.first_visit_date.isoformat(), '2023-02-01T10:30:00+00:00')
+
+        exported = ''.join(export_lines('visits', 'csv'))
+        Visit.objects.all().delete()
+        result = import_visits(io.StringIO(exported), 'csv')
+        self.assertEqual((result.created, result.errors), (2, []))
+        self.assertEqual(''.join(export_lines('visits', 'csv')), exported)
+
+        exported = ''.join(export_lines('patients', 'jsonl'))
+        self.assertEqual(json.loads(exported.splitlines()[0])['birth_date'], '1360/05/10')
+
+    def test_patient_added_during_import_is_a_row_error(self):
+        def existing_then_concurrent_insert(national_ids):
+            # Another request adds one of the patients between the check and the insert
+            _create_patient(2)
+            return set()
+
+        with mock.patch('patients.transfer._existing_national_ids', existing_then_concurrent_insert):
+            result = import_patients(io.StringIO(self.PATIENTS_CSV), 'csv')
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5])
+        self.assertEqual(result.errors[0][1]['national_id'][0]['code'], 'unique')
+        patient = Patient.objects.get(national_id='0000000001')
+        self.assertEqual(patient.summary.visit_count, 0)
+        self.assertEqual(list(search_patients(Patient.objects.all(), 'رضایی')), [patient])
+
+    def test_visit_import_refreshes_summaries_in_one_pass(self):
+        def import_for(patients):
+            rows = ''.join(
+                json.dumps({'national_id': patient.national_id, 'diagnosis': 'سرماخوردگی'}) + '\n'
+                for patient in patients
+            )
+            with CaptureQueriesContext(connection) as queries:
+                result = import_visits(io.StringIO(rows), 'jsonl')
+            self.assertEqual((result.created, result.errors), (len(patients), []))
+            return len(queries)
+
+        patients = [_create_patient(i) for i in range(8)]
+        self.assertEqual(import_for(patients[:2]), import_for(patients[2:]))
+        for patient in patients:
+            patient.summary.refresh_from_db()
+            self.assertEqual(patient.summary.visit_count, 1)
+            self.assertIsNotNone(patient.summary.last_visit_date)
+
+    def test_commands_and_views(self):
+        user = User.objects.create_user('doctor', 'doctor@example.com', 'password')
+        self.client.force_login(user)
+        upload = SimpleUploadedFile('patients.csv', self.PATIENTS_CSV.encode('utf-8-sig'))
+        response = self.client.post(reverse('data_transfer'), {'kind': 'patients', 'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['import_errors']), 2)
+        self.assertEqual(Patient.objects.count(), 2)
+
+        response = self.client.get(reverse('export_data', args=['patients']) + '?format=jsonl')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+
+        out = io.StringIO()
+        call_command('export_data', 'patients', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertEqual(self.client.get(reverse('export_data', args=['users'])).status_code, 404)
+
+
+class BenchmarkToolsTests(TestCase):
+    def test_generate_data_and_benchmark_views(self):
+        call_command('generate_data', patients=30, visits=3, notifications=10, batch_size=20, stdout=io.StringIO())
+        self.assertEqual(Patient.objects.count(), 30)
+        self.assertEqual(Notification.objects.count(), 10)
+        patient = Patient.objects.order_by('-summary__visit_count').first()
+        self.assertEqual(patient.summary.visit_count, patient.visits.count())
+        self.assertTrue(Visit.objects.filter(visit_date__lt=timezone.now() - timedelta(days=1)).exists())
+        self.assertIn(patient, search_patients(Patient.objects.all(), patient.national_id))
+        self.assertTrue(Patient.objects.filter(created_at__lt=timezone.now() - timedelta(days=1)).exists())
+        self.assertTrue(Notification.objects.filter(created_at__lt=timezone.now() - timedelta(days=1)).exists())
+        self.assertTrue(Patient._meta.get_field('created_at').auto_now_add)
+
+        # A rerun after deletions continues after the largest serial instead of reusing one
+        Patient.objects.filter(pk__in=Patient.objects.order_by('national_id').values('pk')[:5]).delete()
+        last = Patient.objects.order_by('-national_id').values_list('national_id', flat=True)[0]
+        call_command('generate_data', patients=5, notifications=0, stdout=io.StringIO())
+        self.assertEqual(Patient.objects.count(), 30)
+        self.assertEqual(Patient.objects.filter(national_id__gt=last).count(), 5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('benchmark_views', requests=2, warmup=0, cold=True, save=path, stdout=io.StringIO())
+            with open(path, encoding='utf-8') as baseline:
+                results = json.load(baseline)['results']
+            self.assertEqual(set(results['patient_detail']), {'p50_ms', 'p95_ms', 'mean_ms', 'queries', 'peak_kb'})
+            self.assertGreater(results['dashboard']['queries'], 0)
+
+            out = io.StringIO()
+            call_command('benchmark_views', requests=2, warmup=0, compare=path, threshold=100, stdout=out)
+            self.assertIn('Compared with', out.getvalue())
+
+    def test_benchmark_templates(self):
+        out = io.StringIO()
+        with self.assertNumQueries(0):
+            call_command('benchmark_templates', rows=5, iterations=1, warmup=0, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        self.assertIn('notifications.html', out.getvalue())
+
+
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _create_sample_data()
+
+    def test_server_timing_header(self):
+        cache.clear()
+        response = self.client.get(reverse('patients'))
+        timings = dict(part.split(';', 1)[0:2] for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timings), {'total', 'db', 'tpl'})
+        self.assertIn('queries"', timings['db'])
+        self.assertNotEqual(timings['tpl'], 'dur=0.0')
+
+    @override_settings(PROFILING_SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        cache.clear()
+        with self.assertLogs('patients.performance', 'WARNING') as logs:
+            self.client.get(reverse('appointments'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'appointments')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertLessEqual(len(record['slowest_queries']), 5)
+
+    def test_template_time_from_engine(self):
+        template = engines.all()[0].from_string('{% for i in items %}{{ i }}{% endfor %}')
+        self.assertEqual(template.render({'items': [1, 2]}), '12')  # outside a request: not timed
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            self.assertEqual(template.render({'items': [3]}), '3')
+        finally:
+            _current_profile.reset(token)
+        self.assertGreater(profile.template_time, 0)
+        self.assertEqual(profile.template_depth, 0)
+
+    def test_log_directory_created_on_first_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'logs', 'slow_requests.log')
+            handler = LogDirRotatingFileHandler(path, maxBytes=1024, backupCount=1)
+            self.assertFalse(os.path.exists(os.path.dirname(path)))
+            handler.emit(logging.makeLogRecord({'msg': 'slow'}))
+            handler.close()
+            with open(path, encoding='utf-8') as log:
+                self.assertEqual(log.read(), 'slow\n')
+
+    def test_repeated_queries_detected(self):
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile.record_query):
+            for patient in Patient.objects.all():
+                patient.visits.count()  # N+1
+        ((sql, count),) = profile.duplicates()
+        self.assertIn('patients_visit', sql)
+        self.assertEqual(count, Patient.objects.count())
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _create_sample_data(patients=2)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        metrics_dir = override_settings(METRICS_DIR=directory)
+        metrics_dir.enable()
+        self.addCleanup(metrics_dir.disable)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('patients'))
+        self.client.get(reverse('patients'))
+        create_appointment_notifications(full=True)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('doctormanager_requests_total{view="patients",method="GET",status="200"}', body)
+        self.assertIn('doctormanager_request_duration_seconds_bucket{view="patients",le="+Inf"}', body)
+        self.assertIn('doctormanager_db_queries_total{view="patients"}', body)
+        self.assertIn('doctormanager_cache_requests_total{result="hit"}', body)
+        self.assertIn('doctormanager_job_runs_total{job="appointment_notifications"}', body)
+        self.assertIn('doctormanager_table_rows{table="patient"} 2', body)
+        self.assertIn('doctormanager_table_rows{table="visit"} 6', body)
+
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_without_token_only_local_debug_scrapes(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 403)
+
+    def test_registry_follows_metrics_dir(self):
+        observe_request('patients', 'GET', 200, 0.01, 1, 0.001)
+        registry.flush()
+        self.assertEqual(os.listdir(registry.directory), [os.path.basename(registry.filename)])
+        self.assertEqual(registry.directory, settings.METRICS_DIR)
+
+    def test_metrics_from_several_processes_add_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workers = [Registry(directory), Registry(directory)]
+            for worker in workers:
+                worker.inc('requests_total', ('patients', 'GET', '200'))
+                worker.observe('request_duration_seconds', 0.02, ('patients',))
+                worker.flush()
+            counters, histograms = _aggregate(workers[0].collect())
+        self.assertEqual(counters[('requests_total', ('patients', 'GET', '200'))], 2)
+        self.assertEqual(histograms[('request_duration_seconds', ('patients',))][-1], 2)
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.notifications = [Notification.objects.create(title=f'اعلان {i}', message='پیام') for i in range(30)]
+
+    def test_pages_and_unread_filter(self):
+        response = self.client.get(reverse('notifications'))
+        page = response.context['page']
+        self.assertEqual([n.pk for n in page], [n.pk for n in reversed(self.notifications)][:25])
+        response = self.client.get(reverse('notifications') + f'?cursor={page.next_cursor}')
+        self.assertEqual(len(response.context['page']), 5)
+
+        Notification.objects.filter(pk__in=[n.pk for n in self.notifications[:28]]).update(is_read=True)
+        cache.clear()
+        response = self.client.get(reverse('notifications') + '?filter=unread')
+        self.assertEqual(len(response.context['page']), 2)
+
+    def test_mark_selected_and_all_read(self):
+        self.assertEqual(get_unread_notifications_count(), 30)
+        selected = [str(n.pk) for n in self.notifications[:3]]
+        with self.assertNumQueries(2):  # the UPDATE and the counter row
+            response = self.client.post(reverse('mark_notifications_read'), {'ids': selected + ['x', '²', '-1', str(2 ** 64)], 'next': '/notifications/?filter=unread'})
+        self.assertRedirects(response, '/notifications/?filter=unread', fetch_redirect_response=False)
+        self.assertEqual(get_unread_notifications_count(), 27)
+
+        # Already read rows are not counted twice
+        self.client.post(reverse('mark_notifications_read'), {'ids': selected, 'next': 'https://example.com/'})
+        self.assertEqual(get_unread_notifications_count(), 27)
+
+        self.client.post(reverse('mark_notifications_read'), {'all': '1'})
+        self.assertEqual(get_unread_notifications_count(), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_mark_one_read(self):
+        url = reverse('mark_notification_read', args=[self.notifications[0].pk])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.client.post(url)
+        self.client.post(url)
+        self.assertEqual(get_unread_notifications_count(), 29)
+
+    def test_retention_archives_old_read_notifications(self):
+        old = timezone.now() - timedelta(days=100)
+        Notification.objects.filter(pk__in=[n.pk for n in self.notifications[:20]]).update(created_at=old)
+        Notification.objects.filter(pk__in=[n.pk for n in self.notifications[:15]]).update(is_read=True)
+        reconcile_unread_notifications_count()  # update() sends no signals
+
+        self.assertEqual(purge_read_notifications(days=90, archive=True, batch_size=4), 15)
+        self.assertEqual(Notification.objects.count(), 15)
+        self.assertEqual(ArchivedNotification.objects.count(), 15)
+        archived = ArchivedNotification.objects.get(original_id=self.notifications[0].pk)
+        self.assertEqual(archived.title, 'اعلان 0')
+        self.assertEqual(get_unread_notifications_count(), 15)
+
+        Notification.objects.update(is_read=True)
+        self.assertEqual(purge_read_notifications(days=90, archive=False), 5)
+        self.assertEqual(ArchivedNotification.objects.count(), 15)
+
+
+class LiveNotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('doctor', password='secret')
+
+    def test_broker_drops_oldest_events_of_slow_subscribers(self):
+        async def run():
+            events = Broker()
+            subscription = events.subscribe(maxsize=2)
+            for count in range(3):
+                events.publish({'type': 'unread', 'count': count})
+            await asyncio.sleep(0)
+            received = [await subscription.get(), await subscription.get()]
+            events.unsubscribe(subscription)
+            return received, len(events)
+
+        received, subscribers = asyncio.run(run())
+        self.assertEqual([event['count'] for event in received], [1, 2])
+        self.assertEqual(subscribers, 0)
+
+    def test_events_require_login(self):
+        self.assertEqual(self.client.get(reverse('notification_events')).status_code, 403)
+
+    def test_wsgi_falls_back_to_polling(self):
+        Notification.objects.create(title='اعلان', message='پیام')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('notification_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response.content.decode(), 'retry: 30000\nevent: unread\ndata: {"type": "unread", "count": 1}\n\n')
+
+    async def test_stream_pushes_new_notifications(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('notification_events'))
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n')
+        self.assertIn(b'"count": 0', await anext(stream))
+
+        def create():
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(title='قرار ملاقات', message='فردا', notification_type='appointment')
+
+        await sync_to_async(create)()
+        event = (await asyncio.wait_for(anext(stream), 5)).decode()
+        self.assertTrue(event.startswith('event: notification\n'))
+        data = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual((data['title'], data['count']), ('قرار ملاقات', 1))
+        await stream.aclose()
+
+
+class PatientSuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('doctor'))
+        self.exact = Patient.objects.create(
+            first_name='رضا', last_name='کریمی', national_id='0012345678', birth_date=date(1980, 1, 1), gender='M', phone='09120000001',
+        )
+        self.other = Patient.objects.create(
+            first_name='کریم', last_name='رضایی', national_id='0087654321', birth_date=date(1990, 1, 1), gender='M', phone='09120000002',
+        )
+
+    def test_prefix_matches_first_and_cached(self):
+        response = self.client.get(reverse('patient_suggestions'), {'q': 'كريمي'})
+        data = response.json()
+        self.assertEqual(data['results'][0], {
+            'id': self.exact.pk, 'name': 'رضا کریمی', 'national_id': '0012345678', 'phone': '09120000001',
+        })
+        self.assertTrue(data['complete'])
+
+        with self.assertNumQueries(2):  # session and user only
+            self.client.get(reverse('patient_suggestions'), {'q': 'کریمی'})
+        self.assertEqual(
+            [r['id'] for r in self.client.get(reverse('patient_suggestions'), {'q': '۰۰۸۷'}).json()['results']],
+            [self.other.pk],
+        )
+
+    def test_limit_and_invalidation(self):
+        data = self.client.get(reverse('patient_suggestions'), {'q': '0912', 'limit': '1'}).json()
+        self.assertEqual(len(data['results']), 1)
+        self.assertFalse(data['complete'])
+        self.assertEqual(self.client.get(reverse('patient_suggestions')).json()['results'], [])
+
+        self.exact.last_name = 'احمدی'
+        self.exact.save()
+        names = [r['name'] for r in self.client.get(reverse('patient_suggestions'), {'q': 'احمد'}).json()['results']]
+        self.assertEqual(names, ['رضا احمدی'])
+
+    def test_bad_limit_and_login(self):
+        for limit in ('²', 'x', '-3', '0', str(10 ** 30)):
+            with self.subTest(limit=limit):
+                response = self.client.get(reverse('patient_suggestions'), {'q': '0912', 'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), 2)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('patient_suggestions'), {'q': '0912'}).status_code, 403)
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+
+    def collect(self):
+        with override_settings(STATIC_ROOT=self.static_root, STORAGES={
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'patients.staticfiles.CompressedManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.static_root, 'staticfiles.json')) as manifest:
+            return json.load(manifest)['paths']
+
+    def get(self, middleware, path, **headers):
+        return middleware(RequestFactory().get(path, headers=headers))
+
+    def test_collectstatic_hashes_and_compresses(self):
+        hashed = self.collect()['js/translations.js']
+        self.assertNotEqual(hashed, 'js/translations.js')
+        with gzip.open(os.path.join(self.static_root, hashed + '.gz')) as compressed:
+            with open(os.path.join(settings.BASE_DIR, 'static', 'js', 'translations.js'), 'rb') as original:
+                self.assertEqual(compressed.read(), original.read())
+        # Too small to be worth compressing
+        self.assertFalse(os.path.exists(os.path.join(self.static_root, 'images', 'favicon.ico.gz')))
+
+    def test_serves_collected_files_with_cache_headers(self):
+        hashed = self.collect()['js/translations.js']
+        with override_settings(DEBUG=False, STATIC_ROOT=self.static_root):
+            middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+
+        response = self.get(middleware, f'/static/{hashed}', accept_encoding='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertTrue(response['Content-Type'].startswith('text/javascript'))
+        self.assertNotIn('Content-Disposition', response)
+        self.assertEqual(len(b''.join(response.streaming_content)), int(response['Content-Length']))
+
+        plain = self.get(middleware, f'/static/{hashed}')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+        self.assertEqual(self.get(middleware, f'/static/{hashed}', if_none_match=plain['ETag']).status_code, 304)
+
+        self.assertEqual(self.get(middleware, '/static/js/translations.js')['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.get(middleware, '/static/missing.js').status_code, 404)
+        self.assertEqual(middleware(RequestFactory().post(f'/static/{hashed}')).status_code, 405)
+
+    @override_settings(DEBUG=True)
+    def test_debug_serves_from_finders(self):
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+        response = self.get(middleware, '/static/css/style.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(self.get(middleware, '/static/../manage.py').status_code, 404)
+
+
+class AssetBuildTests(TestCase):
+    @override_settings(BUNDLED_ASSETS=True)
+    def test_bundled_pages_load_nothing_from_cdns(self):
+        for url in (reverse('login'), reverse('add_patient')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '/static/build/vendor/vazir-font/font-face.css')
+                self.assertNotContains(response, 'https://')
+        self.assertContains(self.client.get(reverse('add_patient')), '/static/build/vendor/persian-datepicker.min.js')
+
+    @override_settings(BUNDLED_ASSETS=True)
+    def test_incomplete_build_is_an_error(self):
+        build = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, build)
+        with override_settings(STATICFILES_DIRS=[build]):
+            (error,) = check_asset_build(None)
+            self.assertEqual(error.id, 'patients.E001')
+            self.assertIn('build/vendor/jalaali.min.js', error.msg)
+            self.assertNotIn('jquery', error.msg)  # shipped with django.contrib.admin
+
+            for name in BUILD_FILES:
+                path = os.path.join(build, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                open(path, 'w').close()
+            self.assertEqual(check_asset_build(None), [])
+
+        with override_settings(BUNDLED_ASSETS=False):
+            self.assertEqual(check_asset_build(None), [])
+
+
+class RowTagTests(TestCase):
+    def test_rows_are_built_without_queries(self):
+        patient = Patient.objects.create(
+            first_name='سارا', last_name='<b>نوری</b>', national_id='0011223344', birth_date=date(1990, 5, 1), gender='F', phone='09121111111',
+        )
+        Visit.objects.create(patient=patient, diagnosis='سرماخوردگی')
+        patients = list(Patient.objects.select_related('summary').annotate_age())
+        notification = Notification.objects.create(title='یادآوری', message='پیام', notification_type='reminder', related_patient=patient)
+
+        with self.assertNumQueries(0):
+            row, = patient_rows(patients)
+            item, = notification_items([notification])['items']
+        self.assertEqual(row['detail_url'], reverse('patient_detail', args=[patient.pk]))
+        self.assertEqual(row['add_visit_url'], reverse('add_visit', args=[patient.pk]))
+        self.assertEqual((row['age'], row['visit_count']), (patient.age, 1))
+        self.assertTrue(row['last_visit'])
+        self.assertEqual((item['icon'], item['read_url']), ('clock', reverse('mark_notification_read', args=[notification.pk])))
+
+        # The partials escape like the templates they replace
+        response = self.client.get(reverse('patients'))
+        self.assertContains(response, '&lt;b&gt;نوری&lt;/b&gt;')
+        self.assertContains(response, row['add_visit_url'])
@@ -0,0 +1,274 @@
+"""Bulk import and export of patients and visits as CSV or JSONL.
+
+Imports read the input as a stream and work in chunks. Each row is
+validated with the same rules as ``PatientForm``/``VisitForm``. Valid
+rows are written with ``bulk_create``, one transaction per chunk, and
+invalid rows are reported with their line number. If a chunk still
+hits a unique constraint (a patient added by someone else meanwhile),
+that chunk is retried row by row and the duplicates become row errors. Visits refer to
+their patient by ``national_id``.
+
+Exports iterate the database with ``iterator()`` and yield encoded
+lines. Memory use therefore stays flat, and the output can feed a
+``StreamingHttpResponse`` directly.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+
+from .caching import PATIENTS, VISITS, invalidate, patient_group
+from .forms import PatientForm, VisitForm
+from .jalali import format_jalali
+from .models import Patient, PatientSummary, Visit
+from .search import index_patients
+from .stats import invalidate_all
+from .summaries import rebuild_patient_summaries
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+
+PATIENT_COLUMNS = ['first_name', 'last_name', 'national_id', 'birth_date', 'gender', 'phone', 'address']
+VISIT_COLUMNS = ['national_id', 'visit_date', 'diagnosis', 'prescription', 'notes', 'next_visit_date']
+
+
+class PatientImportForm(PatientForm):
+    def validate_unique(self):
+        # national_id uniqueness is checked once per chunk by the importer
+        pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # (line number, {field: [{'message', 'code'}]}) as in Form.errors.get_json_data()
+
+    def add_error(self, line, errors):
+        self.errors.append((line, errors))
+
+    def finish(self):
+        self.errors.sort(key=lambda error: error[0])
+        return self
+
+
+def format_from_name(filename):
+    """'csv' or 'jsonl' from a file name, or None"""
+    extension = filename.rsplit('.', 1)[-1].lower()
+    return 'jsonl' if extension in ('jsonl', 'ndjson') else extension if extension in FORMATS else None
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) pairs from a text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None
+                continue
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Unsupported format {fmt!r}')
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _form_data(row, columns):
+    return {name: '' if row.get(name) is None else str(row.get(name)).strip() for name in columns}
+
+
+def _invalid_row(result, line):
+    result.add_error(line, {'__all__': [{'message': 'ردیف یک شیء JSON معتبر نیست.', 'code': 'invalid'}]})
+
+
+def _duplicate_national_id(result, line):
+    result.add_error(line, {'national_id': [{'message': 'بیمار با این کد ملی از قبل وجود دارد.', 'code': 'unique'}]})
+
+
+def _existing_national_ids(national_ids):
+    return set(Patient.objects.filter(national_id__in=national_ids).values_list('national_id', flat=True))
+
+
+def _create_patients(patients):
+    with transaction.atomic():
+        created = Patient.objects.bulk_create(patients)
+        # bulk_create sends no signals: add the summaries and index entries here
+        PatientSummary.objects.bulk_create(PatientSummary(patient=patient) for patient in created)
+        index_patients(Patient.objects.filter(pk__in=[patient.pk for patient in created]))
+    return created
+
+
+def import_patients(stream, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    result = ImportResult()
+    seen = set()
+    for chunk in _chunks(read_rows(stream, fmt), chunk_size):
+        valid = []
+        for line, row in chunk:
+            if row is None:
+                _invalid_row(result, line)
+                continue
+            form = PatientImportForm(_form_data(row, PATIENT_COLUMNS))
+            if not form.is_valid():
+                result.add_error(line, form.errors.get_json_data())
+                continue
+            valid.append((line, form.save(commit=False)))
+
+        existing = _existing_national_ids([patient.national_id for _, patient in valid])
+        patients = []
+        for line, patient in valid:
+            if patient.national_id in existing or patient.national_id in seen:
+                _duplicate_national_id(result, line)
+                continue
+            seen.add(patient.national_id)
+            patients.append((line, patient))
+
+        try:
+            created = _create_patients([patient for _, patient in patients])
+        except IntegrityError:
+            # Inserted by someone else since the check above: find which rows, one at a time
+            created = []
+            for line, patient in patients:
+                patient.pk = None
+                try:
+                    created += _create_patients([patient])
+                except IntegrityError:
+                    _duplicate_national_id(result, line)
+        result.created += len(created)
+
+    if result.created:
+        invalidate(PATIENTS)
+        invalidate_all()
+    return result.finish()
+
+
+def _parse_visit_date(value):
+    """ISO datetime as written by the export; raises ValueError otherwise"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+def import_visits(stream, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    result = ImportResult()
+    patient_ids = set()
+    for chunk in _chunks(read_rows(stream, fmt), chunk_size):
+        rows = [(line, row) for line, row in chunk if row is not None]
+        for line, row in chunk:
+            if row is None:
+                _invalid_row(result, line)
+
+        patients = dict(
+            Patient.objects.filter(national_id__in={str(row.get('national_id', '')).strip() for _, row in rows})
+            .values_list('national_id', 'pk')
+        )
+        visits = []
+        visit_dates = []
+        for line, row in rows:
+            data = _form_data(row, VISIT_COLUMNS)
+            form = VisitForm(data)
+            errors = {} if form.is_valid() else form.errors.get_json_data()
+            patient_id = patients.get(data['national_id'])
+            if patient_id is None:
+                errors['national_id'] = [{'message': 'بیماری با این کد ملی یافت نشد.', 'code': 'invalid'}]
+            visit_date = None
+            if data['visit_date']:
+                try:
+                    visit_date = _parse_visit_date(data['visit_date'])
+                except ValueError:
+                    errors['visit_date'] = [{'message': 'تاریخ ویزیت باید به صورت ISO 8601 باشد.', 'code': 'invalid'}]
+            if errors:
+                result.add_error(line, errors)
+                continue
+            visit = form.save(commit=False)
+            visit.patient_id = patient_id
+            visits.append(visit)
+            visit_dates.append(visit_date)
+
+        with transaction.atomic():
+            created = Visit.objects.bulk_create(visits)
+            # visit_date is auto_now_add, so historical dates are written afterwards
+            dated = []
+            for visit, visit_date in zip(created, visit_dates):
+                if visit_date is not None:
+                    visit.visit_date = visit_date
+                    dated.append(visit)
+            Visit.objects.bulk_update(dated, ['visit_date'], batch_size=chunk_size)
+        result.created += len(created)
+        patient_ids.update(visit.patient_id for visit in created)
+
+    if patient_ids:
+        rebuild_patient_summaries(patient_ids=patient_ids)
+        invalidate(VISITS, *(patient_group(patient_id) for patient_id in patient_ids))
+        invalidate_all()
+    return result.finish()
+
+
+IMPORTERS = {
+    'patients': import_patients,
+    'visits': import_visits,
+}
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _jalali_or_empty(value):
+    return format_jalali(value) if value else ''
+
+
+def _patient_records():
+    rows = Patient.objects.order_by('id').values_list(*PATIENT_COLUMNS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    birth_date = PATIENT_COLUMNS.index('birth_date')
+    for row in rows:
+        row = list(row)
+        row[birth_date] = _jalali_or_empty(row[birth_date])
+        yield row
+
+
+def _visit_records():
+    rows = (
+        Visit.objects.order_by('id')
+        .values_list('patient__national_id', *VISIT_COLUMNS[1:])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for national_id, visit_date, diagnosis, prescription, notes, next_visit_date in rows:
+        yield [national_id, visit_date.isoformat(), diagnosis, prescription, notes, _jalali_or_empty(next_visit_date)]
+
+
+EXPORTERS = {
+    'patients': (PATIENT_COLUMNS, _patient_records),
+    'visits': (VISIT_COLUMNS, _visit_records),
+}
+
+
+def export_lines(kind, fmt):
+    """Yield the export of ``kind`` ('patients' or 'visits') line by line"""
+    columns, records = EXPORTERS[kind]
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for record in records():
+            yield writer.writerow(record)
+    elif fmt == 'jsonl':
+        for record in records():
+            yield json.dumps(dict(zip(columns, record)), ensure_ascii=False) + '\n'
+    else:
+        raise ValueError(f'Unsupported format {fmt!r}')
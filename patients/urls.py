@@ -1,20 +1,38 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.login_view, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('patients/', views.patients_list, name='patients'),
+    path('patients/suggest/', views.patient_suggestions, name='patient_suggestions'),
     path('patients/add/', views.add_patient, name='add_patient'),
     path('patients/<int:patient_id>/', views.patient_detail, name='patient_detail'),
+    path('patients/<int:patient_id>/visits/', views.patient_visits, name='patient_visits'),
+    path('patients/<int:patient_id>/visits/<int:visit_id>/', views.visit_details, name='visit_details'),
     path('patients/<int:patient_id>/edit/', views.edit_patient, name='edit_patient'),
     path('patients/<int:patient_id>/visit/', views.add_visit, name='add_visit'),
     path('appointments/', views.appointments_list, name='appointments'),
     path('notifications/', views.notifications_list, name='notifications'),
+    path('notifications/events/', views.notification_events, name='notification_events'),
+    path('notifications/read/', views.mark_notifications_read, name='mark_notifications_read'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('settings/', views.settings_page, name='settings'),
+    path('data/', views.data_transfer, name='data_transfer'),
+    path('data/export/<str:kind>/', views.export_data, name='export_data'),
     path('create-notifications/', views.create_appointment_notifications_manual, name='create_notifications'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('metrics', views.metrics, name='metrics'),
+    
+    # JSON API
+    path('api/patients/', api.collection, {'resource': api.PATIENTS}, name='api_patients'),
+    path('api/patients/<int:pk>/', api.detail, {'resource': api.PATIENTS}, name='api_patient'),
+    path('api/visits/', api.collection, {'resource': api.VISITS}, name='api_visits'),
+    path('api/visits/<int:pk>/', api.detail, {'resource': api.VISITS}, name='api_visit'),
+    path('api/appointments/', api.collection, {'resource': api.APPOINTMENTS}, name='api_appointments'),
+    path('api/notifications/', api.collection, {'resource': api.NOTIFICATIONS}, name='api_notifications'),
+    path('api/notifications/<int:pk>/', api.detail, {'resource': api.NOTIFICATIONS}, name='api_notification'),
+    path('api/stats/visits/', api.visit_stats, name='api_visit_stats'),
 ]
 
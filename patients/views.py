@@ -3,71 +3,138 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models.functions import Substr
 from django.utils import timezone
-from datetime import datetime, timedelta
-from .models import Patient, Visit, Notification
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_GET, require_POST
+from asgiref.sync import sync_to_async
+from datetime import datetime
+import asyncio
+import io
+import json
+from .models import MAX_AGE, Patient, Visit, Notification
+from .caching import NOTIFICATIONS, cache_view, invalidate
+from .counters import adjust_unread_notifications_count, aget_unread_notifications_count
+from .events import broker, publish_unread_count
 from .forms import PatientForm, VisitForm
+from .metrics import render_metrics
+from .notifications import create_appointment_notifications
+from .pagination import KeysetPage, KeysetPaginator
+from .search import SUGGEST_LIMIT, search_patients, suggest_patients
+from .stats import adashboard_counts
+from .transfer import EXPORTERS, FORMATS, IMPORTERS, format_from_name, export_lines
 
+SEARCH_RESULTS_LIMIT = 200
+PATIENTS_PER_PAGE = 25
+SUGGEST_MAX_LIMIT = 20
+VISITS_PER_PAGE = 10
+NOTIFICATIONS_PER_PAGE = 25
+APPOINTMENTS_PER_PAGE = 25
+SSE_RETRY_MS = 3000
+SSE_POLL_RETRY_MS = 30000
+SSE_KEEPALIVE_SECONDS = 25
+DIAGNOSIS_PREVIEW_LENGTH = 150
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+IMPORT_ERRORS_SHOWN = 100
+MAX_PRIMARY_KEY = 2 ** 63 - 1  # BigAutoField
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
 
-def dashboard(request):
+
+async def dashboard(request):
     """Dashboard view with statistics and recent activity"""
-    # Create appointment notifications for upcoming appointments
-    create_appointment_notifications()
-    
-    # Get statistics
-    total_patients = Patient.objects.count()
-    
-    # Get today's visits
-    today = timezone.now().date()
-    today_visits = Visit.objects.filter(visit_date__date=today).count()
+    # Appointment notifications are produced by the background scheduler
+    # (see patients.scheduler); the dashboard only reads.
     
-    # Get this week's visits
-    week_start = today - timedelta(days=today.weekday())
-    week_visits = Visit.objects.filter(visit_date__date__gte=week_start).count()
+    # Counters come from the cache (or the async ORM on a miss)
+    stats = await adashboard_counts()
     
-    # Get this month's visits
-    month_start = today.replace(day=1)
-    month_visits = Visit.objects.filter(visit_date__date__gte=month_start).count()
+    # The lists stay lazy: when the dashboard fragments are cached (see
+    # patients.caching) their queries never run
     
     # Get recent visits (last 5)
     recent_visits = Visit.objects.select_related('patient').order_by('-visit_date')[:5]
     
     # Get recent patients (last 10)
-    recent_patients = Patient.objects.prefetch_related('visits').order_by('-created_at')[:10]
+    recent_patients = Patient.objects.select_related('summary').annotate_age().order_by('-created_at')[:10]
     
     context = {
-        'total_patients': total_patients,
-        'today_visits': today_visits,
-        'week_visits': week_visits,
-        'month_visits': month_visits,
+        'stats': stats,
         'recent_visits': recent_visits,
         'recent_patients': recent_patients,
     }
     
-    return render(request, 'dashboard.html', context)
+    return await _arender(request, 'dashboard.html', context)
 
 
-def patients_list(request):
-    """List all patients with search functionality"""
-    patients = Patient.objects.prefetch_related('visits').order_by('last_name', 'first_name')
+async def patients_list(request):
+    """List all patients with search and age-range filtering"""
+    patients = Patient.objects.select_related('summary').annotate_age()
+    
+    # Age range (e.g. ?min_age=60), applied as an indexed birth_date range
+    age_range = {}
+    for name in ('min_age', 'max_age'):
+        try:
+            value = int(request.GET.get(name, ''))
+        except ValueError:
+            continue  # missing or not a number: no bound
+        age_range[name] = min(max(value, 0), MAX_AGE)
+    if age_range:
+        patients = patients.age_between(**age_range)
     
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        patients = patients.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(national_id__icontains=search_query) |
-            Q(phone__icontains=search_query)
-        )
+        # Ranked results, best matches first (the search backends use raw cursors)
+        results = await sync_to_async(lambda: list(search_patients(patients, search_query, limit=SEARCH_RESULTS_LIMIT)))()
+        page = KeysetPage(results)
+        total_patients = len(page)
+    else:
+        page = await KeysetPaginator(
+            patients, ['last_name', 'first_name', 'id'], per_page=PATIENTS_PER_PAGE
+        ).aget_page(request.GET.get('cursor'))
+        total_patients = await (patients.acount() if age_range else Patient.objects.acount())
     
     context = {
-        'patients': patients,
+        'patients': page,
+        'page': page,
+        'total_patients': total_patients,
         'search_query': search_query,
+        'min_age': age_range.get('min_age', ''),
+        'max_age': age_range.get('max_age', ''),
     }
     
-    return render(request, 'patients.html', context)
+    return await _arender(request, 'patients.html', context)
+
+
+@require_GET
+def patient_suggestions(request):
+    """Autocomplete for the patient search box: ``?q=`` and optional ``?limit=``"""
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden()
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', SUGGEST_LIMIT))
+    except ValueError:
+        limit = SUGGEST_LIMIT
+    limit = min(limit, SUGGEST_MAX_LIMIT) if limit > 0 else SUGGEST_LIMIT
+    results = suggest_patients(query, limit)
+    # Fewer results than asked for means every match is listed, so the client
+    # can narrow them down itself as the query grows
+    return JsonResponse(
+        {'q': query, 'results': results, 'complete': len(results) < limit},
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+    )
+
+
+async def _arender(request, template_name, context):
+    # Templates, context processors and lazy querysets are synchronous
+    return await sync_to_async(render)(request, template_name, context)
 
 
 def add_patient(request):
@@ -90,15 +157,58 @@ def add_patient(request):
 
 def patient_detail(request, patient_id):
     """View patient details and medical history"""
-    patient = get_object_or_404(Patient, id=patient_id)
+    patient = get_object_or_404(Patient.objects.select_related('summary'), id=patient_id)
     
-    context = {
-        'patient': patient,
-    }
+    # Visit statistics come from the precomputed summary; the history is
+    # paged in through patient_visits as the user scrolls.
+    visit_count = patient.summary.visit_count if hasattr(patient, 'summary') else 0
+    context = _visit_timeline_context(patient, None, visit_count)
     
     return render(request, 'patient_detail.html', context)
 
 
+def _visit_timeline_context(patient, cursor, first_number):
+    """One page of a patient's visits, newest first, without the long text fields"""
+    visits = (
+        Visit.objects.filter(patient=patient)
+        .only('id', 'patient_id', 'visit_date', 'next_visit_date')
+        # One character past the preview tells whether there is more to show
+        .annotate(diagnosis_preview=Substr('diagnosis', 1, DIAGNOSIS_PREVIEW_LENGTH + 1))
+    )
+    page = KeysetPaginator(visits, ['-visit_date', '-id'], per_page=VISITS_PER_PAGE).get_page(cursor)
+    for offset, visit in enumerate(page):
+        visit.number = first_number - offset
+        visit.diagnosis_truncated = len(visit.diagnosis_preview) > DIAGNOSIS_PREVIEW_LENGTH
+        visit.diagnosis_preview = visit.diagnosis_preview[:DIAGNOSIS_PREVIEW_LENGTH]
+    return {
+        'patient': patient,
+        'visits': page,
+        'next_number': first_number - len(page),
+    }
+
+
+@cache_view('patient:{patient_id}')
+def patient_visits(request, patient_id):
+    """Visit timeline fragment for infinite scroll (?cursor=&number=)"""
+    patient = get_object_or_404(Patient, id=patient_id)
+    try:
+        first_number = int(request.GET.get('number', 0))
+    except ValueError:
+        first_number = 0
+    context = _visit_timeline_context(patient, request.GET.get('cursor'), first_number)
+    return render(request, 'visit_timeline.html', context)
+
+
+@cache_view('patient:{patient_id}')
+def visit_details(request, patient_id, visit_id):
+    """Full diagnosis, prescription and notes of one visit, loaded on expand"""
+    visit = get_object_or_404(
+        Visit.objects.only('id', 'patient_id', 'diagnosis', 'prescription', 'notes'),
+        id=visit_id, patient_id=patient_id,
+    )
+    return render(request, 'visit_details.html', {'visit': visit})
+
+
 def edit_patient(request, patient_id):
     """Edit patient information"""
     patient = get_object_or_404(Patient, id=patient_id)
@@ -129,7 +239,9 @@ def add_visit(request, patient_id):
         if form.is_valid():
             visit = form.save(commit=False)
             visit.patient = patient
-            visit.save()
+            # The patient summary is refreshed in the same transaction
+            with transaction.atomic():
+                visit.save()
             messages.success(request, f'سابقه ویزیت برای {patient.full_name} اضافه شد!')
             return redirect('patient_detail', patient_id=patient.id)
     else:
@@ -145,51 +257,20 @@ def add_visit(request, patient_id):
 
 def appointments_list(request):
     """List all appointments (visits with next_visit_date)"""
-    # Get all visits that have a next visit date
-    appointments = Visit.objects.filter(
-        next_visit_date__isnull=False
-    ).exclude(
-        next_visit_date=''
-    ).select_related('patient').order_by('next_visit_date')
+    appointments = Visit.objects.with_appointment().select_related('patient')
     
     # Count total appointments
     total_appointments = appointments.count()
     
     # Get upcoming appointments (next 7 days)
-    from datetime import datetime, timedelta
-    today = datetime.now().date()
-    next_week = today + timedelta(days=7)
+    upcoming_appointments = Visit.objects.upcoming(days=7).select_related('patient')
     
-    # Convert Jalali dates to Gregorian for comparison
-    upcoming_appointments = []
-    for appointment in appointments:
-        try:
-            # Parse Jalali date
-            jalali_parts = appointment.next_visit_date.split('/')
-            if len(jalali_parts) == 3:
-                jalali_year = int(jalali_parts[0])
-                jalali_month = int(jalali_parts[1])
-                jalali_day = int(jalali_parts[2])
-                
-                # Convert to Gregorian using jdatetime
-                try:
-                    import jdatetime
-                    jalali_date = jdatetime.date(jalali_year, jalali_month, jalali_day)
-                    gregorian_date = jalali_date.togregorian()
-                except:
-                    # Fallback: simple approximation
-                    gregorian_date = today
-                
-                if today <= gregorian_date <= next_week:
-                    upcoming_appointments.append({
-                        'visit': appointment,
-                        'gregorian_date': gregorian_date
-                    })
-        except:
-            continue
+    # Paginate the full list by (next_visit_date, id)
+    page = KeysetPaginator(appointments, ['next_visit_date', 'id'], per_page=APPOINTMENTS_PER_PAGE).get_page(request.GET.get('cursor'))
     
     context = {
-        'appointments': appointments,
+        'appointments': page,
+        'page': page,
         'total_appointments': total_appointments,
         'upcoming_appointments': upcoming_appointments,
     }
@@ -197,105 +278,127 @@ def appointments_list(request):
     return render(request, 'appointments.html', context)
 
 
-def notifications_list(request):
-    """Display all notifications"""
-    notifications = Notification.objects.all().order_by('-created_at')
-    unread_count = Notification.objects.filter(is_read=False).count()
+async def notifications_list(request):
+    """Notification inbox, newest first, paginated (``?filter=unread`` for unread only)"""
+    notifications = Notification.objects.all()
+    unread_only = request.GET.get('filter') == 'unread'
+    if unread_only:
+        notifications = notifications.filter(is_read=False)
+    paginator = KeysetPaginator(notifications, ['-created_at', '-id'], per_page=NOTIFICATIONS_PER_PAGE)
+    # Lazy, so a cached list fragment skips the query; it is evaluated
+    # while rendering, which runs in a thread
+    page = SimpleLazyObject(lambda: paginator.get_page(request.GET.get('cursor')))
+    unread_count = await aget_unread_notifications_count()
     
     context = {
-        'notifications': notifications,
+        'notifications': page,
+        'page': page,
+        'unread_only': unread_only,
         'unread_count': unread_count,
     }
     
-    return render(request, 'notifications.html', context)
+    return await _arender(request, 'notifications.html', context)
+
+
+def _sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
 
 
+async def notification_events(request):
+    """Server-Sent Events: new notifications and unread counts as they happen.
+
+    Needs an ASGI server to hold the connection open; under WSGI the
+    current count is sent once and the browser reconnects after
+    ``retry``, which degrades to polling.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+
+    if not isinstance(request, ASGIRequest):
+        count = await aget_unread_notifications_count()
+        return HttpResponse(
+            f'retry: {SSE_POLL_RETRY_MS}\n' + _sse({'type': 'unread', 'count': count}),
+            content_type='text/event-stream',
+        )
+
+    async def stream():
+        subscription = broker.subscribe()
+        try:
+            yield f'retry: {SSE_RETRY_MS}\n'
+            yield _sse({'type': 'unread', 'count': await aget_unread_notifications_count()})
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing the idle connection and picks
+                    # up changes made in other server processes
+                    event = {'type': 'unread', 'count': await aget_unread_notifications_count()}
+                yield _sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _primary_keys(values):
+    """The values that are valid primary keys; anything else is dropped"""
+    keys = []
+    for value in values:
+        try:
+            key = int(value)
+        except ValueError:
+            continue
+        if 0 < key <= MAX_PRIMARY_KEY:
+            keys.append(key)
+    return keys
+
+
+def _redirect_back(request):
+    """Redirect to the POSTed ``next`` URL when it is local, else the inbox"""
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+        return redirect(next_url)
+    return redirect('notifications')
+
+
+@require_POST
 def mark_notification_read(request, notification_id):
     """Mark a notification as read"""
-    notification = get_object_or_404(Notification, id=notification_id)
-    notification.is_read = True
-    notification.save()
+    notification = get_object_or_404(Notification.objects.only('id', 'is_read'), id=notification_id)
+    if not notification.is_read:
+        notification.is_read = True
+        notification.save(update_fields=['is_read'])
     
-    return redirect('notifications')
+    return _redirect_back(request)
 
 
-def create_appointment_notifications():
-    """Create notifications for upcoming appointments (next 7 days)"""
-    from datetime import datetime, timedelta
-    import jdatetime
-    
-    today = datetime.now().date()
-    next_week = today + timedelta(days=7)
-    
-    # Clean up orphaned notifications (notifications for deleted patients)
-    orphaned_notifications = Notification.objects.filter(
-        related_patient__isnull=True
-    )
-    if orphaned_notifications.exists():
-        orphaned_notifications.delete()
-    
-    # Get visits with next_visit_date in the next 7 days
-    visits = Visit.objects.filter(
-        next_visit_date__isnull=False
-    ).exclude(
-        next_visit_date=''
-    ).select_related('patient')
-    
-    for visit in visits:
-        try:
-            # Parse Jalali date
-            jalali_parts = visit.next_visit_date.split('/')
-            if len(jalali_parts) == 3:
-                jalali_year = int(jalali_parts[0])
-                jalali_month = int(jalali_parts[1])
-                jalali_day = int(jalali_parts[2])
-                
-                # Convert to Gregorian
-                jalali_date = jdatetime.date(jalali_year, jalali_month, jalali_day)
-                gregorian_date = jalali_date.togregorian()
-                
-                # Create notification for appointments in the next 7 days
-                if today <= gregorian_date <= next_week:
-                    # Check if notification already exists for this visit
-                    existing_notification = Notification.objects.filter(
-                        related_visit=visit,
-                        notification_type='appointment',
-                        is_read=False
-                    ).first()
-                    
-                    if not existing_notification:
-                        # Calculate days until appointment
-                        days_until = (gregorian_date - today).days
-                        
-                        if days_until == 0:
-                            title = f"قرار ملاقات امروز - {visit.patient.full_name}"
-                            message = f"قرار ملاقات با {visit.patient.full_name} امروز است."
-                        elif days_until == 1:
-                            title = f"قرار ملاقات فردا - {visit.patient.full_name}"
-                            message = f"قرار ملاقات با {visit.patient.full_name} فردا است."
-                        elif days_until <= 3:
-                            title = f"قرار ملاقات نزدیک - {visit.patient.full_name}"
-                            message = f"قرار ملاقات با {visit.patient.full_name} در {days_until} روز آینده ({visit.next_visit_date}) است."
-                        else:
-                            title = f"قرار ملاقات هفته آینده - {visit.patient.full_name}"
-                            message = f"قرار ملاقات با {visit.patient.full_name} در {days_until} روز آینده ({visit.next_visit_date}) است."
-                        
-                        Notification.objects.create(
-                            title=title,
-                            message=message,
-                            notification_type='appointment',
-                            related_patient=visit.patient,
-                            related_visit=visit
-                        )
-        except Exception as e:
-            # Log error but continue processing
-            continue
+@require_POST
+def mark_notifications_read(request):
+    """Mark the selected notifications (``ids``), or all of them (``all``), as read in one UPDATE"""
+    unread = Notification.objects.filter(is_read=False)
+    if not request.POST.get('all'):
+        unread = unread.filter(pk__in=_primary_keys(request.POST.getlist('ids')))
+    # update() sends no signals: adjust the counter and fragments here.
+    # Only rows that were unread are counted, so concurrent requests cannot
+    # subtract the same notification twice.
+    updated = unread.update(is_read=True)
+    if updated:
+        adjust_unread_notifications_count(-updated)
+        invalidate(NOTIFICATIONS)
+        publish_unread_count()
+        messages.success(request, f'{updated} اعلان خوانده شد.')
+    
+    return _redirect_back(request)
 
 
 def create_appointment_notifications_manual(request):
     """Manually create appointment notifications"""
     try:
-        create_appointment_notifications()
+        create_appointment_notifications(full=True)
         messages.success(request, 'اعلان‌های قرار ملاقات با موفقیت ایجاد شدند.')
     except Exception as e:
         messages.error(request, f'خطا در ایجاد اعلان‌ها: {str(e)}')
@@ -376,6 +479,59 @@ def settings_page(request):
     return render(request, 'settings.html', context)
 
 
+@login_required
+def data_transfer(request):
+    """Bulk import from an uploaded CSV/JSONL file, with links to the exports"""
+    context = {}
+    if request.method == 'POST':
+        kind = request.POST.get('kind')
+        upload = request.FILES.get('file')
+        fmt = upload and format_from_name(upload.name)
+        if kind not in IMPORTERS or upload is None:
+            messages.error(request, 'نوع داده و فایل را انتخاب کنید.')
+        elif fmt is None:
+            messages.error(request, 'فقط فایل‌های CSV و JSONL پشتیبانی می‌شوند.')
+        else:
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            try:
+                result = IMPORTERS[kind](stream, fmt)
+            except UnicodeDecodeError:
+                messages.error(request, 'فایل باید با کدگذاری UTF-8 ذخیره شده باشد.')
+            else:
+                messages.success(request, f'{result.created} رکورد وارد شد و {len(result.errors)} ردیف رد شد.')
+                context.update({
+                    'import_errors': result.errors[:IMPORT_ERRORS_SHOWN],
+                    'hidden_error_count': max(len(result.errors) - IMPORT_ERRORS_SHOWN, 0),
+                })
+    return render(request, 'data_transfer.html', context)
+
+
+@login_required
+@require_GET
+def export_data(request, kind):
+    """Stream every patient or visit as CSV (default) or JSONL"""
+    fmt = request.GET.get('format', 'csv')
+    if kind not in EXPORTERS or fmt not in FORMATS:
+        raise Http404
+    response = StreamingHttpResponse(export_lines(kind, fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{timezone.localdate().isoformat()}.{fmt}"'
+    return response
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape endpoint (bearer token; local addresses without one under DEBUG)"""
+    if settings.METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '')
+        allowed = constant_time_compare(authorization, f'Bearer {settings.METRICS_TOKEN}')
+    else:
+        # Behind a reverse proxy every request comes from localhost
+        allowed = settings.DEBUG and request.META.get('REMOTE_ADDR') in LOCAL_ADDRESSES
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def login_view(request):
     """Login page for doctor"""
     if request.user.is_authenticated:
@@ -0,0 +1,27 @@
+// Only the classes found in these files end up in static/build/tailwind.min.css
+module.exports = {
+  content: [
+    './templates/**/*.html',
+    './patients/**/*.py',
+    './static/js/**/*.js',
+  ],
+  theme: {
+    extend: {
+      colors: {
+        medical: {
+          50: '#f0f9ff',
+          100: '#e0f2fe',
+          200: '#bae6fd',
+          300: '#7dd3fc',
+          400: '#38bdf8',
+          500: '#0ea5e9',
+          600: '#0284c7',
+          700: '#0369a1',
+          800: '#075985',
+          900: '#0c4a6e',
+        },
+      },
+    },
+  },
+  plugins: [],
+};